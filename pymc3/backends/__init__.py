@@ -4,11 +4,17 @@ Available backends
 ------------------
 
 1. NumPy array (pymc3.backends.NDArray)
-2. Text files (pymc3.backends.Text)
-3. SQLite (pymc3.backends.SQLite)
+2. Memory-mapped NumPy array (pymc3.backends.MemmapNDArray)
+3. Text files (pymc3.backends.Text)
+4. Binary NumPy files (pymc3.backends.NPY)
+5. SQLite (pymc3.backends.SQLite)
 
 The NDArray backend holds the entire trace in memory, whereas the Text
-and SQLite backends store the values while sampling.
+and SQLite backends store the values while sampling. The MemmapNDArray
+backend behaves like NDArray, but keeps the values in memory-mapped
+files, so traces can be larger than the available memory. The NPY
+backend writes each variable to its own binary `.npy` file, which is
+much faster than the Text backend for large traces.
 
 Selecting a backend
 -------------------
@@ -115,15 +121,23 @@ object that provides a consistent selection interface for all backends.
 If the traces are stored on disk, then a `load` function should also be
 defined that returns a MultiTrace object.
 
-For specific examples, see pymc3.backends.{ndarray,text,sqlite}.py.
+For specific examples, see pymc3.backends.{ndarray,text,npy,sqlite}.py.
 """
-from ..backends.ndarray import NDArray, save_trace, load_trace
+from ..backends.ndarray import NDArray, MemmapNDArray, save_trace, load_trace
 from ..backends.text import Text
+from ..backends.npy import NPY
 from ..backends.sqlite import SQLite
 from ..backends.hdf5 import HDF5
 
 _shortcuts = {'text': {'backend': Text,
                        'name': 'mcmc'},
+              'npy': {'backend': NPY,
+                      'name': 'mcmc_npy'},
+              # a new temporary directory for every trace, so that the
+              # files of earlier traces are not overwritten. It is removed
+              # with the trace.
+              'memmap': {'backend': MemmapNDArray,
+                         'name': None},
               'sqlite': {'backend': SQLite,
                          'name': 'mcmc.sqlite'},
               'hdf5': {'backend': HDF5,
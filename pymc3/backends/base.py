@@ -37,6 +37,7 @@ class BaseTrace(object):
     """
 
     supports_sampler_stats = False
+    supports_flat_record = False
 
     def __init__(self, name, model=None, vars=None, test_point=None):
         self.name = name
@@ -121,6 +122,28 @@ class BaseTrace(object):
         """
         raise NotImplementedError
 
+    def record_flat(self, array, sampler_states=None):
+        """Record a sampling iteration given as the flat array of the free
+        variables of the model.
+
+        Backends that set `supports_flat_record` store the array as it is
+        and compute the values of the trace variables later for many draws
+        at once. By default, the array is mapped back to a point and passed
+        to `record`.
+
+        Parameters
+        ----------
+        array : array
+            Values of the free variables in the layout of `model.bijection`
+        sampler_states : list of dicts
+            The diagnostic values for each sampler
+        """
+        point = self.model.bijection.rmap(array)
+        if sampler_states is None:
+            self.record(point)
+        else:
+            self.record(point, sampler_states)
+
     def close(self):
         """Close the database backend.
 
@@ -6,6 +6,7 @@ import glob
 import json
 import os
 import shutil
+import tempfile
 
 import numpy as np
 from ..backends import base
@@ -115,6 +116,7 @@ class SerializeNDArray(object):
         """
         if not isinstance(ndarray, NDArray):
             raise TypeError('Can only save NDArray')
+        ndarray._flush_flat()
 
         if os.path.isdir(self.directory):
             shutil.rmtree(self.directory)
@@ -152,9 +154,16 @@ class NDArray(base.BaseTrace):
     vars : list of variables
         Sampling values will be stored for these variables. If None,
         `model.unobserved_RVs` is used.
+
+    Draws recorded with `record_flat` are kept as flat arrays of the free
+    variables. The values of the trace variables are computed for up to
+    `flat_buffer_draws` of them at once with `Model.batched_fastfn`, when
+    the buffer is full or the samples are accessed.
     """
 
     supports_sampler_stats = True
+    supports_flat_record = True
+    flat_buffer_draws = 1000
 
     def __init__(self, name=None, model=None, vars=None, test_point=None):
         super(NDArray, self).__init__(name, model, vars, test_point)
@@ -162,6 +171,8 @@ class NDArray(base.BaseTrace):
         self.draws = None
         self.samples = {}
         self._stats = None
+        self._flat = None
+        self._flat_draws = 0
 
     # Sampling methods
 
@@ -180,23 +191,9 @@ class NDArray(base.BaseTrace):
         """
         super(NDArray, self).setup(draws, chain, sampler_vars)
 
+        self._flush_flat()
         self.chain = chain
-        if self.samples:  # Concatenate new array if chain is already present.
-            old_draws = len(self)
-            self.draws = old_draws + draws
-            self.draw_idx = old_draws
-            for varname, shape in self.var_shapes.items():
-                old_var_samples = self.samples[varname]
-                new_var_samples = np.zeros((draws, ) + shape,
-                                           self.var_dtypes[varname])
-                self.samples[varname] = np.concatenate((old_var_samples,
-                                                        new_var_samples),
-                                                       axis=0)
-        else:  # Otherwise, make array of zeros for each variable.
-            self.draws = draws
-            for varname, shape in self.var_shapes.items():
-                self.samples[varname] = np.zeros((draws, ) + shape,
-                                                 dtype=self.var_dtypes[varname])
+        self._allocate_samples(draws)
 
         if sampler_vars is None:
             return
@@ -218,6 +215,24 @@ class NDArray(base.BaseTrace):
                     new = np.zeros(draws, dtype=dtype)
                     data[varname] = np.concatenate([old, new])
 
+    def _allocate_samples(self, draws):
+        if self.samples:  # Concatenate new array if chain is already present.
+            old_draws = len(self)
+            self.draws = old_draws + draws
+            self.draw_idx = old_draws
+            for varname, shape in self.var_shapes.items():
+                old_var_samples = self.samples[varname]
+                new_var_samples = np.zeros((draws, ) + shape,
+                                           self.var_dtypes[varname])
+                self.samples[varname] = np.concatenate((old_var_samples,
+                                                        new_var_samples),
+                                                       axis=0)
+        else:  # Otherwise, make array of zeros for each variable.
+            self.draws = draws
+            for varname, shape in self.var_shapes.items():
+                self.samples[varname] = np.zeros((draws, ) + shape,
+                                                 dtype=self.var_dtypes[varname])
+
     def record(self, point, sampler_stats=None):
         """Record results of a sampling iteration.
 
@@ -226,9 +241,43 @@ class NDArray(base.BaseTrace):
         point : dict
             Values mapped to variable names
         """
+        self._flush_flat()
         for varname, value in zip(self.varnames, self.fn(point)):
             self.samples[varname][self.draw_idx] = value
+        self._record_stats(sampler_stats)
+        self.draw_idx += 1
+
+    def record_flat(self, array, sampler_stats=None):
+        """Record a sampling iteration given as the flat array of the free
+        variables of the model.
+
+        Parameters
+        ----------
+        array : array
+            Values of the free variables in the layout of `model.bijection`
+        """
+        if self._flat is None:
+            size = min(self.flat_buffer_draws, self.draws)
+            self._flat = np.empty((size, len(array)), dtype=array.dtype)
+        self._flat[self._flat_draws] = array
+        self._flat_draws += 1
+        self._record_stats(sampler_stats)
+        self.draw_idx += 1
+        if self._flat_draws == len(self._flat):
+            self._flush_flat()
 
+    def _flush_flat(self):
+        """Store the values of the trace variables of the buffered draws."""
+        if not self._flat_draws:
+            return
+        fn = self.model.batched_fastfn(self.vars)
+        start = self.draw_idx - self._flat_draws
+        values = fn(self._flat[:self._flat_draws])
+        for varname, value in zip(self.varnames, values):
+            self.samples[varname][start:self.draw_idx] = value
+        self._flat_draws = 0
+
+    def _record_stats(self, sampler_stats):
         if self._stats is not None and sampler_stats is None:
             raise ValueError("Expected sampler_stats")
         if self._stats is None and sampler_stats is not None:
@@ -237,12 +286,13 @@ class NDArray(base.BaseTrace):
             for data, vars in zip(self._stats, sampler_stats):
                 for key, val in vars.items():
                     data[key][self.draw_idx] = val
-        self.draw_idx += 1
 
     def _get_sampler_stats(self, varname, sampler_idx, burn, thin):
         return self._stats[sampler_idx][varname][burn::thin]
 
     def close(self):
+        self._flush_flat()
+        self._flat = None
         if self.draw_idx == self.draws:
             return
         # Remove trailing zeros if interrupted before completed all
@@ -274,6 +324,7 @@ class NDArray(base.BaseTrace):
         -------
         A NumPy array
         """
+        self._flush_flat()
         return self.samples[varname][burn::thin]
 
     def _slice(self, idx):
@@ -283,6 +334,7 @@ class NDArray(base.BaseTrace):
 
         # Only the first `draw_idx` value are valid because of preallocation
         idx = slice(*idx.indices(len(self)))
+        self._flush_flat()
 
         sliced = NDArray(model=self.model, vars=self.vars)
         sliced.chain = self.chain
@@ -307,10 +359,85 @@ class NDArray(base.BaseTrace):
         with variable names as keys.
         """
         idx = int(idx)
+        self._flush_flat()
         return {varname: values[idx]
                 for varname, values in self.samples.items()}
 
 
+class _TemporaryDirectory(object):
+    """A temporary directory that is removed with the last reference to
+    this object."""
+
+    def __init__(self, prefix):
+        self.name = tempfile.mkdtemp(prefix=prefix)
+
+    def __del__(self, _rmtree=shutil.rmtree):
+        # `shutil` may already be gone when this runs at interpreter exit
+        _rmtree(self.name, ignore_errors=True)
+
+
+class MemmapNDArray(NDArray):
+    """NDArray trace object with the samples in memory-mapped files
+
+    Every variable is stored in its own file, which is mapped into memory
+    with `np.memmap`. The operating system keeps only the pages that are
+    in use in RAM, so traces can be larger than the available memory.
+    Continuing a chain grows the files in place instead of copying the
+    existing draws. Sampler statistics are kept in memory.
+
+    Parameters
+    ----------
+    name : str
+        Directory for the sample files. It is created if it does not
+        exist, and the files are kept when the trace is deleted. If None,
+        a new temporary directory is used, which is removed together
+        with the trace and its copies.
+    model : Model
+        If None, the model is taken from the `with` context.
+    vars : list of variables
+        Sampling values will be stored for these variables. If None,
+        `model.unobserved_RVs` is used.
+    """
+
+    def __init__(self, name=None, model=None, vars=None, test_point=None):
+        self._tempdir = None
+        if name is None:
+            self._tempdir = _TemporaryDirectory('pymc3_memmap_')
+            name = self._tempdir.name
+        super(MemmapNDArray, self).__init__(name, model, vars, test_point)
+        if not os.path.exists(name):
+            os.makedirs(name)
+        self.directory = name
+
+    def _allocate_samples(self, draws):
+        old_draws = len(self)
+        self.draws = old_draws + draws
+        self.draw_idx = old_draws
+        for varname, shape in self.var_shapes.items():
+            self.samples[varname] = self._map_file(
+                varname, shape, self.var_dtypes[varname], self.draws)
+
+    def _map_file(self, varname, shape, dtype, draws):
+        filename = os.path.join(self.directory,
+                                'chain-{}_{}.dat'.format(self.chain, varname))
+        shape = (draws,) + tuple(shape)
+        nbytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        if not nbytes:
+            # Empty files can not be mapped
+            return np.zeros(shape, dtype=dtype)
+        # Extend (or create) the file, the existing draws stay in place
+        with open(filename, 'ab') as buff:
+            buff.truncate(nbytes)
+        return np.memmap(filename, dtype=dtype, mode='r+', shape=shape)
+
+    def close(self):
+        self._flush_flat()
+        for values in self.samples.values():
+            if isinstance(values, np.memmap):
+                values.flush()
+        super(MemmapNDArray, self).close()
+
+
 def _slice_as_ndarray(strace, idx):
     sliced = NDArray(model=strace.model, vars=strace.vars)
     sliced.chain = strace.chain
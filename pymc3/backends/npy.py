@@ -0,0 +1,418 @@
+"""Binary columnar trace backend
+
+Store sampling values as NumPy `.npy` files, one per variable.
+
+File format
+-----------
+
+Sampling values for each chain are saved in a separate directory
+(`chain-<chain>`, under a directory specified by the `name` argument).
+Every variable and every sampler statistic is stored in its own `.npy`
+file, with the draws along the first axis. Sampler statistics are named
+`__stat_<sampler index>_<name>.npy`. A small `index.json` file holds
+the variable names, shapes and dtypes, the sampler statistics and the
+number of draws.
+
+Draws are appended to the files while sampling, without any
+formatting. The `.npy` headers are updated when the trace is closed, so
+after sampling each file can also be read with
+`np.load(filename, mmap_mode='r')`. If sampling is interrupted, the
+number of complete draws is recovered from the file sizes, which makes
+it possible to load or continue the chain.
+"""
+from glob import glob
+import json
+import os
+import struct
+
+import numpy as np
+
+from ..backends import base, ndarray
+
+_MAGIC = b'\x93NUMPY\x01\x00'
+# Space reserved in the header for the number of draws
+_MAX_DRAWS = 10 ** 18
+
+
+def _header_string(dtype, shape):
+    return "{'descr': %r, 'fortran_order': False, 'shape': %r, }" % (
+        np.lib.format.dtype_to_descr(np.dtype(dtype)), tuple(shape))
+
+
+def _header_length(dtype, shape):
+    """Number of bytes of a `.npy` header that can hold any draw count."""
+    length = len(_MAGIC) + 2 + len(_header_string(dtype, (_MAX_DRAWS,) + shape)) + 1
+    return -(-length // 64) * 64
+
+
+def _write_header(fh, dtype, shape, draws):
+    header_len = _header_length(dtype, shape)
+    header = _header_string(dtype, (draws,) + tuple(shape))
+    header = header.ljust(header_len - len(_MAGIC) - 2 - 1) + '\n'
+    fh.seek(0)
+    fh.write(_MAGIC)
+    fh.write(struct.pack('<H', len(header)))
+    fh.write(header.encode('latin1'))
+
+
+class _Column(object):
+    """One `.npy` file that draws are appended to."""
+
+    def __init__(self, filename, dtype, shape):
+        self.filename = filename
+        self.dtype = np.dtype(dtype)
+        self.shape = tuple(shape)
+        self.offset = _header_length(self.dtype, self.shape)
+        self.row_bytes = int(np.prod(self.shape, dtype=int)) * self.dtype.itemsize
+        self._fh = None
+
+    def stored_draws(self):
+        """Number of complete draws in the file."""
+        if not os.path.exists(self.filename):
+            return 0
+        nbytes = os.path.getsize(self.filename) - self.offset
+        if self.row_bytes == 0 or nbytes <= 0:
+            return 0
+        return nbytes // self.row_bytes
+
+    def open(self, draws):
+        """Open the file for appending after the first `draws` draws."""
+        if os.path.exists(self.filename):
+            self._fh = open(self.filename, 'r+b')
+        else:
+            self._fh = open(self.filename, 'w+b')
+        # Drop incomplete draws of an interrupted run
+        self._fh.truncate(self.offset + draws * self.row_bytes)
+        _write_header(self._fh, self.dtype, self.shape, draws)
+        self._fh.seek(0, os.SEEK_END)
+
+    def append(self, value):
+        self._fh.write(np.ascontiguousarray(value, dtype=self.dtype).tobytes())
+
+    def flush(self):
+        if self._fh is not None:
+            self._fh.flush()
+
+    def close(self, draws):
+        if self._fh is None:
+            return
+        _write_header(self._fh, self.dtype, self.shape, draws)
+        self._fh.close()
+        self._fh = None
+
+    def read(self, draws):
+        """Map the first `draws` draws into memory, read-only."""
+        self.flush()
+        shape = (draws,) + self.shape
+        if draws == 0 or self.row_bytes == 0:
+            return np.zeros(shape, dtype=self.dtype)
+        return np.memmap(self.filename, dtype=self.dtype, mode='r',
+                         offset=self.offset, shape=shape)
+
+
+class NPY(base.BaseTrace):
+    """Binary columnar trace object
+
+    Parameters
+    ----------
+    name : str
+        Name of directory to store the chain directories in
+    model : Model
+        If None, the model is taken from the `with` context.
+    vars : list of variables
+        Sampling values will be stored for these variables. If None,
+        `model.unobserved_RVs` is used.
+    test_point : dict
+        use different test point that might be with changed variables shapes
+    """
+
+    supports_sampler_stats = True
+
+    index_file = 'index.json'
+
+    def __init__(self, name, model=None, vars=None, test_point=None):
+        if not os.path.exists(name):
+            os.mkdir(name)
+        super(NPY, self).__init__(name, model, vars, test_point)
+
+        self.directory = None
+        self.draw_idx = 0
+        self._columns = {}
+        self._stat_columns = None
+
+    def _chain_directory(self, chain):
+        return os.path.join(self.name, 'chain-{}'.format(chain))
+
+    def _make_columns(self):
+        self._columns = {
+            varname: _Column(os.path.join(self.directory, varname + '.npy'),
+                             self.var_dtypes[varname], self.var_shapes[varname])
+            for varname in self.varnames}
+        if self.sampler_vars is None:
+            self._stat_columns = None
+            return
+        self._stat_columns = []
+        for i, vars in enumerate(self.sampler_vars):
+            columns = {}
+            for key, dtype in vars.items():
+                filename = '__stat_{}_{}.npy'.format(i, key)
+                columns[key] = _Column(os.path.join(self.directory, filename),
+                                       dtype, ())
+            self._stat_columns.append(columns)
+
+    def _all_columns(self):
+        columns = list(self._columns.values())
+        for stat_columns in self._stat_columns or []:
+            columns.extend(stat_columns.values())
+        return columns
+
+    def _index(self):
+        sampler_vars = None
+        if self.sampler_vars is not None:
+            sampler_vars = [{key: np.dtype(dtype).str for key, dtype in vars.items()}
+                            for vars in self.sampler_vars]
+        return {
+            'chain': self.chain,
+            'draws': self.draw_idx,
+            'varnames': self.varnames,
+            'shapes': {v: list(shape) for v, shape in self.var_shapes.items()},
+            'dtypes': {v: np.dtype(dtype).str for v, dtype in self.var_dtypes.items()},
+            'sampler_vars': sampler_vars,
+        }
+
+    def _write_index(self):
+        with open(os.path.join(self.directory, self.index_file), 'w') as buff:
+            json.dump(self._index(), buff)
+
+    def _read_index(self):
+        with open(os.path.join(self.directory, self.index_file)) as buff:
+            return json.load(buff)
+
+    def _recover_draws(self):
+        """Number of draws stored in all files of the chain."""
+        return min(column.stored_draws() for column in self._all_columns())
+
+    # Sampling methods
+
+    def setup(self, draws, chain, sampler_vars=None):
+        """Perform chain-specific setup.
+
+        If the chain directory exists already, new draws are appended to
+        the stored ones.
+
+        Parameters
+        ----------
+        draws : int
+            Expected number of draws
+        chain : int
+            Chain number
+        sampler_vars : list of dicts
+            Names and dtypes of the variables that are
+            exported by the samplers.
+        """
+        self.close()
+        super(NPY, self).setup(draws, chain, sampler_vars)
+
+        self.chain = chain
+        self.directory = self._chain_directory(chain)
+
+        if os.path.exists(os.path.join(self.directory, self.index_file)):
+            index = self._read_index()
+            if (index['varnames'] != self.varnames or
+                    index['shapes'] != self._index()['shapes']):
+                raise base.BackendError(
+                    "Previous chain '{}' has different variables "
+                    "than current model.".format(self.directory))
+            if index['sampler_vars'] != self._index()['sampler_vars']:
+                raise ValueError(
+                    "Previous chain '{}' has different sampler "
+                    "statistics.".format(self.directory))
+            self._make_columns()
+            self.draw_idx = self._recover_draws()
+        else:
+            if not os.path.exists(self.directory):
+                os.mkdir(self.directory)
+            self._make_columns()
+            self.draw_idx = 0
+
+        for column in self._all_columns():
+            column.open(self.draw_idx)
+        self._write_index()
+
+    def record(self, point, sampler_stats=None):
+        """Record results of a sampling iteration.
+
+        Parameters
+        ----------
+        point : dict
+            Values mapped to variable names
+        sampler_stats : list of dicts
+            The diagnostic values for each sampler
+        """
+        if self._stat_columns is not None and sampler_stats is None:
+            raise ValueError("Expected sampler_stats")
+        if self._stat_columns is None and sampler_stats is not None:
+            raise ValueError("Unknown sampler_stats")
+
+        for varname, value in zip(self.varnames, self.fn(point)):
+            self._columns[varname].append(value)
+        if sampler_stats is not None:
+            for columns, vars in zip(self._stat_columns, sampler_stats):
+                for key, val in vars.items():
+                    columns[key].append(val)
+        self.draw_idx += 1
+
+    def close(self):
+        if self.directory is None:
+            return
+        for column in self._all_columns():
+            column.close(self.draw_idx)
+        self._write_index()
+
+    # Selection methods
+
+    def __len__(self):
+        if self.directory is None:
+            return 0
+        return self.draw_idx
+
+    def get_values(self, varname, burn=0, thin=1):
+        """Get values from trace.
+
+        The values are a read-only memory map of the file.
+
+        Parameters
+        ----------
+        varname : str
+        burn : int
+        thin : int
+
+        Returns
+        -------
+        A NumPy array
+        """
+        return self._columns[varname].read(len(self))[burn::thin]
+
+    def _get_sampler_stats(self, varname, sampler_idx, burn, thin):
+        return self._stat_columns[sampler_idx][varname].read(len(self))[burn::thin]
+
+    def _slice(self, idx):
+        idx = slice(*idx.indices(len(self)))
+
+        sliced = ndarray.NDArray(model=self.model, vars=self.vars)
+        sliced.chain = self.chain
+        sliced.samples = {varname: self.get_values(varname)[idx]
+                          for varname in self.varnames}
+        sliced.sampler_vars = self.sampler_vars
+        sliced.draw_idx = (idx.stop - idx.start) // idx.step
+
+        if self._stat_columns is None:
+            return sliced
+        sliced._stats = []
+        for i, columns in enumerate(self._stat_columns):
+            sliced._stats.append({key: self._get_sampler_stats(key, i, 0, 1)[idx]
+                                  for key in columns})
+        return sliced
+
+    def point(self, idx):
+        """Return dictionary of point values at `idx` for current chain
+        with variables names as keys.
+        """
+        idx = int(idx)
+        return {varname: np.array(self.get_values(varname)[idx])
+                for varname in self.varnames}
+
+
+def load(name, model=None):
+    """Load NPY database.
+
+    Parameters
+    ----------
+    name : str
+        Name of directory with chain directories (one per chain)
+    model : Model
+        If None, the model is taken from the `with` context.
+
+    Returns
+    -------
+    A MultiTrace instance
+    """
+    directories = glob(os.path.join(name, 'chain-*'))
+
+    if len(directories) == 0:
+        raise ValueError('No chains present in directory {}'.format(name))
+
+    straces = []
+    for directory in directories:
+        chain = int(directory.rsplit('-', 1)[1])
+        strace = NPY(name, model=model)
+        strace.chain = chain
+        strace.directory = directory
+        index = strace._read_index()
+        if index['sampler_vars'] is not None:
+            strace._set_sampler_vars(
+                [{key: np.dtype(dtype) for key, dtype in vars.items()}
+                 for vars in index['sampler_vars']])
+        strace._make_columns()
+        strace.draw_idx = strace._recover_draws()
+        straces.append(strace)
+    return base.MultiTrace(straces)
+
+
+def _dump_column(filename, values):
+    values = np.asarray(values)
+    column = _Column(filename, values.dtype, values.shape[1:])
+    column.open(0)
+    column.append(values)
+    column.close(len(values))
+
+
+def dump(name, trace, chains=None):
+    """Store values from a MultiTrace as NPY chain directories.
+
+    Parameters
+    ----------
+    name : str
+        Name of directory to store the chain directories in
+    trace : MultiTrace
+        Result of MCMC run
+    chains : list
+        Chains to dump. If None, all chains are dumped.
+    """
+    if not os.path.exists(name):
+        os.mkdir(name)
+    if chains is None:
+        chains = trace.chains
+
+    for chain in chains:
+        strace = trace._straces[chain]
+        directory = os.path.join(name, 'chain-{}'.format(chain))
+        if not os.path.exists(directory):
+            os.mkdir(directory)
+
+        values = {varname: strace.get_values(varname)
+                  for varname in strace.varnames}
+        for varname, vals in values.items():
+            _dump_column(os.path.join(directory, varname + '.npy'), vals)
+
+        sampler_vars = None
+        if strace.supports_sampler_stats and strace.sampler_vars is not None:
+            sampler_vars = []
+            for i, vars in enumerate(strace.sampler_vars):
+                sampler_vars.append({key: np.dtype(dtype).str
+                                     for key, dtype in vars.items()})
+                for key in vars:
+                    filename = '__stat_{}_{}.npy'.format(i, key)
+                    _dump_column(os.path.join(directory, filename),
+                                 strace._get_sampler_stats(key, i, 0, 1))
+
+        index = {
+            'chain': chain,
+            'draws': len(strace),
+            'varnames': strace.varnames,
+            'shapes': {v: list(vals.shape[1:]) for v, vals in values.items()},
+            'dtypes': {v: vals.dtype.str for v, vals in values.items()},
+            'sampler_vars': sampler_vars,
+        }
+        with open(os.path.join(directory, NPY.index_file), 'w') as buff:
+            json.dump(index, buff)
@@ -42,12 +42,18 @@ class SamplerReport(object):
         self._global_warnings = []
         self._effective_n = None
         self._gelman_rubin = None
+        self._online_diagnostics = None
 
     @property
     def _warnings(self):
         chains = sum(self._chain_warnings.values(), [])
         return chains + self._global_warnings
 
+    @property
+    def online_diagnostics(self):
+        """The `OnlineDiagnostics` updated during sampling, if any."""
+        return self._online_diagnostics
+
     @property
     def ok(self):
         """Whether the automatic convergence checks found serious problems."""
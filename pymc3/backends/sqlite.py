@@ -6,15 +6,24 @@ Database format
 ---------------
 For each variable, a table is created with the following format:
 
- recid (INT), draw (INT), chain (INT),  v0 (FLOAT), v1 (FLOAT), v2 (FLOAT) ...
-
-The variable column names are extended to reflect additional dimensions.
-For example, a variable with the shape (2, 2) would be stored as
+ recid (INT), draw (INT), chain (INT), value (BLOB)
 
- key (INT), draw (INT), chain (INT),  v0_0 (FLOAT), v0_1 (FLOAT), v1_0 (FLOAT) ...
+The value column holds the raw bytes of the variable at that draw, in
+C order and with the dtype of the variable, so that the values can be
+read back with `np.frombuffer`.
 
 The key is autoincremented each time a new row is added to the table.
 The chain column denotes the chain index and starts at 0.
+
+The database is opened in write-ahead logging (WAL) mode, and draws are
+inserted in batches of `queue_limit` draws per transaction.
+
+Databases written by earlier versions, which have one FLOAT or INT
+column per element of the variable,
+
+ recid (INT), draw (INT), chain (INT),  v0 (FLOAT), v1 (FLOAT), v2 (FLOAT) ...
+
+can still be loaded and appended to.
 """
 import numpy as np
 import sqlite3
@@ -26,7 +35,7 @@ TEMPLATES = {
     'table':            ('CREATE TABLE IF NOT EXISTS [{table}] '
                          '(recid INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT, '
                          'draw INTEGER, chain INT(5), '
-                         '{value_cols})'),
+                         'value BLOB)'),
     'insert':           ('INSERT INTO [{table}] '
                          '(recid, draw, chain, {value_cols}) '
                          'VALUES (NULL, ?, ?, {values})'),
@@ -34,6 +43,7 @@ TEMPLATES = {
                          'WHERE chain = ?'),
     'draw_count':       ('SELECT COUNT(*) FROM [{table}] '
                          'WHERE chain = ?'),
+    'columns':          'PRAGMA table_info([{table}])',
     # Named placeholders are used in the selection templates because
     # some values occur more than once in the same template.
     'select':           ('SELECT * FROM [{table}] '
@@ -72,22 +82,27 @@ class SQLite(base.BaseTrace):
         `model.unobserved_RVs` is used.
     test_point : dict
         use different test point that might be with changed variables shapes
+    queue_limit : int
+        Number of draws that are inserted in a single transaction.
     """
 
-    def __init__(self, name, model=None, vars=None, test_point=None):
+    def __init__(self, name, model=None, vars=None, test_point=None,
+                 queue_limit=5000):
         super(SQLite, self).__init__(name, model, vars, test_point)
         self._var_cols = {}
         self.var_inserts = {}  # varname -> insert statement
         self.draw_idx = 0
         self._is_setup = False
         self._len = None
+        # Whether the values are stored in a BLOB column
+        self._is_blob = True
 
         self.db = _SQLiteDB(name)
         # Inserting sampling information is queued to avoid locks
         # caused by hitting the database with transactions each
         # iteration.
         self._queue = {varname: [] for varname in self.varnames}
-        self._queue_limit = 5000
+        self._queue_limit = queue_limit
 
     # Sampling methods
 
@@ -108,9 +123,9 @@ class SQLite(base.BaseTrace):
             self.draw_idx = self._get_max_draw(chain) + 1
             self._len = None
         else:  # Table has not been created.
-            self._var_cols = {varname: ttab.create_flat_names('v', shape)
-                              for varname, shape in self.var_shapes.items()}
             self._create_table()
+            self._is_blob = _is_blob_table(self.db.cursor, self.varnames[0])
+            self._var_cols = _get_var_cols(self.var_shapes, self._is_blob)
             self._is_setup = True
         self._create_insert_queries()
         self._closed = False
@@ -118,15 +133,8 @@ class SQLite(base.BaseTrace):
     def _create_table(self):
         template = TEMPLATES['table']
         with self.db.con:
-            for varname, var_cols in self._var_cols.items():
-                if np.issubdtype(self.var_dtypes[varname], np.integer):
-                    dtype = 'INT'
-                else:
-                    dtype = 'FLOAT'
-                colnames = ', '.join([v + ' ' + dtype for v in var_cols])
-                statement = template.format(table=varname,
-                                            value_cols=colnames)
-                self.db.cursor.execute(statement)
+            for varname in self.varnames:
+                self.db.cursor.execute(template.format(table=varname))
 
     def _create_insert_queries(self):
         template = TEMPLATES['insert']
@@ -148,14 +156,23 @@ class SQLite(base.BaseTrace):
             Values mapped to variable names
         """
         for varname, value in zip(self.varnames, self.fn(point)):
-            values = (self.draw_idx, self.chain) + tuple(np.ravel(value))
+            if self._is_blob:
+                value = np.ascontiguousarray(value,
+                                             dtype=self.var_dtypes[varname])
+                values = (self.draw_idx, self.chain,
+                          sqlite3.Binary(value.tobytes()))
+            else:
+                values = (self.draw_idx, self.chain) + tuple(np.ravel(value))
             self._queue[varname].append(values)
 
-        if len(self._queue[self.varnames[0]]) > self._queue_limit:
+        if len(self._queue[self.varnames[0]]) >= self._queue_limit:
             self._execute_queue()
         self.draw_idx += 1
 
     def _execute_queue(self):
+        # The database is shared by the chains and may have been closed
+        # by one of them
+        self.db.connect()
         with self.db.con:
             for varname in self.varnames:
                 if not self._queue[varname]:
@@ -170,6 +187,7 @@ class SQLite(base.BaseTrace):
         self._execute_queue()
         self.db.close()
         self._closed = True
+        self._len = None
 
     # Selection methods
 
@@ -243,12 +261,15 @@ class SQLite(base.BaseTrace):
         shape = (-1,) + self.var_shapes[varname]
         statement = TEMPLATES[action].format(table=varname)
         self.db.cursor.execute(statement, statement_args)
-        values = _rows_to_ndarray(self.db.cursor)
+        values = self._rows_to_ndarray(varname)
         return values.reshape(shape)
 
+    def _rows_to_ndarray(self, varname):
+        if self._is_blob:
+            return _blobs_to_ndarray(self.db.cursor, self.var_dtypes[varname])
+        return _rows_to_ndarray(self.db.cursor)
+
     def _slice(self, idx):
-        if idx.stop is not None:
-            raise ValueError('Stop value in slice not supported.')
         return ndarray._slice_as_ndarray(self, idx)
 
     def point(self, idx):
@@ -265,7 +286,7 @@ class SQLite(base.BaseTrace):
         for varname in self.varnames:
             self.db.cursor.execute(statement.format(table=varname),
                                    statement_args)
-            values = _rows_to_ndarray(self.db.cursor)
+            values = self._rows_to_ndarray(varname)
             var_values[varname] = values.reshape(self.var_shapes[varname])
         return var_values
 
@@ -284,6 +305,10 @@ class _SQLiteDB(object):
         self.con = sqlite3.connect(self.name)
         self.connected = True
         self.cursor = self.con.cursor()
+        # Readers do not block the writer, and a sync is only needed
+        # at checkpoints instead of at every transaction.
+        self.cursor.execute('PRAGMA journal_mode=WAL')
+        self.cursor.execute('PRAGMA synchronous=NORMAL')
 
     def close(self):
         if not self.connected:
@@ -316,12 +341,14 @@ def load(name, model=None):
                           '`{}`'.format(name)))
     chains = _get_chain_list(db.cursor, varnames[0])
 
+    is_blob = _is_blob_table(db.cursor, varnames[0])
+
     straces = []
     for chain in chains:
         strace = SQLite(name, model=model)
         strace.chain = chain
-        strace._var_cols = {varname: ttab.create_flat_names('v', shape)
-                            for varname, shape in strace.var_shapes.items()}
+        strace._is_blob = is_blob
+        strace._var_cols = _get_var_cols(strace.var_shapes, is_blob)
         strace._is_setup = True
         strace.db = db  # Share the db with all traces.
         straces.append(strace)
@@ -344,6 +371,20 @@ def _get_var_strs(cursor, varname):
     return [name for name in col_names if name.startswith('v')]
 
 
+def _is_blob_table(cursor, varname):
+    """Return whether the values of `varname` are stored as BLOBs."""
+    cursor.execute(TEMPLATES['columns'].format(table=varname))
+    col_names = [row[1] for row in cursor.fetchall()]
+    return 'value' in col_names
+
+
+def _get_var_cols(var_shapes, is_blob):
+    if is_blob:
+        return {varname: ['value'] for varname in var_shapes}
+    return {varname: ttab.create_flat_names('v', shape)
+            for varname, shape in var_shapes.items()}
+
+
 def _get_chain_list(cursor, varname):
     """Return a list of sorted chains for `varname`."""
     cursor.execute('SELECT DISTINCT chain FROM [{}]'.format(varname))
@@ -355,3 +396,10 @@ def _get_chain_list(cursor, varname):
 def _rows_to_ndarray(cursor):
     """Convert SQL row to NDArray."""
     return np.squeeze(np.array([row[3:] for row in cursor.fetchall()]))
+
+
+def _blobs_to_ndarray(cursor, dtype):
+    """Convert SQL rows with a BLOB value to a flat NDArray."""
+    # An array on a bytearray is writable, unlike one on bytes
+    data = bytearray().join(bytes(row[3]) for row in cursor.fetchall())
+    return np.frombuffer(data, dtype=dtype)
@@ -139,8 +139,6 @@ class Text(base.BaseTrace):
         return vals[burn::thin]
 
     def _slice(self, idx):
-        if idx.stop is not None:
-            raise ValueError('Stop value in slice not supported.')
         return ndarray._slice_as_ndarray(self, idx)
 
     def point(self, idx):
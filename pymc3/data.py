@@ -12,7 +12,9 @@ __all__ = [
     'get_data',
     'GeneratorAdapter',
     'Minibatch',
-    'align_minibatches'
+    'align_minibatches',
+    'Data',
+    'set_data'
 ]
 
 
@@ -96,8 +98,9 @@ class Minibatch(tt.TensorVariable):
 
     Parameters
     ----------
-    data : :class:`ndarray`
-        initial data
+    data : :class:`ndarray` or shared variable
+        initial data. If it is a shared variable (e.g. a :class:`Data`
+        container), minibatches are drawn from its current value
     batch_size : `int` or `List[int|tuple(size, random_seed)]`
         batch size for inference, random seed is needed 
         for child random generators
@@ -236,12 +239,19 @@ class Minibatch(tt.TensorVariable):
     @theano.configparser.change_flags(compute_test_value='raise')
     def __init__(self, data, batch_size=128, dtype=None, broadcastable=None, name='Minibatch',
                  random_seed=42, update_shared_f=None, in_memory_size=None):
-        if dtype is None:
-            data = pm.smartfloatX(np.asarray(data))
+        if isinstance(data, tt.sharedvar.SharedVariable):
+            # e.g. a `Data` container, minibatches are drawn from its
+            # current value
+            if in_memory_size is not None:
+                raise ValueError('`in_memory_size` can not be used with shared data')
+            self.shared = data
         else:
-            data = np.asarray(data, dtype)
-        in_memory_slc = self.make_static_slices(in_memory_size)
-        self.shared = theano.shared(data[in_memory_slc])
+            if dtype is None:
+                data = pm.smartfloatX(np.asarray(data))
+            else:
+                data = np.asarray(data, dtype)
+            in_memory_slc = self.make_static_slices(in_memory_size)
+            self.shared = theano.shared(data[in_memory_slc])
         self.update_shared_f = update_shared_f
         self.random_slc = self.make_random_slices(self.shared.shape, batch_size, random_seed)
         minibatch = self.shared[self.random_slc]
@@ -387,3 +397,64 @@ def align_minibatches(batches=None):
                 raise TypeError('{b} is not a Minibatch')
             for rng in Minibatch.RNG[id(b)]:
                 rng.seed()
+
+
+class Data(object):
+    """Data container that wraps a theano shared variable and adds it to
+    the model.
+
+    Observed data and predictors that are stored in a container can be
+    changed with :func:`set_data`, also to arrays of a different length,
+    without rebuilding the model. The compiled logp and dlogp functions and
+    the step methods use the new values, and `sample_posterior_predictive`
+    draws samples with the new shapes.
+
+    Parameters
+    ----------
+    name : str
+        The name of the container in the model
+    value : array like
+        The initial data
+
+    Examples
+    --------
+    >>> x = np.random.randn(100)
+    >>> y = 2 * x + np.random.randn(100)
+    >>> with pm.Model() as model:
+    ...     x_data = pm.Data('x', x)
+    ...     y_data = pm.Data('y', y)
+    ...     slope = pm.Normal('slope', 0, 10)
+    ...     pm.Normal('obs', slope * x_data, 1, observed=y_data)
+    ...     trace = pm.sample()
+    ...     # Predict for new inputs, the model is not compiled again
+    ...     pm.set_data({'x': np.linspace(-1, 1, 5), 'y': np.zeros(5)})
+    ...     ppc = pm.sample_posterior_predictive(trace)
+    """
+
+    def __new__(cls, name, value):
+        try:
+            model = pm.Model.get_context()
+        except TypeError:
+            raise TypeError("No model on context stack, which is needed to "
+                            "instantiate a data container. Add variable "
+                            "inside a 'with model:' block.")
+        shared = theano.shared(pm.model.pandas_to_array(value), model.name_for(name))
+        model.add_random_variable(shared)
+        return shared
+
+
+def set_data(new_data, model=None):
+    """Change the values of :class:`Data` containers of a model.
+
+    Parameters
+    ----------
+    new_data : dict
+        New values of the containers, by name
+    model : Model (optional if in `with` context)
+    """
+    model = pm.modelcontext(model)
+    for name, value in new_data.items():
+        var = model[name]
+        if not isinstance(var, tt.sharedvar.SharedVariable):
+            raise TypeError('{} is not a data container.'.format(name))
+        var.set_value(np.asarray(pm.model.pandas_to_array(value), var.dtype))
@@ -1,11 +1,11 @@
 """Convergence diagnostics and model validation"""
 
 import numpy as np
-from .stats import statfunc, autocov
+from .stats import statfunc
 from .util import get_default_varnames
 from .backends.base import MultiTrace
 
-__all__ = ['geweke', 'gelman_rubin', 'effective_n']
+__all__ = ['geweke', 'gelman_rubin', 'effective_n', 'OnlineDiagnostics']
 
 
 @statfunc
@@ -142,21 +142,9 @@ def gelman_rubin(mtrace, varnames=None, include_transformed=False):
     Brooks and Gelman (1998)
     Gelman and Rubin (1992)"""
 
-    def rscore(x, num_samples):
-        # Calculate between-chain variance
-        B = num_samples * np.var(np.mean(x, axis=1), axis=0, ddof=1)
-
-        # Calculate within-chain variance
-        W = np.mean(np.var(x, axis=1, ddof=1), axis=0)
-
-        # Estimate of marginal posterior variance
-        Vhat = W * (num_samples - 1) / num_samples + B / num_samples
-
-        return np.sqrt(Vhat / W)
-
     if not isinstance(mtrace, MultiTrace):
         # Return rscore for passed arrays
-        return rscore(np.array(mtrace), mtrace.shape[1])
+        return _rscore(np.array(mtrace))
 
     if mtrace.nchains < 2:
         raise ValueError(
@@ -166,14 +154,26 @@ def gelman_rubin(mtrace, varnames=None, include_transformed=False):
     if varnames is None:
         varnames = get_default_varnames(mtrace.varnames, include_transformed=include_transformed)
 
-    Rhat = {}
+    x, shapes = _stack_varnames(mtrace, varnames)
+    return _unstack_varnames(_rscore(x), varnames, shapes)
+
+
+def _rscore(x):
+    """Compute the potential scale reduction factor for all elements of `x`
+    at once, where `x` has the shape (chains, draws, ...).
+    """
+    num_samples = x.shape[1]
+
+    # Calculate between-chain variance
+    B = num_samples * np.var(np.mean(x, axis=1), axis=0, ddof=1)
 
-    for var in varnames:
-        x = np.array(mtrace.get_values(var, combine=False))
-        num_samples = x.shape[1]
-        Rhat[var] = rscore(x, num_samples)
+    # Calculate within-chain variance
+    W = np.mean(np.var(x, axis=1, ddof=1), axis=0)
 
-    return Rhat
+    # Estimate of marginal posterior variance
+    Vhat = W * (num_samples - 1) / num_samples + B / num_samples
+
+    return np.sqrt(Vhat / W)
 
 
 def effective_n(mtrace, varnames=None, include_transformed=False):
@@ -212,79 +212,14 @@ def effective_n(mtrace, varnames=None, include_transformed=False):
     ----------
     Gelman et al. BDA (2014)"""
 
-    def get_neff(x):
-        """Compute the effective sample size for a 2D array
-        """
-        trace_value = x.T
-        nchain, n_samples = trace_value.shape
-
-        acov = np.asarray([autocov(trace_value[chain]) for chain in range(nchain)])
-
-        chain_mean = trace_value.mean(axis=1)
-        chain_var = acov[:, 0] * n_samples / (n_samples - 1.)
-        acov_t = acov[:, 1] * n_samples / (n_samples - 1.)
-        mean_var = np.mean(chain_var)
-        var_plus = mean_var * (n_samples - 1.) / n_samples
-        var_plus += np.var(chain_mean, ddof=1)
-
-        rho_hat_t = np.zeros(n_samples)
-        rho_hat_even = 1.
-        rho_hat_t[0] = rho_hat_even
-        rho_hat_odd = 1. - (mean_var - np.mean(acov_t)) / var_plus
-        rho_hat_t[1] = rho_hat_odd
-        # Geyer's initial positive sequence
-        max_t = 1
-        t = 1
-        while t < (n_samples - 2) and (rho_hat_even + rho_hat_odd) >= 0.:
-            rho_hat_even = 1. - (mean_var - np.mean(acov[:, t + 1])) / var_plus
-            rho_hat_odd = 1. - (mean_var - np.mean(acov[:, t + 2])) / var_plus
-            if (rho_hat_even + rho_hat_odd) >= 0:
-                rho_hat_t[t + 1] = rho_hat_even
-                rho_hat_t[t + 2] = rho_hat_odd
-            max_t = t + 2
-            t += 2
-
-        # Geyer's initial monotone sequence
-        t = 3
-        while t <= max_t - 2:
-            if (rho_hat_t[t + 1] + rho_hat_t[t + 2]) > (rho_hat_t[t - 1] + rho_hat_t[t]):
-                rho_hat_t[t + 1] = (rho_hat_t[t - 1] + rho_hat_t[t]) / 2.
-                rho_hat_t[t + 2] = rho_hat_t[t + 1]
-            t += 2
-        ess = nchain * n_samples
-        ess = ess / (-1. + 2. * np.sum(rho_hat_t))
-        return ess
-
-    def generate_neff(trace_values):
-        x = np.array(trace_values)
-        shape = x.shape
-
-        # Make sure to handle scalars correctly, adding extra dimensions if
-        # needed. We could use np.squeeze here, but we don't want to squeeze
-        # out dummy dimensions that a user inputs.
-        if len(shape) == 2:
-            x = np.atleast_3d(trace_values)
-
-        # Transpose all dimensions, which makes the loop below
-        # easier by moving the axes of the variable to the front instead
-        # of the chain and sample axes.
-        x = x.transpose()
-
-        # Get an array the same shape as the var
-        _n_eff = np.zeros(x.shape[:-2])
-
-        # Iterate over tuples of indices of the shape of var
-        for tup in np.ndindex(*list(x.shape[:-2])):
-            _n_eff[tup] = get_neff(x[tup])
-
-        if len(shape) == 2:
-            return _n_eff[0]
-
-        return np.transpose(_n_eff)
-
     if not isinstance(mtrace, MultiTrace):
         # Return neff for non-multitrace array
-        return generate_neff(mtrace)
+        x = np.asarray(mtrace)
+        shape = x.shape[2:]
+        n_eff = _get_neff(x.reshape(x.shape[:2] + (-1,)))
+        if len(shape) == 0:
+            return n_eff[0]
+        return n_eff.reshape(shape)
 
     if mtrace.nchains < 2:
         raise ValueError(
@@ -294,9 +229,283 @@ def effective_n(mtrace, varnames=None, include_transformed=False):
     if varnames is None:
         varnames = get_default_varnames(mtrace.varnames,include_transformed=include_transformed)
 
-    n_eff = {}
+    x, shapes = _stack_varnames(mtrace, varnames)
+    return _unstack_varnames(_get_neff(x), varnames, shapes)
+
+
+def _autocov(x):
+    """Compute the autocovariance of every column of every chain of `x` with
+    a single FFT along the draw axis, where `x` has the shape
+    (chains, draws, elements).
+
+    Gives the same estimates as `stats.autocov` applied to each column.
+    """
+    n_samples = x.shape[1]
+    y = x - x.mean(axis=1, keepdims=True)
+    # Zero padding to a power of two avoids circular overlap
+    n_fft = 2 ** int(np.ceil(np.log2(2 * n_samples - 1)))
+    freqs = np.fft.rfft(y, n=n_fft, axis=1)
+    acov = np.fft.irfft(freqs * np.conjugate(freqs), n=n_fft, axis=1)[:, :n_samples]
+    return acov / np.arange(n_samples, 0, -1)[None, :, None]
+
+
+def _get_neff(x):
+    """Compute the effective sample size for all elements of `x` at once,
+    where `x` has the shape (chains, draws, elements).
+    """
+    nchain, n_samples = x.shape[:2]
+
+    acov = _autocov(x)
+
+    chain_mean = x.mean(axis=1)
+    chain_var = acov[:, 0] * n_samples / (n_samples - 1.)
+    acov_t = acov[:, 1] * n_samples / (n_samples - 1.)
+    mean_var = np.mean(chain_var, axis=0)
+    var_plus = mean_var * (n_samples - 1.) / n_samples
+    if nchain > 1:
+        var_plus += np.var(chain_mean, axis=0, ddof=1)
+
+    rho_hat = 1. - (mean_var - np.mean(acov, axis=0)) / var_plus
+    rho_hat_odd = 1. - (mean_var - np.mean(acov_t, axis=0)) / var_plus
+
+    # Sums of consecutive (even, odd) pairs of autocorrelations, starting at lag 2
+    n_pairs = max((n_samples - 2) // 2, 0)
+    pairs = rho_hat[2:2 + 2 * n_pairs:2] + rho_hat[3:3 + 2 * n_pairs:2]
+    # Geyer's initial positive sequence: keep the pairs up to the first
+    # negative one, including the pair at lags 0 and 1
+    positive = np.concatenate([[1. + rho_hat_odd >= 0.], pairs >= 0.])
+    keep = np.cumprod(positive, axis=0)[1:].astype(bool)
+    pairs = np.where(keep, pairs, 0.)
+    # Geyer's initial monotone sequence
+    pairs = np.minimum.accumulate(pairs, axis=0)
+
+    ess = nchain * n_samples
+    ess = ess / (-1. + 2. * (1. + rho_hat_odd + np.sum(pairs, axis=0)))
+    return ess
+
+
+def _stack_varnames(mtrace, varnames):
+    """Stack the flattened values of all `varnames` into an array of shape
+    (chains, draws, elements) and return it along with the variable shapes.
+    """
+    values = [np.asarray(mtrace.get_values(var, combine=False, squeeze=False))
+              for var in varnames]
+    shapes = [vals.shape[2:] for vals in values]
+    x = np.concatenate([vals.reshape(vals.shape[:2] + (-1,)) for vals in values],
+                       axis=2)
+    return x, shapes
 
-    for var in varnames:
-        n_eff[var] = generate_neff(mtrace.get_values(var, combine=False))
 
-    return n_eff
+def _unstack_varnames(values, varnames, shapes):
+    """Split the flat `values` computed from `_stack_varnames` into a dict
+    of arrays with the shapes of the variables.
+    """
+    result = {}
+    idx = 0
+    for var, shape in zip(varnames, shapes):
+        size = int(np.prod(shape, dtype=int))
+        if len(shape) == 0:
+            result[var] = values[idx]
+        else:
+            result[var] = values[idx:idx + size].reshape(shape)
+        idx += size
+    return result
+
+
+class _ChainAccumulator(object):
+    """Running mean, variance and batch means of the draws of one chain."""
+
+    def __init__(self, size, min_batches):
+        self.n = 0
+        self.mean = np.zeros(size)
+        self.m2 = np.zeros(size)
+        self.min_batches = min_batches
+        self.batch_size = 1
+        self.batch_sum = np.zeros(size)
+        self.batch_count = 0
+        self.batch_means = np.zeros((2 * min_batches, size))
+        self.n_batches = 0
+        self.divergences = 0
+
+    def update(self, x):
+        # Welford's algorithm
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (x - self.mean)
+
+        self.batch_sum += x
+        self.batch_count += 1
+        if self.batch_count < self.batch_size:
+            return
+        if self.n_batches == len(self.batch_means):
+            self.batch_means = np.concatenate(
+                [self.batch_means, np.zeros_like(self.batch_means)])
+        self.batch_means[self.n_batches] = self.batch_sum / self.batch_size
+        self.n_batches += 1
+        self.batch_sum[:] = 0
+        self.batch_count = 0
+        if self.n_batches == 2 * max(self.min_batches, self.batch_size):
+            # Merge neighbouring batches, so that the batch size and the
+            # number of batches both grow like the square root of `n`
+            half = self.n_batches // 2
+            merged = (self.batch_means[0:self.n_batches:2]
+                      + self.batch_means[1:self.n_batches:2]) / 2
+            self.batch_means[:half] = merged
+            self.n_batches = half
+            self.batch_size *= 2
+
+    @property
+    def var(self):
+        return self.m2 / (self.n - 1)
+
+    def effective_n(self):
+        """Batch means estimate of the effective sample size.
+
+        Batches that are short compared with the autocorrelation time
+        are still correlated, so the estimate is divided by the
+        autocorrelation time of the batch means.
+        """
+        batch_means = self.batch_means[:self.n_batches]
+        var_bm = self.batch_size * np.var(batch_means, axis=0, ddof=1)
+        n_eff_bm = _get_neff(batch_means[None])
+        return (self.n * self.var / var_bm
+                * np.minimum(1., n_eff_bm / self.n_batches))
+
+
+class OnlineDiagnostics(object):
+    R"""Convergence diagnostics that are updated one draw at a time.
+
+    The mean and variance of every chain are accumulated with Welford's
+    algorithm, and the autocorrelation of the draws is taken into
+    account with batch means: the draws are averaged in batches, and
+    neighbouring batches are merged as the chain grows, so that the
+    batch size and the number of batches both grow like the square root
+    of the number of draws. The remaining autocorrelation of the batch
+    means is estimated as in `effective_n`.
+
+    `pm.sample` updates an instance with all draws after tuning if
+    `target_ess` is given, and `iter_sample` accepts one as
+    `diagnostics` argument.
+
+    Parameters
+    ----------
+    min_batches : int
+        Minimum number of batch means per chain. The effective sample
+        size of a chain is only estimated once that many draws have been
+        seen.
+
+    Examples
+    --------
+    ::
+
+        diagnostics = pm.diagnostics.OnlineDiagnostics()
+        for trace in pm.iter_sample(2000, step, tune=500,
+                                    diagnostics=diagnostics):
+            if diagnostics.converged(target_ess=400):
+                break
+    """
+
+    def __init__(self, min_batches=32):
+        if min_batches < 4:
+            raise ValueError("min_batches must be at least 4.")
+        self.min_batches = min_batches
+        self.varnames = None
+        self._shapes = None
+        self._chains = {}
+
+    @property
+    def chains(self):
+        """The chains that draws were recorded for."""
+        return sorted(self._chains)
+
+    def update(self, chain, point, stats=None):
+        """Add a draw of `chain`.
+
+        Parameters
+        ----------
+        chain : int
+        point : dict
+            Values of the variables at this draw
+        stats : list of dicts
+            The sampler statistics of the draw, used to count divergences
+        """
+        if self.varnames is None:
+            self.varnames = list(point)
+            self._shapes = [np.shape(point[var]) for var in self.varnames]
+        x = np.concatenate([np.ravel(point[var]) for var in self.varnames])
+        if chain not in self._chains:
+            self._chains[chain] = _ChainAccumulator(len(x), self.min_batches)
+        acc = self._chains[chain]
+        acc.update(x)
+        if stats is not None:
+            acc.divergences += sum(bool(stat.get('diverging', False))
+                                   for stat in stats)
+
+    def n_draws(self, chain):
+        """Number of draws recorded for `chain`."""
+        if chain not in self._chains:
+            return 0
+        return self._chains[chain].n
+
+    @property
+    def divergences(self):
+        """Number of divergent draws per chain."""
+        return {chain: acc.divergences for chain, acc in self._chains.items()}
+
+    def _selected(self, chains):
+        if chains is None:
+            chains = self.chains
+        return [self._chains[chain] for chain in chains if chain in self._chains]
+
+    def _all_seen(self, chains):
+        return chains is None or all(chain in self._chains for chain in chains)
+
+    def gelman_rubin(self, chains=None):
+        """Estimate of Rhat for every variable, computed from the means and
+        variances of the chains. NaN if fewer than two chains have at least
+        two draws.
+        """
+        accs = [acc for acc in self._selected(chains) if acc.n > 1]
+        if len(accs) < 2 or self.varnames is None:
+            return self._unstack(np.nan)
+        num_samples = np.mean([acc.n for acc in accs])
+        B = num_samples * np.var([acc.mean for acc in accs], axis=0, ddof=1)
+        W = np.mean([acc.var for acc in accs], axis=0)
+        Vhat = W * (num_samples - 1) / num_samples + B / num_samples
+        return self._unstack(np.sqrt(Vhat / W))
+
+    def effective_n(self, chains=None):
+        """Batch means estimate of the effective sample size of every
+        variable, summed over the chains. NaN while any of the chains has
+        fewer than `min_batches` draws.
+        """
+        accs = self._selected(chains)
+        if not accs or not self._all_seen(chains):
+            return self._unstack(np.nan)
+        if any(acc.n_batches < self.min_batches for acc in accs):
+            return self._unstack(np.nan)
+        return self._unstack(np.sum([acc.effective_n() for acc in accs], axis=0))
+
+    def converged(self, target_ess, chains=None, max_rhat=1.05):
+        """Whether the effective sample size of all variables reached
+        `target_ess` and, for more than one chain, Rhat is smaller than
+        `max_rhat` for all variables.
+        """
+        if self.varnames is None:
+            return False
+        ess = self.effective_n(chains)
+        if not all(np.all(val >= target_ess) for val in ess.values()):
+            return False
+        if len(self._selected(chains)) > 1:
+            rhat = self.gelman_rubin(chains)
+            if not all(np.all(val < max_rhat) for val in rhat.values()):
+                return False
+        return True
+
+    def _unstack(self, values):
+        if self.varnames is None:
+            return {}
+        size = sum(int(np.prod(shape, dtype=int)) for shape in self._shapes)
+        values = np.broadcast_to(values, (size,))
+        return _unstack_varnames(values, self.varnames, self._shapes)
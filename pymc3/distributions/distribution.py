@@ -5,7 +5,7 @@ import numpy as np
 import theano.tensor as tt
 from theano import function
 import theano
-from ..memoize import memoize
+from ..memoize import memoize, owner_cache
 from ..model import (
     Model, get_named_nodes_and_relations, FreeRV,
     ObservedRV, MultiObservedRV, Context, InitContextMeta
@@ -309,33 +309,59 @@ def draw_values(params, point=None, size=None):
             # params that could be drawn in variable order
             return [evaluated[i] for i in params]
 
-        # Distribution parameters may be nodes which have named node-inputs
-        # specified in the point. Need to find the node-inputs, their
-        # parents and children to replace them.
-        leaf_nodes = {}
-        named_nodes_parents = {}
-        named_nodes_children = {}
-        for _, param in symbolic_params:
-            if hasattr(param, 'name'):
-                # Get the named nodes under the `param` node
-                nn, nnp, nnc = get_named_nodes_and_relations(param)
-                leaf_nodes.update(nn)
-                # Update the discovered parental relationships
-                for k in nnp.keys():
-                    if k not in named_nodes_parents.keys():
-                        named_nodes_parents[k] = nnp[k]
-                    else:
-                        named_nodes_parents[k].update(nnp[k])
-                # Update the discovered child relationships
-                for k in nnc.keys():
-                    if k not in named_nodes_children.keys():
-                        named_nodes_children[k] = nnc[k]
-                    else:
-                        named_nodes_children[k].update(nnc[k])
+        # The graph analysis and the order in which nodes could be drawn
+        # only depend on the params, the names in the point and the
+        # already drawn nodes, so they are cached on the model.
+        cache = _get_draw_values_cache(params.values())
+        graph_key = tuple(p for _, p in symbolic_params)
+        order_key = (graph_key, frozenset(point), frozenset(drawn))
 
         # Init givens and the stack of nodes to try to `_draw_value` from
         givens = {p.name: (p, v) for p, v in drawn.items()
                   if getattr(p, 'name', None) is not None}
+
+        order = None
+        if cache is not None:
+            order = cache.find(('order', order_key))
+        if order is not None:
+            named_nodes_children, node_order, param_order = order
+            for next_ in node_order:
+                if next_ in drawn:
+                    continue
+                children = named_nodes_children[next_]
+                temp_givens = [givens[k] for k in givens if k in children]
+                value = _draw_value(next_,
+                                    point=point,
+                                    givens=temp_givens,
+                                    size=size)
+                givens[next_.name] = (next_, value)
+                drawn[next_] = value
+            for param_idx in param_order:
+                param = params[param_idx]
+                if param in drawn:
+                    evaluated[param_idx] = drawn[param]
+                else:
+                    value = _draw_value(param,
+                                        point=point,
+                                        givens=givens.values(),
+                                        size=size)
+                    evaluated[param_idx] = drawn[param] = value
+                    givens[param.name] = (param, value)
+            return [evaluated[j] for j in params]
+
+        # Distribution parameters may be nodes which have named node-inputs
+        # specified in the point. Need to find the node-inputs, their
+        # parents and children to replace them.
+        if cache is not None:
+            relations = cache.lookup(
+                ('graph', graph_key),
+                lambda: _get_graph_relations(symbolic_params))
+        else:
+            relations = _get_graph_relations(symbolic_params)
+        leaf_nodes, named_nodes_parents, named_nodes_children = relations
+
+        node_order = []
+        param_order = []
         stack = list(leaf_nodes.values())  # A queue would be more appropriate
         while stack:
             next_ = stack.pop(0)
@@ -369,6 +395,7 @@ def draw_values(params, point=None, size=None):
                                         size=size)
                     givens[next_.name] = (next_, value)
                     drawn[next_] = value
+                    node_order.append(next_)
                 except theano.gof.fg.MissingInputError:
                     # The node failed, so we must add the node's parents to
                     # the stack of nodes to try to draw from. We exclude the
@@ -392,6 +419,7 @@ def draw_values(params, point=None, size=None):
                 param = params[param_idx]
                 if param in drawn:
                     evaluated[param_idx] = drawn[param]
+                    param_order.append(param_idx)
                 else:
                     try:  # might evaluate in a bad order,
                         value = _draw_value(param,
@@ -400,12 +428,68 @@ def draw_values(params, point=None, size=None):
                                             size=size)
                         evaluated[param_idx] = drawn[param] = value
                         givens[param.name] = (param, value)
+                        param_order.append(param_idx)
                     except theano.gof.fg.MissingInputError:
                         missing_inputs.add(param_idx)
 
+        if cache is not None:
+            cache.store(('order', order_key),
+                        (named_nodes_children, node_order, param_order))
+
     return [evaluated[j] for j in params] # set the order back
 
 
+def _get_graph_relations(symbolic_params):
+    """Merge the named nodes and their relations of all `symbolic_params`."""
+    leaf_nodes = {}
+    named_nodes_parents = {}
+    named_nodes_children = {}
+    for _, param in symbolic_params:
+        if hasattr(param, 'name'):
+            # Get the named nodes under the `param` node
+            nn, nnp, nnc = get_named_nodes_and_relations(param)
+            leaf_nodes.update(nn)
+            # Update the discovered parental relationships
+            for k in nnp.keys():
+                if k not in named_nodes_parents.keys():
+                    named_nodes_parents[k] = nnp[k]
+                else:
+                    named_nodes_parents[k].update(nnp[k])
+            # Update the discovered child relationships
+            for k in nnc.keys():
+                if k not in named_nodes_children.keys():
+                    named_nodes_children[k] = nnc[k]
+                else:
+                    named_nodes_children[k].update(nnc[k])
+    return leaf_nodes, named_nodes_parents, named_nodes_children
+
+
+def _get_draw_values_cache(params):
+    """Return the cache of `draw_values` for the model of `params`.
+
+    The cache is an `LRUCache` of the model, and is reset whenever
+    variables were added to the model since it was filled. Returns None
+    if no model can be found.
+    """
+    model = None
+    for param in params:
+        model = getattr(param, 'model', None)
+        if isinstance(model, Model):
+            break
+    else:
+        # The deepest context may be a _DrawValuesContext
+        models = [c for c in Model.get_contexts() if isinstance(c, Model)]
+        if not models:
+            return None
+        model = models[-1]
+
+    cache = owner_cache(model, 'draw_values')
+    if getattr(cache, 'n_vars', None) != len(model.named_vars):
+        cache.clear()
+        cache.n_vars = len(model.named_vars)
+    return cache
+
+
 @memoize
 def _compile_theano_function(param, vars, givens=None):
     """Compile theano function for a given parameter and input variables.
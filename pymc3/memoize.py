@@ -1,18 +1,112 @@
 import functools
 import pickle
 import collections
+import sys
+import weakref
+
+import numpy as np
+
 from .util import biwrap
 CACHE_REGISTRY = []
+# objects with memoized bound methods, referenced weakly so that their caches
+# are released together with them
+OWNER_REGISTRY = weakref.WeakSet()
+# maximum number of results kept by a memoized function
+DEFAULT_MAXSIZE = 1024
+
+CacheInfo = collections.namedtuple(
+    'CacheInfo', 'hits misses evictions size maxsize nbytes')
+
+
+class LRUCache(collections.OrderedDict):
+    """Dictionary that keeps at most `maxsize` entries, dropping the least
+    recently used one first, and counts hits, misses and evictions.
+
+    Parameters
+    ----------
+    maxsize : int or None
+        Maximum number of entries, `None` for no limit
+    """
+
+    def __init__(self, maxsize=None):
+        super(LRUCache, self).__init__()
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def lookup(self, key, compute):
+        """Return the value stored under `key`, calling `compute()` to
+        create it if it is missing"""
+        if key in self:
+            return self.find(key)
+        self.misses += 1
+        value = compute()
+        self.store(key, value)
+        return value
+
+    def find(self, key, default=None):
+        """Return the value stored under `key`, or `default` if it is
+        missing, and count the hit or miss"""
+        try:
+            value = self[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self.hits += 1
+        if self.maxsize is not None:
+            # mark as most recently used
+            del self[key]
+            self[key] = value
+        return value
+
+    def store(self, key, value):
+        self[key] = value
+        self.trim()
+
+    def trim(self):
+        while self.maxsize is not None and len(self) > self.maxsize:
+            self.popitem(last=False)
+            self.evictions += 1
+
+    @property
+    def nbytes(self):
+        """Estimated memory used by the stored values"""
+        return sum(_nbytes(v) for v in self.values())
+
+    def info(self):
+        return CacheInfo(self.hits, self.misses, self.evictions,
+                         len(self), self.maxsize, self.nbytes)
+
+
+def _nbytes(value):
+    """Rough size of a cached value: arrays and the storage of compiled
+    theano functions are counted, other objects by their own size only"""
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(_nbytes(v) for v in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(_nbytes(v) for v in value.values())
+    storage = getattr(value, 'input_storage', None)
+    if storage is not None:
+        return sys.getsizeof(value) + sum(
+            _nbytes(c.storage[0]) for c in storage if hasattr(c, 'storage'))
+    return sys.getsizeof(value)
 
 
 @biwrap
-def memoize(obj, bound=False):
+def memoize(obj, bound=False, maxsize=DEFAULT_MAXSIZE):
     """
     An expensive memoizer that works with unhashables
+
+    Results are kept in an :class:`LRUCache` of at most `maxsize` entries
+    (`None` for no limit). Caches of bound methods live on the instance and
+    are released with it.
     """
     # this is declared not to be a bound method, so just attach new attr to obj
     if not bound:
-        obj.cache = {}
+        obj.cache = LRUCache(maxsize)
         CACHE_REGISTRY.append(obj.cache)
 
     @functools.wraps(obj)
@@ -23,27 +117,76 @@ def memoize(obj, bound=False):
         else:
             # bound methods have self as first argument, remove it to compute key
             key = (hashable(args[1:]), hashable(kwargs))
-            if not hasattr(args[0], '_cache'):
-                setattr(args[0], '_cache', collections.defaultdict(dict))
-                # do not add to cache regestry
-            cache = getattr(args[0], '_cache')[obj.__name__]
-        if key not in cache:
-            cache[key] = obj(*args, **kwargs)
-
-        return cache[key]
+            cache = owner_cache(args[0], obj.__name__, maxsize)
+        return cache.lookup(key, lambda: obj(*args, **kwargs))
     return memoizer
 
 
-def clear_cache(obj=None):
+def owner_cache(owner, name, maxsize=DEFAULT_MAXSIZE):
+    """Return the :class:`LRUCache` `name` of `owner`, creating it if needed.
+
+    These caches are released with `owner` and are included in
+    `clear_cache`, `set_cache_size` and `cache_info`.
+    """
+    if not hasattr(owner, '_cache'):
+        setattr(owner, '_cache', collections.defaultdict(dict))
+        try:
+            OWNER_REGISTRY.add(owner)
+        except TypeError:
+            # not weak referenceable, only reachable via the owner
+            pass
+    caches = getattr(owner, '_cache')
+    cache = caches.get(name)
+    if cache is None:
+        cache = caches[name] = LRUCache(maxsize)
+    return cache
+
+
+def _caches(obj=None):
     if obj is None:
-        for c in CACHE_REGISTRY:
-            c.clear()
+        caches = list(CACHE_REGISTRY)
+        for owner in list(OWNER_REGISTRY):
+            caches.extend(getattr(owner, '_cache', {}).values())
+        return caches
+    elif isinstance(obj, WithMemoization) or hasattr(obj, '_cache'):
+        return list(getattr(obj, '_cache', {}).values())
     else:
-        if isinstance(obj, WithMemoization):
-            for v in getattr(obj, '_cache', {}).values():
-                v.clear()
-        else:
-            obj.cache.clear()
+        return [obj.cache]
+
+
+def clear_cache(obj=None):
+    """Empty the caches of `obj`, a memoized function or an object with
+    memoized methods, or all caches if `obj` is None"""
+    for c in _caches(obj):
+        c.clear()
+
+
+def set_cache_size(maxsize, obj=None):
+    """Limit the caches of `obj`, or all existing caches if `obj` is None,
+    to `maxsize` entries, evicting the least recently used ones"""
+    for c in _caches(obj):
+        if isinstance(c, LRUCache):
+            c.maxsize = maxsize
+            c.trim()
+
+
+def cache_info(obj=None):
+    """Hits, misses, evictions, number of entries and estimated bytes of the
+    caches of `obj`, or of all caches if `obj` is None.
+
+    Returns
+    -------
+    :class:`CacheInfo`
+        `maxsize` is the limit of the cache if `obj` has a single one
+    """
+    infos = [c.info() for c in _caches(obj) if isinstance(c, LRUCache)]
+    maxsize = infos[0].maxsize if len(infos) == 1 else None
+    return CacheInfo(sum(i.hits for i in infos),
+                     sum(i.misses for i in infos),
+                     sum(i.evictions for i in infos),
+                     sum(i.size for i in infos),
+                     maxsize,
+                     sum(i.nbytes for i in infos))
 
 
 class WithMemoization(object):
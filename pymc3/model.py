@@ -16,7 +16,8 @@ from pymc3.theanof import set_theano_conf, floatX
 import pymc3 as pm
 from pymc3.math import flatten_list
 from .memoize import memoize, WithMemoization
-from .theanof import gradient, hessian, inputvars, generator
+from .theanof import (gradient, hessian, inputvars, generator, cached_function,
+                      clone_with_batch_axis)
 from .vartypes import typefilter, discrete_types, continuous_types, isgenerator
 from .blocking import DictToArrayBijection, ArrayOrdering
 from .util import get_transformed_name
@@ -445,7 +446,7 @@ class ValueGradFunction(object):
 
         inputs = [self._vars_joined]
 
-        self._theano_function = theano.function(
+        self._theano_function = cached_function(
             inputs, [self._cost_joined, grad], givens=givens, **kwargs)
 
     def set_extra_values(self, extra_vars):
@@ -531,6 +532,144 @@ class ValueGradFunction(object):
         return args_joined, theano.clone(cost, replace=replace)
 
 
+def _batch_views(batch, ordering, vars, ndim):
+    """Views of the rows of the matrix `batch`, laid out by `ordering`, as
+    the variables `vars` with the batch axis and the padding of
+    `clone_with_batch_axis`."""
+    vars = {var.name: var for var in vars}
+    batched = {}
+    for vmap in ordering.vmap:
+        var = vars[vmap.var]
+        pad = ndim - var.ndim
+        shape = [batch.shape[0]] + [1] * pad + list(vmap.shp)
+        values = batch[:, vmap.slc].reshape(shape, ndim=ndim + 1)
+        values = tt.patternbroadcast(
+            values.astype(var.dtype),
+            (False,) + (True,) * pad + var.broadcastable)
+        batched[var] = values
+    return batched
+
+
+class BatchedValueGradFunction(ValueGradFunction):
+    """Compute a value and its gradient for a batch of parameter arrays.
+
+    The function maps an `(n, size)` array, one parameter array per row, to
+    the `(n,)` values and the `(n, size)` gradients in one call.
+
+    If the elementwise `factors` whose sums add up to `cost` are given, their
+    graphs are cloned with a leading batch axis, so that the whole batch is
+    computed with broadcasting array operations. This works if all
+    operations of the factors broadcast over that axis, which is checked
+    against the unbatched function at a few points. Otherwise, or without
+    `factors`, the cost is mapped over the rows with `theano.map`.
+
+    Parameters
+    ----------
+    factors : list of theano variables, optional
+        The terms of the cost, whose sum is `cost`.
+    See `ValueGradFunction` for the other parameters.
+
+    Attributes
+    ----------
+    vectorized : bool
+        Whether the graph of the cost was cloned with a batch axis.
+    """
+    def __init__(self, cost, grad_vars, extra_vars=None, dtype=None,
+                 casting='no', factors=None, **kwargs):
+        super(BatchedValueGradFunction, self).__init__(
+            cost, grad_vars, extra_vars, dtype, casting, **kwargs)
+
+        self.vectorized = False
+        if factors is not None:
+            try:
+                self._batched_function = self._compile(
+                    self._build_vectorized, factors, **kwargs)
+                self.vectorized = self._check_vectorized()
+            except (TypeError, ValueError, IndexError, AssertionError,
+                    NotImplementedError):
+                pass
+        if not self.vectorized:
+            self._batched_function = self._compile(
+                self._build_mapped, **kwargs)
+
+    def _compile(self, build, *args, **kwargs):
+        with theano.configparser.change_flags(compute_test_value='ignore'):
+            batch = tt.matrix('__batch', dtype=self.dtype)
+            replace = {var: self._extra_vars_shared[var.name]
+                       for var in self._extra_vars}
+            cost, grad = build(batch, replace, *args)
+            return theano.function([batch], [cost, grad], **kwargs)
+
+    def _build_vectorized(self, batch, replace, factors):
+        factors = theano.clone(factors, replace=replace)
+        graph = theano.gof.graph.variables(
+            theano.gof.graph.inputs(factors), factors)
+        ndim = max(getattr(var, 'ndim', 0) for var in graph)
+
+        batched = _batch_views(batch, self._ordering, self._grad_vars, ndim)
+
+        terms = []
+        factors = clone_with_batch_axis(factors, batched, ndim)
+        for factor in factors:
+            if batch in theano.gof.graph.inputs([factor]):
+                terms.append(tt.sum(factor, axis=list(range(1, ndim + 1))))
+            else:
+                terms.append(tt.sum(factor))
+        cost = tt.add(*terms)
+        return cost, tt.grad(cost.sum(), batch)
+
+    def _build_mapped(self, batch, replace):
+        grad = tt.grad(self._cost_joined, self._vars_joined)
+        outputs = theano.clone([self._cost_joined, grad], replace=replace)
+        (cost, grad), _ = theano.map(
+            lambda row: theano.clone(outputs, {self._vars_joined: row}),
+            sequences=[batch])
+        return cost, grad
+
+    def _check_vectorized(self):
+        """Compare the vectorized and the unbatched function at the test
+        point, a random point and a point of nans, which reveals
+        operations that mix the rows of the batch."""
+        point = {var.name: np.asarray(var.tag.test_value)
+                 for var in self._grad_vars}
+        array = self.dict_to_array(point)
+        rng = np.random.RandomState(0)
+        batch = np.array([array, array + rng.normal(size=self.size),
+                          np.full(self.size, np.nan)], dtype=self.dtype)
+        rtol = np.sqrt(np.finfo(self.dtype).eps)
+
+        with np.errstate(all='ignore'):
+            logp, dlogp = self._batched_function(batch)
+            if logp.shape != (len(batch),) or dlogp.shape != batch.shape:
+                return False
+            for row, logp_row, dlogp_row in zip(batch, logp, dlogp):
+                expected_logp, expected_dlogp = self._theano_function(row)
+                if not (np.allclose(logp_row, expected_logp, rtol, rtol,
+                                    equal_nan=True)
+                        and np.allclose(dlogp_row, expected_dlogp, rtol,
+                                        rtol, equal_nan=True)):
+                    return False
+        return True
+
+    def __call__(self, array, grad_out=None, extra_vars=None):
+        if extra_vars is not None:
+            self.set_extra_values(extra_vars)
+
+        if not self._extra_are_set:
+            raise ValueError('Extra values are not set.')
+
+        if array.ndim != 2 or array.shape[1] != self.size:
+            raise ValueError('Invalid shape for array. Must be (n, %s) but '
+                             'is %s.' % (self.size, array.shape))
+
+        logp, dlogp = self._batched_function(array)
+        if grad_out is None:
+            return logp, dlogp
+        else:
+            grad_out[...] = dlogp
+            return logp
+
+
 class Model(six.with_metaclass(InitContextMeta, Context, Factor, WithMemoization)):
     """Encapsulates the variables and likelihood factors of a model.
 
@@ -697,7 +836,7 @@ class Model(six.with_metaclass(InitContextMeta, Context, Factor, WithMemoization
         vars = inputvars(self.cont_vars)
         return self.bijection.mapf(self.fastdlogp(vars))
 
-    def logp_dlogp_function(self, grad_vars=None, **kwargs):
+    def _grad_and_extra_vars(self, grad_vars):
         if grad_vars is None:
             grad_vars = list(typefilter(self.free_RVs, continuous_types))
         else:
@@ -707,8 +846,32 @@ class Model(six.with_metaclass(InitContextMeta, Context, Factor, WithMemoization
                                      "continuous types: %s" % var)
         varnames = [var.name for var in grad_vars]
         extra_vars = [var for var in self.free_RVs if var.name not in varnames]
+        return grad_vars, extra_vars
+
+    def logp_dlogp_function(self, grad_vars=None, **kwargs):
+        grad_vars, extra_vars = self._grad_and_extra_vars(grad_vars)
         return ValueGradFunction(self.logpt, grad_vars, extra_vars, **kwargs)
 
+    def batched_logp_dlogp_function(self, grad_vars=None, **kwargs):
+        """Compile logp and gradient of the model for a batch of points.
+
+        The returned `BatchedValueGradFunction` maps an `(n, ndim)` array,
+        one point per row, to the `(n,)` log probabilities and the
+        `(n, ndim)` gradients. The arguments are those of
+        `logp_dlogp_function`.
+        """
+        grad_vars, extra_vars = self._grad_and_extra_vars(grad_vars)
+        with self:
+            factors = []
+            for var in self.basic_RVs:
+                if getattr(var, 'total_size', None) is not None:
+                    factors.append(var.logp_elemwiset * var.scaling)
+                else:
+                    factors.append(var.logp_elemwiset)
+            factors += self.potentials
+        return BatchedValueGradFunction(self.logpt, grad_vars, extra_vars,
+                                        factors=factors, **kwargs)
+
     @property
     def logpt(self):
         """Theano scalar of log-probability of the model"""
@@ -903,7 +1066,7 @@ class Model(six.with_metaclass(InitContextMeta, Context, Factor, WithMemoization
         Compiled Theano function
         """
         with self:
-            return theano.function(self.vars, outs,
+            return cached_function(self.vars, outs,
                                    allow_input_downcast=True,
                                    on_unused_input='ignore',
                                    accept_inplace=True,
@@ -940,6 +1103,99 @@ class Model(six.with_metaclass(InitContextMeta, Context, Factor, WithMemoization
         f = self.makefn(outs, mode, *args, **kwargs)
         return FastPointFunc(f)
 
+    def batched_fastfn(self, outs, mode=None):
+        """Compiles a Theano function which returns the values of ``outs``
+        for a batch of points.
+
+        The points are the rows of an `(n, size)` array in the layout of
+        ``model.bijection``. If all operations of ``outs`` support a leading
+        batch axis, their graphs are cloned with it and the whole batch is
+        computed with array operations, otherwise ``outs`` are mapped over
+        the rows. The function is compiled once per model.
+
+        Parameters
+        ----------
+        outs : iterable of Theano variables
+        mode : Theano compilation mode
+
+        Returns
+        -------
+        Compiled Theano function which returns a list with an array of
+        shape `(n,) + out.shape` for each variable of ``outs``.
+        """
+        return self._batched_fastfn(tuple(outs), mode)
+
+    @memoize(bound=True)
+    def _batched_fastfn(self, outs, mode):
+        outs = list(outs)
+        with theano.configparser.change_flags(compute_test_value='ignore'):
+            batch = tt.matrix('__batch', dtype=self.bijection.array_dtype)
+            try:
+                f = self._compile_batched(
+                    batch, self._vectorized_outs(batch, outs), mode)
+                if self._check_batched(f, outs):
+                    return f
+            except (TypeError, ValueError, IndexError, AssertionError,
+                    NotImplementedError):
+                pass
+            return self._compile_batched(
+                batch, self._mapped_outs(batch, outs), mode)
+
+    def _compile_batched(self, batch, outs, mode):
+        return cached_function([batch], outs, mode=mode,
+                               allow_input_downcast=True,
+                               on_unused_input='ignore',
+                               accept_inplace=True)
+
+    def _vectorized_outs(self, batch, outs):
+        graph = theano.gof.graph.variables(
+            theano.gof.graph.inputs(outs), outs)
+        ndim = max(getattr(var, 'ndim', 0) for var in graph)
+        replace = _batch_views(batch, self.bijection.ordering, self.vars, ndim)
+        batched = []
+        for out, new in zip(outs, clone_with_batch_axis(outs, replace, ndim)):
+            if new is out:
+                # does not depend on the free variables
+                new = tt.repeat(tt.shape_padleft(out), batch.shape[0], axis=0)
+            else:
+                new = new.dimshuffle(
+                    [0] + list(range(ndim + 1 - out.ndim, ndim + 1)))
+            batched.append(new)
+        return batched
+
+    def _mapped_outs(self, batch, outs):
+        vars = {var.name: var for var in self.vars}
+
+        def row_outs(row):
+            replace = {}
+            for vmap in self.bijection.ordering.vmap:
+                var = vars[vmap.var]
+                values = row[vmap.slc].reshape(vmap.shp, ndim=var.ndim)
+                replace[var] = tt.patternbroadcast(
+                    values.astype(var.dtype), var.broadcastable)
+            return theano.clone(outs, replace=replace)
+
+        mapped, _ = theano.map(row_outs, sequences=[batch])
+        if not isinstance(mapped, list):
+            mapped = [mapped]
+        return mapped
+
+    def _check_batched(self, f, outs):
+        """Compare the batched function with the unbatched one at the test
+        point next to a point of nans, which reveals operations that mix
+        the rows of the batch."""
+        array = self.bijection.map(self.test_point)
+        batch = np.array([array, np.full_like(array, np.nan)])
+        expected = self.fastfn(outs)(self.test_point)
+        with np.errstate(all='ignore'):
+            values = f(batch)
+        for value, expected_value in zip(values, expected):
+            if (value.shape != (2,) + np.shape(expected_value)
+                    or not np.allclose(value[0], expected_value,
+                                       equal_nan=True)):
+                return False
+        return True
+
     def profile(self, outs, n=1000, point=None, profile=True, *args, **kwargs):
         """Compiles and profiles a Theano function which returns ``outs`` and
         takes values of model vars as a dict as an argument.
@@ -1129,7 +1385,7 @@ def _get_scaling(total_size, shape, ndim):
 
     Parameters
     ----------
-    total_size : int or list[int]
+    total_size : int, list[int] or scalar tensor
     shape : shape
         shape to scale
     ndim : int
@@ -1147,6 +1403,13 @@ def _get_scaling(total_size, shape, ndim):
         else:
             denom = 1
         coef = floatX(total_size) / floatX(denom)
+    elif isinstance(total_size, tt.Variable) and total_size.ndim == 0:
+        # e.g. the length of the data in a `Data` container
+        if ndim >= 1:
+            denom = shape[0]
+        else:
+            denom = 1
+        coef = tt.cast(total_size, theano.config.floatX) / floatX(denom)
     elif isinstance(total_size, (list, tuple)):
         if not all(isinstance(i, int) for i in total_size if (i is not Ellipsis and i is not None)):
             raise TypeError('Unrecognized `total_size` type, expected '
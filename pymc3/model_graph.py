@@ -1,5 +1,6 @@
 import itertools
 
+from theano.compile import SharedVariable
 from theano.gof.graph import ancestors
 
 from .util import get_default_varnames
@@ -104,6 +105,10 @@ class ModelGraph(object):
         # Get name for node
         if hasattr(v, 'distribution'):
             distribution = v.distribution.__class__.__name__
+        elif isinstance(v, SharedVariable):
+            distribution = 'Data'
+            attrs['shape'] = 'box'
+            attrs['style'] = 'rounded, filled'
         else:
             distribution = 'Deterministic'
             attrs['shape'] = 'box'
@@ -125,7 +130,11 @@ class ModelGraph(object):
         plates = {}
         for var_name in self.var_names:
             v = self.model[var_name]
-            if hasattr(v, 'observations'):
+            if isinstance(v, SharedVariable):
+                shape = v.get_value(borrow=True).shape
+            elif isinstance(getattr(v, 'observations', None), SharedVariable):
+                shape = v.observations.get_value(borrow=True).shape
+            elif hasattr(v, 'observations'):
                 shape = v.observations.shape
             elif hasattr(v, 'dshape'):
                 shape = v.dshape
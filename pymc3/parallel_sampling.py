@@ -50,7 +50,7 @@ def rebuild_exc(exc, tb):
 
 
 # Messages
-# ('writing_done', is_last, sample_idx, tuning, stats, warns)
+# ('writing_done', is_last, draw_idx, n_draws, tuning, stats, warns)
 # ('error', warnings, *exception_info)
 
 # ('abort', reason)
@@ -62,9 +62,14 @@ class _Process(multiprocessing.Process):
     """Seperate process for each chain.
     We communicate with the main process using a pipe,
     and send finished samples using shared memory.
+
+    Draws are sent in blocks of up to `buffer_size` draws. The process
+    fills a local block, waits until the main process asks for the next
+    block, copies it into the shared buffer and only then signals.
     """
 
-    def __init__(self, name, msg_pipe, step_method, shared_point, draws, tune, seed):
+    def __init__(self, name, msg_pipe, step_method, shared_point, draws, tune,
+                 seed, buffer_size=1):
         super(_Process, self).__init__(daemon=True, name=name)
         self._msg_pipe = msg_pipe
         self._step_method = step_method
@@ -73,12 +78,13 @@ class _Process(multiprocessing.Process):
         self._tt_seed = seed + 1
         self._draws = draws
         self._tune = tune
+        self._buffer_size = buffer_size
 
     def run(self):
         try:
             # We do not create this in __init__, as pickling this
             # would destroy the shared memory.
-            self._point = self._make_numpy_refs()
+            self._make_buffers()
             self._start_loop()
         except KeyboardInterrupt:
             pass
@@ -88,18 +94,26 @@ class _Process(multiprocessing.Process):
         finally:
             self._msg_pipe.close()
 
+    def _make_buffers(self):
+        self._buffer = self._make_numpy_refs()
+        self._block = {name: np.empty_like(vals)
+                       for name, vals in self._buffer.items()}
+        self._point = {name: vals[0].copy()
+                       for name, vals in self._buffer.items()}
+
     def _make_numpy_refs(self):
         shape_dtypes = self._step_method.vars_shape_dtype
-        point = {}
+        buffer = {}
         for name, (shape, dtype) in shape_dtypes.items():
             array = self._shared_point[name]
             self._shared_point[name] = array
-            point[name] = np.frombuffer(array, dtype).reshape(shape)
-        return point
+            shape = (self._buffer_size,) + tuple(shape)
+            buffer[name] = np.frombuffer(array, dtype).reshape(shape)
+        return buffer
 
-    def _write_point(self, point):
-        for name, vals in point.items():
-            self._point[name][...] = vals
+    def _write_block(self, n_draws):
+        for name, vals in self._block.items():
+            self._buffer[name][:n_draws] = vals[:n_draws]
 
     def _recv_msg(self):
         return self._msg_pipe.recv()
@@ -108,47 +122,68 @@ class _Process(multiprocessing.Process):
         np.random.seed(self._seed)
         theanof.set_tt_rng(self._tt_seed)
 
-        draw = 0
-        tuning = True
-
         msg = self._recv_msg()
         if msg[0] == "abort":
             raise KeyboardInterrupt()
         if msg[0] != "start":
             raise ValueError("Unexpected msg " + msg[0])
 
-        while True:
-            if draw < self._draws + self._tune:
+        self._sample_loop()
+
+    def _sample_loop(self):
+        draw = 0
+        tuning = True
+        total = self._draws + self._tune
+
+        while draw < total:
+            block_start = draw
+            n_draws = min(self._buffer_size, total - draw)
+            tunings = []
+            stats_block = []
+            for slot in range(n_draws):
                 try:
                     point, stats = self._compute_point()
                 except SamplingError as e:
                     warns = self._collect_warnings()
                     e = ExceptionWithTraceback(e, e.__traceback__)
                     self._msg_pipe.send(("error", warns, e))
-            else:
-                return
+                    self._wait_for_abort()
+                    return
+
+                for name, vals in point.items():
+                    self._block[name][slot] = vals
+                self._point = point
 
-            if draw == self._tune:
-                self._step_method.stop_tuning()
-                tuning = False
+                if block_start + slot == self._tune:
+                    self._step_method.stop_tuning()
+                    tuning = False
+                tunings.append(tuning)
+                stats_block.append(stats)
 
             msg = self._recv_msg()
             if msg[0] == "abort":
                 raise KeyboardInterrupt()
             elif msg[0] == "write_next":
-                self._write_point(point)
-                is_last = draw + 1 == self._draws + self._tune
+                self._write_block(n_draws)
+                draw += n_draws
+                is_last = draw == total
                 if is_last:
                     warns = self._collect_warnings()
                 else:
                     warns = None
                 self._msg_pipe.send(
-                    ("writing_done", is_last, draw, tuning, stats, warns)
+                    ("writing_done", is_last, block_start, n_draws,
+                     tunings, stats_block, warns)
                 )
-                draw += 1
             else:
                 raise ValueError("Unknown message " + msg[0])
 
+    def _wait_for_abort(self):
+        msg = self._recv_msg()
+        if msg[0] == "abort":
+            raise KeyboardInterrupt()
+        raise ValueError("Unexpected msg " + msg[0])
+
     def _compute_point(self):
         if self._step_method.generates_stats:
             point, stats = self._step_method.step(self._point)
@@ -164,18 +199,81 @@ class _Process(multiprocessing.Process):
             return []
 
 
+class _PoolProcess(_Process):
+    """Worker process of a `SamplerPool`.
+
+    Unlike `_Process` it does not exit after one chain, but waits for
+    further jobs. Each job carries its own draws, seed, start point and
+    values for the shared variables of the model.
+    """
+
+    def __init__(self, name, msg_pipe, step_method, shared_point, shared_vars,
+                 buffer_size=1):
+        super(_PoolProcess, self).__init__(
+            name, msg_pipe, step_method, shared_point, 0, 0, 0, buffer_size)
+        self._shared_vars = shared_vars
+
+    def run(self):
+        try:
+            self._make_buffers()
+            while True:
+                msg = self._recv_msg()
+                if msg[0] == "close":
+                    return
+                if msg[0] == "abort":
+                    raise KeyboardInterrupt()
+                if msg[0] != "job":
+                    raise ValueError("Unexpected msg " + msg[0])
+                self._setup_job(*msg[1:])
+                self._sample_loop()
+        except KeyboardInterrupt:
+            pass
+        except BaseException as e:
+            e = ExceptionWithTraceback(e, e.__traceback__)
+            self._msg_pipe.send(("error", None, e))
+        finally:
+            self._msg_pipe.close()
+
+    def _setup_job(self, draws, tune, seed, start, shared_values):
+        self._draws = draws
+        self._tune = tune
+        self._seed = seed
+        self._tt_seed = seed + 1
+        np.random.seed(self._seed)
+        theanof.set_tt_rng(self._tt_seed)
+
+        for var, value in zip(self._shared_vars, shared_values):
+            var.set_value(value)
+
+        shape_dtypes = self._step_method.vars_shape_dtype
+        self._point = {}
+        for name, (shape, dtype) in shape_dtypes.items():
+            self._point[name] = np.array(start[name], dtype=dtype).reshape(shape)
+
+        methods = getattr(self._step_method, "methods", [self._step_method])
+        for method in methods:
+            if hasattr(method, "reset"):
+                method.reset()
+            if hasattr(method, "tune"):
+                method.tune = bool(tune)
+
+
 class ProcessAdapter(object):
     """Control a Chain process from the main thread."""
 
-    def __init__(self, draws, tune, step_method, chain, seed, start):
+    def __init__(self, draws, tune, step_method, chain, seed, start,
+                 buffer_size=1):
+        if buffer_size < 1:
+            raise ValueError("buffer_size must be at least 1.")
         self.chain = chain
+        self.buffer_size = buffer_size
         process_name = "worker_chain_%s" % chain
         self._msg_pipe, remote_conn = multiprocessing.Pipe()
 
         self._shared_point = {}
         self._point = {}
         for name, (shape, dtype) in step_method.vars_shape_dtype.items():
-            size = 1
+            size = buffer_size
             for dim in shape:
                 size *= int(dim)
             size *= dtype.itemsize
@@ -184,29 +282,38 @@ class ProcessAdapter(object):
 
             array = multiprocessing.sharedctypes.RawArray("c", size)
             self._shared_point[name] = array
-            array_np = np.frombuffer(array, dtype).reshape(shape)
-            array_np[...] = start[name]
+            array_np = np.frombuffer(array, dtype)
+            array_np = array_np.reshape((buffer_size,) + tuple(shape))
+            array_np[0] = start[name]
             self._point[name] = array_np
 
         self._readable = True
         self._num_samples = 0
 
-        self._process = _Process(
-            process_name,
+        self._process = self._make_process(
+            process_name, remote_conn, step_method, draws, tune, seed)
+        # We fork right away, so that the main process can start tqdm threads
+        self._process.start()
+
+    def _make_process(self, name, remote_conn, step_method, draws, tune, seed):
+        return _Process(
+            name,
             remote_conn,
             step_method,
             self._shared_point,
             draws,
             tune,
             seed,
+            self.buffer_size,
         )
-        # We fork right away, so that the main process can start tqdm threads
-        self._process.start()
 
     @property
     def shared_point_view(self):
         """May only be written to or read between a `recv_draw`
         call from the process and a `write_next` or `abort` call.
+
+        Each value has a leading axis of length `buffer_size`. Only the
+        first `n_draws` entries (as returned by `recv_draw`) are valid.
         """
         if not self._readable:
             raise RuntimeError()
@@ -249,7 +356,7 @@ class ProcessAdapter(object):
             six.raise_from(error, old_error)
         elif msg[0] == "writing_done":
             proc._readable = True
-            proc._num_samples += 1
+            proc._num_samples += msg[3]
             return (proc,) + msg[1:]
         else:
             raise ValueError("Sampler sent bad message.")
@@ -280,12 +387,68 @@ class ProcessAdapter(object):
                 process.join()
 
 
+class _PoolProcessAdapter(ProcessAdapter):
+    """Control a `_PoolProcess` from the main thread.
+
+    The chain number is not fixed, it is assigned with every job.
+    """
+
+    def __init__(self, step_method, shared_vars, worker, start, buffer_size=1):
+        self._shared_vars = shared_vars
+        self.worker = worker
+        self._job = None
+        super(_PoolProcessAdapter, self).__init__(
+            0, 0, step_method, None, 0, start, buffer_size)
+
+    def _make_process(self, name, remote_conn, step_method, draws, tune, seed):
+        return _PoolProcess(
+            "pool_worker_%s" % self.worker,
+            remote_conn,
+            step_method,
+            self._shared_point,
+            self._shared_vars,
+            self.buffer_size,
+        )
+
+    def set_job(self, chain, draws, tune, seed, start, shared_values):
+        self.chain = chain
+        self._job = (draws, tune, seed, start, shared_values)
+
+    def start(self):
+        if self._job is None:
+            raise ValueError("No job assigned to worker %s." % self.worker)
+        self._msg_pipe.send(("job",) + self._job)
+        self._job = None
+
+    def close(self):
+        try:
+            self._msg_pipe.send(("close",))
+        except (EOFError, OSError):
+            pass
+
+    def is_alive(self):
+        return self._process.is_alive()
+
+
 Draw = namedtuple(
     "Draw", ["chain", "is_last", "draw_idx", "tuning", "stats", "point", "warnings"]
 )
 
 
 class ParallelSampler(object):
+    """Sample several chains in worker processes.
+
+    Parameters
+    ----------
+    buffer_size : int, default=1
+        Number of draws each worker collects before handing them to the
+        main process. Larger values reduce the number of pipe round-trips
+        (one per block instead of one per draw), which matters for cheap
+        models with many chains.
+    diagnostics : OnlineDiagnostics, optional
+        Updated with every draw after tuning, as the draws arrive.
+    """
+
     def __init__(
         self,
         draws,
@@ -297,6 +460,8 @@ class ParallelSampler(object):
         step_method,
         start_chain_num=0,
         progressbar=True,
+        buffer_size=1,
+        diagnostics=None,
     ):
         if progressbar:
             import tqdm
@@ -308,7 +473,8 @@ class ParallelSampler(object):
 
         self._samplers = [
             ProcessAdapter(
-                draws, tune, step_method, chain + start_chain_num, seed, start
+                draws, tune, step_method, chain + start_chain_num, seed, start,
+                buffer_size,
             )
             for chain, seed, start in zip(range(chains), seeds, start_points)
         ]
@@ -320,6 +486,7 @@ class ParallelSampler(object):
 
         self._in_context = False
         self._start_chain_num = start_chain_num
+        self._diagnostics = diagnostics
 
         self._progress = None
         if progressbar:
@@ -336,6 +503,11 @@ class ParallelSampler(object):
             proc.write_next()
             self._active.append(proc)
 
+    def _retire(self, proc):
+        proc.join()
+        self._active.remove(proc)
+        self._finished.append(proc)
+
     def __iter__(self):
         if not self._in_context:
             raise ValueError("Use ParallelSampler as context manager.")
@@ -343,27 +515,33 @@ class ParallelSampler(object):
 
         while self._active:
             draw = ProcessAdapter.recv_draw(self._active)
-            proc, is_last, draw, tuning, stats, warns = draw
+            proc, is_last, draw, n_draws, tuning, stats, warns = draw
+            chain = proc.chain
             if self._progress is not None:
-                self._progress.update()
-
-            if is_last:
-                proc.join()
-                self._active.remove(proc)
-                self._finished.append(proc)
-                self._make_active()
+                self._progress.update(n_draws)
 
             # We could also yield proc.shared_point_view directly,
             # and only call proc.write_next() after the yield returns.
             # This seems to be faster overally though, as the worker
             # loses less time waiting.
-            point = {name: val.copy() for name, val in proc.shared_point_view.items()}
+            block = {name: val[:n_draws].copy()
+                     for name, val in proc.shared_point_view.items()}
 
-            # Already called for new proc in _make_active
-            if not is_last:
+            if is_last:
+                # The buffer must be copied first, a pool worker might
+                # be handed the next job right away.
+                self._retire(proc)
+                self._make_active()
+            else:
                 proc.write_next()
 
-            yield Draw(proc.chain, is_last, draw, tuning, stats, point, warns)
+            for i in range(n_draws):
+                point = {name: vals[i] for name, vals in block.items()}
+                last = is_last and i == n_draws - 1
+                if self._diagnostics is not None and not tuning[i]:
+                    self._diagnostics.update(chain, point, stats[i])
+                yield Draw(chain, last, draw + i, tuning[i], stats[i],
+                           point, warns if last else None)
 
     def __enter__(self):
         self._in_context = True
@@ -373,3 +551,167 @@ class ParallelSampler(object):
         ProcessAdapter.terminate_all(self._samplers)
         if self._progress is not None:
             self._progress.close()
+
+
+class _PoolSampler(ParallelSampler):
+    """Run a set of chains on the workers of a `SamplerPool`."""
+
+    def __init__(self, workers, jobs, progressbar=True, diagnostics=None):
+        if progressbar:
+            import tqdm
+
+            tqdm_ = tqdm.tqdm
+
+        self._samplers = workers
+        self._jobs = jobs
+        self._inactive = list(workers)
+        self._finished = []
+        self._active = []
+        self._max_active = len(workers)
+
+        self._in_context = False
+        self._diagnostics = diagnostics
+
+        self._progress = None
+        if progressbar:
+            total = sum(draws + tune for _, draws, tune, _, _, _ in jobs)
+            self._progress = tqdm_(
+                total=total,
+                unit="draws",
+                desc="Sampling %s chains" % len(jobs),
+            )
+
+    def _make_active(self):
+        while self._jobs and self._inactive:
+            proc = self._inactive.pop(0)
+            proc.set_job(*self._jobs.pop(0))
+            proc.start()
+            proc.write_next()
+            self._active.append(proc)
+
+    def _retire(self, proc):
+        self._active.remove(proc)
+        self._inactive.append(proc)
+
+    def __exit__(self, exc_type, *args):
+        # Workers that are still busy can not be reused, they are
+        # replaced by the pool before the next run.
+        if exc_type is not None or self._active:
+            ProcessAdapter.terminate_all(self._active)
+        if self._progress is not None:
+            self._progress.close()
+
+
+class SamplerPool(object):
+    """Worker processes that keep a step method alive between runs.
+
+    `pm.sample(cores>1)` starts new processes for every call and has to
+    transfer the step method, including its compiled theano functions,
+    to each of them. A `SamplerPool` does this only once. Afterwards it
+    can be used for any number of calls to `pm.sample` (via the `pool`
+    argument). The current values of the shared variables of the model
+    (eg. observed data in a `theano.shared`) are sent to the workers at
+    the start of each run, so the model can be refitted with new data
+    without recompiling anything.
+
+    The step size and mass matrix adaptation of the step methods is
+    not reset between runs, so later runs start from the values found
+    in earlier ones.
+
+    Parameters
+    ----------
+    step_method : step method or CompoundStep
+        The step method used in all workers.
+    cores : int
+        Number of worker processes.
+    model : Model (optional if in `with` context)
+    buffer_size : int, default=1
+        Number of draws a worker collects before sending them to the
+        main process. See `ParallelSampler`.
+
+    Examples
+    --------
+    ::
+
+        from pymc3.parallel_sampling import SamplerPool
+
+        data = theano.shared(observed)
+        with pm.Model() as model:
+            mu = pm.Normal('mu')
+            pm.Normal('y', mu=mu, observed=data)
+            with SamplerPool(pm.NUTS(), cores=4) as pool:
+                for observed in datasets:
+                    data.set_value(observed)
+                    trace = pm.sample(1000, chains=4, pool=pool)
+    """
+
+    def __init__(self, step_method, cores, model=None, buffer_size=1):
+        from .model import modelcontext
+
+        if cores < 1:
+            raise ValueError("cores must be at least 1.")
+        self.model = modelcontext(model)
+        self.step_method = step_method
+        self.cores = cores
+        self.buffer_size = buffer_size
+        self._shared_vars = _shared_inputs(self.model)
+        self._workers = [self._make_worker(i) for i in range(cores)]
+        self._closed = False
+
+    def _make_worker(self, idx):
+        return _PoolProcessAdapter(self.step_method, self._shared_vars, idx,
+                                   self.model.test_point, self.buffer_size)
+
+    def sampler(self, draws, tune, chains, seeds, start_points,
+                start_chain_num=0, progressbar=True, diagnostics=None):
+        """Return a `ParallelSampler`-like iterator running on the pool.
+
+        Workers that died in an earlier run (after an error or an
+        interrupt) are replaced first. `diagnostics` is updated with the
+        draws after tuning, see `ParallelSampler`.
+        """
+        if self._closed:
+            raise ValueError("SamplerPool is closed.")
+        if any(len(arg) != chains for arg in [seeds, start_points]):
+            raise ValueError("Number of seeds and start_points must be %s." % chains)
+
+        for i, worker in enumerate(self._workers):
+            if not worker.is_alive():
+                worker.join()
+                self._workers[i] = self._make_worker(i)
+
+        shared_values = [var.get_value(borrow=True) for var in self._shared_vars]
+        jobs = [
+            (chain + start_chain_num, draws, tune, seed, start, shared_values)
+            for chain, seed, start in zip(range(chains), seeds, start_points)
+        ]
+        return _PoolSampler(self._workers, jobs, progressbar, diagnostics)
+
+    def close(self, patience=2):
+        """Stop all worker processes."""
+        if self._closed:
+            return
+        self._closed = True
+        for worker in self._workers:
+            worker.close()
+        start_time = time.time()
+        for worker in self._workers:
+            worker.join(max(0, start_time + patience - time.time()))
+            if worker.is_alive():
+                worker.terminate()
+                worker.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def _shared_inputs(model):
+    """Return the shared variables the model log-probability depends on."""
+    import theano
+
+    inputs = theano.gof.graph.inputs([model.logpt])
+    return [var for var in inputs
+            if isinstance(var, theano.compile.SharedVariable)]
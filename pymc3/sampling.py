@@ -1,5 +1,6 @@
 from collections import defaultdict, Iterable
 from copy import copy
+import ctypes
 import pickle
 import logging
 import warnings
@@ -8,14 +9,20 @@ from six import integer_types
 from joblib import Parallel, delayed
 import numpy as np
 import theano.gradient as tg
+import theano.tensor as tt
+from theano.gof.fg import MissingInputError
 
 from .backends.base import BaseTrace, MultiTrace
 from .backends.ndarray import NDArray
-from .distributions.distribution import draw_values
-from .model import modelcontext, Point, all_continuous
-from .step_methods import (NUTS, HamiltonianMC, Metropolis, BinaryMetropolis,
-                           BinaryGibbsMetropolis, CategoricalGibbsMetropolis,
-                           Slice, CompoundStep, arraystep, smc)
+from .blocking import ArrayOrdering, DictToArrayBijection
+from .diagnostics import OnlineDiagnostics
+from .distributions import continuous, discrete
+from .distributions.distribution import draw_values, is_fast_drawable, _DrawValuesContext
+from .model import modelcontext, Point, all_continuous, ObservedRV
+from .step_methods import (NUTS, BatchedNUTS, HamiltonianMC, Metropolis,
+                           BinaryMetropolis, BinaryGibbsMetropolis,
+                           CategoricalGibbsMetropolis, Slice, CompoundStep,
+                           arraystep, smc)
 from .util import update_start_vals, get_untransformed_name, is_transformed_name, get_default_varnames
 from .vartypes import discrete_types
 from pymc3.step_methods.hmc import quadpotential
@@ -191,7 +198,8 @@ def _cpu_count():
 def sample(draws=500, step=None, init='auto', n_init=200000, start=None, trace=None, chain_idx=0,
            chains=None, cores=None, tune=500, nuts_kwargs=None, step_kwargs=None, progressbar=True,
            model=None, random_seed=None, live_plot=False, discard_tuned_samples=True,
-           live_plot_kwargs=None, compute_convergence_checks=True, use_mmap=False, **kwargs):
+           live_plot_kwargs=None, compute_convergence_checks=True, use_mmap=False, buffer_size=None,
+           pool=None, target_ess=None, **kwargs):
     """Draw samples from the posterior using the given step methods.
 
     Multiple step methods are supported via compound step methods.
@@ -215,6 +223,10 @@ def sample(draws=500, step=None, init='auto', n_init=200000, start=None, trace=N
           as starting point.
         * jitter+adapt_diag : Same as `adapt_diag`, but add uniform jitter in [-1, 1] to the
           starting point in each chain.
+        * adapt_full : Adapt a dense mass matrix using the sample covariances. All chains use the
+          test value (usually the prior mean) as starting point.
+        * jitter+adapt_full : Same as `adapt_full`, but use uniform jitter in [-1, 1] as starting
+          point in each chain.
         * advi+adapt_diag : Run ADVI and then adapt the resulting diagonal mass matrix based on the
           sample variance of the tuning samples.
         * advi+adapt_diag_grad : Run ADVI and then adapt the resulting diagonal mass matrix based
@@ -292,6 +304,27 @@ def sample(draws=500, step=None, init='auto', n_init=200000, start=None, trace=N
     use_mmap : bool, default=False
         Whether to use joblib's memory mapping to share numpy arrays when sampling across multiple
         cores. Ignored when using 'SMC'
+    buffer_size : int, optional
+        Only used when sampling on multiple cores. Number of draws each worker process collects
+        before sending them to the main process in one block. Larger values reduce the
+        communication overhead for cheap models with many chains, at the cost of a less
+        responsive progress bar. Defaults to 1, or to the buffer size of `pool`, which is fixed
+        when the pool is created and can not be changed here. Ignored when using 'SMC'
+    pool : SamplerPool, optional
+        Run the chains on the worker processes of a `pymc3.parallel_sampling.SamplerPool`
+        instead of starting new processes. The step method of the pool is used, so `step`
+        must not be given. The current values of the shared variables in the model are sent
+        to the workers, which makes repeated fits of the same model with new data cheap.
+        Requires Python 3. Ignored when using 'SMC'
+    target_ess : int, optional
+        Stop sampling early once the effective sample size of all free variables, summed
+        over the chains, is at least `target_ess` and the gelman-rubin statistic is smaller
+        than 1.05. `draws` is then the maximum number of draws per chain. The estimates are
+        updated while sampling, see `pymc3.diagnostics.OnlineDiagnostics`, and are available
+        as `trace.report.online_diagnostics`. When sampling sequentially, the first chain
+        runs until it reaches its share of `target_ess` and the other chains draw the same
+        number of samples. Then all chains are continued in blocks of 100 draws until they
+        meet the criterion together. Ignored when using 'SMC' or population samplers
 
     Returns
     -------
@@ -325,10 +358,29 @@ def sample(draws=500, step=None, init='auto', n_init=200000, start=None, trace=N
             step_kwargs = {}
         trace = smc.sample_smc(draws=draws,
                                step=step,
+                               cores=cores,
                                progressbar=progressbar,
                                model=model,
                                random_seed=random_seed)
     else:
+        if pool is not None:
+            if sys.version_info.major < 3:
+                raise ValueError("Sampling with a pool requires Python 3.")
+            if step is not None:
+                raise ValueError("Specify only one of step and pool.")
+            if pool.model is not model:
+                raise ValueError("The pool was created for a different model.")
+            if buffer_size is None:
+                buffer_size = pool.buffer_size
+            elif buffer_size != pool.buffer_size:
+                raise ValueError(
+                    "buffer_size must match the buffer size of the pool (%s)."
+                    % pool.buffer_size)
+            step = pool.step_method
+            if cores is None:
+                cores = pool.cores
+        if buffer_size is None:
+            buffer_size = 1
         if cores is None:
             cores = min(4, _cpu_count())
         if 'njobs' in kwargs:
@@ -376,6 +428,10 @@ def sample(draws=500, step=None, init='auto', n_init=200000, start=None, trace=N
 
         draws += tune
 
+        diagnostics = None
+        if target_ess is not None:
+            diagnostics = OnlineDiagnostics()
+
         if nuts_kwargs is not None:
             if step_kwargs is not None:
                 raise ValueError("Specify only one of step_kwargs and nuts_kwargs")
@@ -424,14 +480,21 @@ def sample(draws=500, step=None, init='auto', n_init=200000, start=None, trace=N
                        'live_plot': live_plot,
                        'live_plot_kwargs': live_plot_kwargs,
                        'cores': cores,
-                       'use_mmap': use_mmap}
+                       'use_mmap': use_mmap,
+                       'buffer_size': buffer_size,
+                       'pool': pool,
+                       'diagnostics': diagnostics,
+                       'target_ess': target_ess}
 
         sample_args.update(kwargs)
 
         has_population_samplers = np.any([isinstance(m, arraystep.PopulationArrayStepShared)
             for m in (step.methods if isinstance(step, CompoundStep) else [step])])
 
-        parallel = cores > 1 and chains > 1 and not has_population_samplers
+        batched = isinstance(step, BatchedNUTS)
+
+        parallel = ((cores > 1 and chains > 1 or pool is not None)
+                    and not has_population_samplers and not batched)
         if parallel:
             _log.info('Multiprocess sampling ({} chains in {} jobs)'.format(chains, cores))
             _print_step_hierarchy(step)
@@ -450,9 +513,19 @@ def sample(draws=500, step=None, init='auto', n_init=200000, start=None, trace=N
                     raise
         if not parallel:
             if has_population_samplers:
+                if target_ess is not None:
+                    _log.warning('target_ess is not supported by population samplers, '
+                                 'drawing all samples.')
                 _log.info('Population sampling ({} chains)'.format(chains))
                 _print_step_hierarchy(step)
                 trace = _sample_population(**sample_args)
+            elif batched:
+                if target_ess is not None:
+                    _log.warning('target_ess is not supported by BatchedNUTS, '
+                                 'drawing all samples.')
+                _log.info('Batched sampling ({} chains in 1 job)'.format(chains))
+                _print_step_hierarchy(step)
+                trace = _sample_batched(**sample_args)
             else:
                 _log.info('Sequential sampling ({} chains in 1 job)'.format(chains))
                 _print_step_hierarchy(step)
@@ -460,9 +533,11 @@ def sample(draws=500, step=None, init='auto', n_init=200000, start=None, trace=N
 
         discard = tune if discard_tuned_samples else 0
         trace = trace[discard:]
+        trace.report._online_diagnostics = diagnostics
 
         if compute_convergence_checks:
-            if draws-tune < 100:
+            # Sampling may have stopped before all draws were taken
+            if len(trace) - (tune - discard) < 100:
                 warnings.warn("The number of samples is too small to check convergence reliably.")
             else:
                 trace.report._run_convergence_checks(trace, model)
@@ -498,11 +573,21 @@ def _check_start_shape(model, start):
         raise ValueError("Bad shape for start argument:{}".format(e))
 
 
-def _sample_many(draws, chain, chains, start, random_seed, step, **kwargs):
+def _sample_many(draws, chain, chains, start, random_seed, step,
+                 diagnostics=None, target_ess=None, **kwargs):
+    max_draws = draws
     traces = []
     for i in range(chains):
+        # Only the first chain checks the stopping rule, the other
+        # chains draw as many samples as it did.
+        chain_target = target_ess / chains if target_ess and i == 0 else None
         trace = _sample(draws=draws, chain=chain + i, start=start[i],
-                        step=step, random_seed=random_seed[i], **kwargs)
+                        step=step, random_seed=random_seed[i],
+                        diagnostics=diagnostics, target_ess=chain_target,
+                        **kwargs)
+        if (chain_target is not None and trace is not None
+                and diagnostics.converged(chain_target, chains=[chain])):
+            draws = len(trace)
         if trace is None:
             if len(traces) == 0:
                 raise ValueError('Sampling stopped before a sample was created.')
@@ -514,9 +599,34 @@ def _sample_many(draws, chain, chains, start, random_seed, step, **kwargs):
             break
         else:
             traces.append(trace)
+
+    if target_ess is not None and len(traces) == chains:
+        _continue_until_converged(traces, max_draws, chain, step, diagnostics,
+                                  target_ess, **kwargs)
+        # All chains keep the same number of draws if interrupted
+        return MultiTrace(traces)[:min(len(trace) for trace in traces)]
     return MultiTrace(traces)
 
 
+def _continue_until_converged(traces, max_draws, chain, step, diagnostics,
+                              target_ess, block=100, **kwargs):
+    """Continue sequentially sampled chains in blocks of `block` draws
+    until they reach `target_ess` together, which also checks the
+    gelman-rubin statistic, or have `max_draws` draws."""
+    chain_nums = list(range(chain, chain + len(traces)))
+    kwargs.update(tune=None, progressbar=False, live_plot=False)
+    while (len(traces[0]) < max_draws
+           and not diagnostics.converged(target_ess, chains=chain_nums)):
+        draws = min(block, max_draws - len(traces[0]))
+        expected = len(traces[0]) + draws
+        for i, strace in enumerate(traces):
+            kwargs['trace'] = strace
+            _sample(draws=draws, chain=chain + i, start={}, step=step,
+                    random_seed=None, diagnostics=diagnostics, **kwargs)
+        if any(len(strace) < expected for strace in traces):
+            break
+
+
 def _sample_population(draws, chain, chains, start, random_seed, step, tune,
                        model, progressbar=None, parallelize=False, **kwargs):
     # create the generator that iterates all chains in parallel
@@ -534,14 +644,72 @@ def _sample_population(draws, chain, chains, start, random_seed, step, tune,
     return MultiTrace(latest_traces)
 
 
+def _sample_batched(draws, chain, chains, start, random_seed, step, tune,
+                    model, trace=None, progressbar=None, **kwargs):
+    """Draw all chains at once with a BatchedNUTS step method."""
+    model = modelcontext(model)
+    draws = int(draws)
+    if random_seed is not None:
+        np.random.seed(random_seed)
+    if draws < 1:
+        raise ValueError('Argument `draws` should be above 0.')
+
+    traces = []
+    points = []
+    for c in range(chains):
+        if trace is not None:
+            strace = _choose_backend(copy(trace), chain + c, model=model)
+        else:
+            strace = _choose_backend(None, chain + c, model=model)
+        update_start_vals(start[c], model.test_point, model)
+        points.append(Point(start[c], model=model))
+        if strace.supports_sampler_stats:
+            strace.setup(draws, chain + c, step.stats_dtypes)
+        else:
+            strace.setup(draws, chain + c)
+        traces.append(strace)
+
+    step.init_chains(chains)
+    step.tune = bool(tune)
+
+    sampling = range(draws)
+    if progressbar:
+        sampling = tqdm(sampling, total=draws)
+
+    try:
+        for i in sampling:
+            if i == tune:
+                step = stop_tuning(step)
+            points, stats = step.step_chains(points)
+            for strace, point, chain_stats in zip(traces, points, stats):
+                if strace.supports_sampler_stats:
+                    _record(strace, point, chain_stats)
+                else:
+                    _record(strace, point)
+    except KeyboardInterrupt:
+        for c, strace in enumerate(traces):
+            strace.close()
+            strace._add_warnings(step.chain_warnings(c))
+        raise
+    except BaseException:
+        for strace in traces:
+            strace.close()
+        raise
+    else:
+        for c, strace in enumerate(traces):
+            strace.close()
+            strace._add_warnings(step.chain_warnings(c))
+    return MultiTrace(traces)
+
+
 def _sample(chain, progressbar, random_seed, start, draws=None, step=None,
             trace=None, tune=None, model=None, live_plot=False,
-            live_plot_kwargs=None, **kwargs):
+            live_plot_kwargs=None, diagnostics=None, target_ess=None, **kwargs):
     skip_first = kwargs.get('skip_first', 0)
     refresh_every = kwargs.get('refresh_every', 100)
 
     sampling = _iter_sample(draws, step, start, trace, chain,
-                            tune, model, random_seed)
+                            tune, model, random_seed, diagnostics, target_ess)
     if progressbar:
         sampling = tqdm(sampling, total=draws)
     try:
@@ -565,7 +733,7 @@ def _sample(chain, progressbar, random_seed, start, draws=None, step=None,
 
 
 def iter_sample(draws, step, start=None, trace=None, chain=0, tune=None,
-                model=None, random_seed=None):
+                model=None, random_seed=None, diagnostics=None):
     """Generator that returns a trace on each iteration using the given
     step method.  Multiple step methods supported via compound step
     method returns the amount of time taken.
@@ -591,6 +759,8 @@ def iter_sample(draws, step, start=None, trace=None, chain=0, tune=None,
     model : Model (optional if in `with` context)
     random_seed : int or list of ints
         A list is accepted if more if `cores` is greater than one.
+    diagnostics : OnlineDiagnostics, optional
+        Updated with every draw after tuning.
 
     Examples
     --------
@@ -600,13 +770,13 @@ def iter_sample(draws, step, start=None, trace=None, chain=0, tune=None,
             ...
     """
     sampling = _iter_sample(draws, step, start, trace, chain, tune,
-                            model, random_seed)
+                            model, random_seed, diagnostics)
     for i, strace in enumerate(sampling):
         yield MultiTrace([strace[:i + 1]])
 
 
 def _iter_sample(draws, step, start=None, trace=None, chain=0, tune=None,
-                 model=None, random_seed=None):
+                 model=None, random_seed=None, diagnostics=None, target_ess=None):
     model = modelcontext(model)
     draws = int(draws)
     if random_seed is not None:
@@ -636,21 +806,29 @@ def _iter_sample(draws, step, start=None, trace=None, chain=0, tune=None,
     else:
         strace.setup(draws, chain)
 
+    n_tune = tune or 0
     try:
         step.tune = bool(tune)
         for i in range(draws):
             if i == tune:
                 step = stop_tuning(step)
+            states = None
             if step.generates_stats:
                 point, states = step.step(point)
                 if strace.supports_sampler_stats:
-                    strace.record(point, states)
+                    _record(strace, point, states)
                 else:
-                    strace.record(point)
+                    _record(strace, point)
             else:
                 point = step.step(point)
-                strace.record(point)
+                _record(strace, point)
+            if diagnostics is not None and i >= n_tune:
+                diagnostics.update(chain, point, states)
             yield strace
+            if (target_ess is not None and (i + 1 - n_tune) % 100 == 0
+                    and i >= n_tune
+                    and diagnostics.converged(target_ess, chains=[chain])):
+                break
     except KeyboardInterrupt:
         strace.close()
         if hasattr(step, 'warnings'):
@@ -667,14 +845,93 @@ def _iter_sample(draws, step, start=None, trace=None, chain=0, tune=None,
             strace._add_warnings(warns)
 
 
+class _SharedPopulation(object):
+    """States of all chains of a population in one double-buffered
+    `(2, nchains, ndim)` array.
+
+    Chains read the population of the previous iteration from the current
+    buffer and write their new state to the other one, which becomes current
+    once all chains were stepped. With `shared=True` the array is allocated
+    in shared memory, so that worker processes update their chains in place.
+
+    Parameters
+    ----------
+    points : list
+        Starting points of the chains
+    model : Model
+    shared : bool
+        Allocate the array in shared memory
+    """
+
+    def __init__(self, points, model, shared=False):
+        self.bij = DictToArrayBijection(ArrayOrdering(model.vars), points[0])
+        self.shape = (2, len(points), self.bij.ordering.size)
+        nbytes = int(np.prod(self.shape)) * np.dtype(self.bij.array_dtype).itemsize
+        if shared:
+            import multiprocessing
+            self._buffer = multiprocessing.RawArray(ctypes.c_byte, nbytes)
+        else:
+            self._buffer = bytearray(nbytes)
+        self._make_array()
+        self.current = 0
+        for c, point in enumerate(points):
+            self.array[0, c] = self.bij.map(point)
+
+    def _make_array(self):
+        self.array = np.frombuffer(
+            self._buffer, dtype=self.bij.array_dtype).reshape(self.shape)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['array']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._make_array()
+
+    def __len__(self):
+        return self.shape[1]
+
+    def __getitem__(self, c):
+        return self.bij.rmap(self.array[self.current, c])
+
+    def update(self, c, point):
+        """Write the new state of chain `c` to the next buffer."""
+        self.array[1 - self.current, c] = self.bij.map(point)
+
+    def indices(self, ordering):
+        """Columns of the array that hold the variables of `ordering`, in
+        its order."""
+        return np.concatenate([
+            np.arange(self.bij.ordering[vmap.var].slc.start,
+                      self.bij.ordering[vmap.var].slc.stop)
+            for vmap in ordering.vmap])
+
+    def swap(self):
+        self.current = 1 - self.current
+
+
+def _population_steppers(stepper):
+    """The PopulationArrayStepShared methods of `stepper`."""
+    methods = stepper.methods if isinstance(stepper, CompoundStep) else [stepper]
+    return [sm for sm in methods
+            if isinstance(sm, arraystep.PopulationArrayStepShared)]
+
+
 class PopulationStepper(object):
-    def __init__(self, steppers, parallelize):
+    def __init__(self, steppers, parallelize, population):
         """Tries to use multiprocessing to parallelize chains.
 
         Falls back to sequential evaluation if multiprocessing fails.
 
         In the multiprocessing mode of operation, a new process is started for each
-        chain/stepper and Pipes are used to communicate with the main process.
+        chain/stepper. The chains are read from and written to the population in
+        shared memory, and Pipes are only used to signal the steps and to return
+        the sampler stats.
+
+        Without multiprocessing, population step methods that support it step
+        all chains at once in the vectorized mode of operation.
 
         Parameters
         ----------
@@ -682,12 +939,22 @@ class PopulationStepper(object):
             A collection of independent step methods, one for each chain.
         parallelize : bool
             Indicates if chain parallelization is desired
+        population : _SharedPopulation
+            The states of the chains
         """
         self.nchains = len(steppers)
         self.is_parallelized = False
+        self.is_vectorized = False
         self._master_ends = []
         self._processes = []
         self._steppers = steppers
+        stepper = steppers[0]
+        if (not parallelize
+                and isinstance(stepper, arraystep.PopulationArrayStepShared)
+                and stepper.vectorize):
+            # the step method of the first chain steps all chains at once
+            self._columns = population.indices(stepper.ordering)
+            self.is_vectorized = len(self._columns) == population.shape[2]
         if parallelize and sys.version_info >= (3, 4):
             try:
                 # configure a child process for each stepper
@@ -695,10 +962,19 @@ class PopulationStepper(object):
                 import multiprocessing
                 for c, stepper in enumerate(tqdm(steppers)):
                     slave_end, master_end = multiprocessing.Pipe()
-                    stepper_dumps = pickle.dumps(stepper, protocol=4)
+                    # the population is passed on its own, it can not be
+                    # pickled with the stepper
+                    popsteps = _population_steppers(stepper)
+                    for popstep in popsteps:
+                        popstep.population = None
+                    try:
+                        stepper_dumps = pickle.dumps(stepper, protocol=4)
+                    finally:
+                        for popstep in popsteps:
+                            popstep.population = population
                     process = multiprocessing.Process(
                         target=self.__class__._run_slave,
-                        args=(c, stepper_dumps, slave_end),
+                        args=(c, stepper_dumps, population, slave_end),
                         name='ChainWalker{}'.format(c)
                     )
                     # we want the child process to exit if the parent is terminated
@@ -720,7 +996,7 @@ class PopulationStepper(object):
                               'on Python 3.4 and higher.  All {} chains will '
                               'run sequentially on one process.'
                               .format(self.nchains))
-            else:
+            elif not self.is_vectorized:
                 _log.info('Chains are not parallelized. You can enable this by passing '
                           'pm.sample(parallelize=True).')
         return super(PopulationStepper, self).__init__()
@@ -741,7 +1017,25 @@ class PopulationStepper(object):
         return
 
     @staticmethod
-    def _run_slave(c, stepper_dumps, slave_end):
+    def _step_chain(stepper, population, c):
+        """Steps chain `c` and writes its new state to the population.
+
+        Returns
+        -------
+        stats : list or None
+            The sampler stats, None if the stepper does not generate stats
+        """
+        point = population[c]
+        states = None
+        if stepper.generates_stats:
+            point, states = stepper.step(point)
+        else:
+            point = stepper.step(point)
+        population.update(c, point)
+        return states
+
+    @staticmethod
+    def _run_slave(c, stepper_dumps, population, slave_end):
         """Started on a separate process to perform stepping of a chain.
 
         Parameters
@@ -750,6 +1044,8 @@ class PopulationStepper(object):
             number of this chain
         stepper : BlockedStep
             a step method such as CompoundStep
+        population : _SharedPopulation
+            the states of all chains in shared memory
         slave_end : multiprocessing.connection.PipeConnection
             This is our connection to the main process
         """
@@ -758,27 +1054,21 @@ class PopulationStepper(object):
         try:
             stepper = pickle.loads(stepper_dumps)
             # the stepper is not necessarily a PopulationArraySharedStep itself,
-            # but rather a CompoundStep. PopulationArrayStepShared.population
-            # has to be updated, therefore we identify the substeppers first.
-            population_steppers = []
-            for sm in (stepper.methods if isinstance(stepper, CompoundStep) else [stepper]):
-                if isinstance(sm, arraystep.PopulationArrayStepShared):
-                    population_steppers.append(sm)
+            # but rather a CompoundStep. The population has to be linked to the
+            # PopulationArrayStepShared substeppers again.
+            for popstep in _population_steppers(stepper):
+                popstep.link_population(population, c)
             while True:
                 incoming = slave_end.recv()
                 # receiving a None is the signal to exit
                 if incoming is None:
                     break
-                tune_stop, population = incoming
+                tune_stop, current = incoming
                 if tune_stop:
                     stop_tuning(stepper)
-                # forward the population to the PopulationArrayStepShared objects
-                # This is necessary because due to the process fork, the population
-                # object is no longer shared between the steppers.
-                for popstep in population_steppers:
-                    popstep.population = population
-                update = stepper.step(population[c])
-                slave_end.send(update)
+                population.current = current
+                states = PopulationStepper._step_chain(stepper, population, c)
+                slave_end.send(states)
         except Exception:
             _log.exception('ChainWalker{}'.format(c))
         return
@@ -790,27 +1080,34 @@ class PopulationStepper(object):
         ----------
         tune_stop : bool
             Indicates if the condition (i == tune) is fulfilled
-        population : list
-            Current Points of all chains
+        population : _SharedPopulation
+            Current states of all chains, updated in place
 
         Returns
         -------
-        update : Point
-            The new positions of the chains
+        stats : list
+            The sampler stats of the chains (None for steppers without stats)
         """
-        updates = [None] * self.nchains
+        stats = [None] * self.nchains
         if self.is_parallelized:
             for c in range(self.nchains):
-                self._master_ends[c].send((tune_stop, population))
-            # Blockingly get the step outcomes
+                self._master_ends[c].send((tune_stop, population.current))
+            # Blockingly wait for the steps to finish
             for c in range(self.nchains):
-                updates[c] = self._master_ends[c].recv()
+                stats[c] = self._master_ends[c].recv()
+        elif self.is_vectorized:
+            if tune_stop:
+                self._steppers[0] = stop_tuning(self._steppers[0])
+            Q0 = population.array[population.current][:, self._columns]
+            Q, stats = self._steppers[0].astep_population(Q0)
+            population.array[1 - population.current][:, self._columns] = Q
         else:
             for c in range(self.nchains):
                 if tune_stop:
                     self._steppers[c] = stop_tuning(self._steppers[c])
-                updates[c] = self._steppers[c].step(population[c])
-        return updates
+                stats[c] = self._step_chain(self._steppers[c], population, c)
+        population.swap()
+        return stats
 
 
 def _prepare_iter_population(draws, chains, step, start, parallelize, tune=None,
@@ -849,7 +1146,9 @@ def _prepare_iter_population(draws, chains, step, start, parallelize, tune=None,
 
     # 2. create a population (points) that tracks each chain
     # it is updated as the chains are advanced
-    population = [Point(start[c], model=model) for c in range(nchains)]
+    population = _SharedPopulation(
+        [Point(start[c], model=model) for c in range(nchains)], model,
+        shared=parallelize)
 
     # 3. Set up the steppers
     steppers = [None] * nchains
@@ -861,9 +1160,8 @@ def _prepare_iter_population(draws, chains, step, start, parallelize, tune=None,
         else:
             chainstep = copy(step)
         # link population samplers to the shared population state
-        for sm in (chainstep.methods if isinstance(step, CompoundStep) else [chainstep]):
-            if isinstance(sm, arraystep.PopulationArrayStepShared):
-                sm.link_population(population, c)
+        for sm in _population_steppers(chainstep):
+            sm.link_population(population, c)
         steppers[c] = chainstep
 
     # 4. configure tracking of sampler stats
@@ -874,14 +1172,14 @@ def _prepare_iter_population(draws, chains, step, start, parallelize, tune=None,
             traces[c].setup(draws, c)
 
     # 5. configure the PopulationStepper (expensive call)
-    popstep = PopulationStepper(steppers, parallelize)
+    popstep = PopulationStepper(steppers, parallelize, population)
 
     # Because the preperations above are expensive, the actual iterator is
     # in another method. This way the progbar will not be disturbed.
     return _iter_population(draws, tune, popstep, steppers, traces, population)
 
 
-def _iter_population(draws, tune, popstep, steppers, traces, points):
+def _iter_population(draws, tune, popstep, steppers, traces, population):
     """Generator that iterates a PopulationStepper.
 
     Parameters
@@ -896,26 +1194,27 @@ def _iter_population(draws, tune, popstep, steppers, traces, points):
         The step methods for each chain
     traces : list
         Traces for each chain
-    points : list
+    population : _SharedPopulation
         population of chain states
     """
     try:
         with popstep:
             # iterate draws of all chains
             for i in range(draws):
-                updates = popstep.step(i == tune, points)
+                stats = popstep.step(i == tune, population)
 
-                # apply the update to the points and record to the traces
+                # record the new states of the chains to the traces
                 for c, strace in enumerate(traces):
-                    if steppers[c].generates_stats:
-                        points[c], states = updates[c]
-                        if strace.supports_sampler_stats:
-                            strace.record(points[c], states)
-                        else:
-                            strace.record(points[c])
+                    if steppers[c].generates_stats and strace.supports_sampler_stats:
+                        states = stats[c]
+                    else:
+                        states = None
+                    if strace.supports_flat_record:
+                        # the population is laid out like `model.bijection`
+                        strace.record_flat(
+                            population.array[population.current, c], states)
                     else:
-                        points[c] = updates[c]
-                        strace.record(points[c])
+                        _record(strace, population[c], states)
                 # yield the state of all chains in parallel
                 yield traces
     except KeyboardInterrupt:
@@ -935,6 +1234,17 @@ def _iter_population(draws, tune, popstep, steppers, traces, points):
                 steppers[c].report._finalize(strace)
 
 
+def _record(strace, point, sampler_stats=None):
+    """Record `point` in `strace`, as the flat array of the free variables
+    if the backend supports it."""
+    if strace.supports_flat_record:
+        strace.record_flat(strace.model.bijection.map(point), sampler_stats)
+    elif sampler_stats is None:
+        strace.record(point)
+    else:
+        strace.record(point, sampler_stats)
+
+
 def _choose_backend(trace, chain, shortcuts=None, **kwds):
     if isinstance(trace, BaseTrace):
         return trace
@@ -958,6 +1268,7 @@ def _choose_backend(trace, chain, shortcuts=None, **kwds):
 
 def _mp_sample(draws, tune, step, chains, cores, chain, random_seed,
                start, progressbar, trace=None, model=None, use_mmap=False,
+               buffer_size=1, pool=None, diagnostics=None, target_ess=None,
                **kwargs):
 
     if sys.version_info.major >= 3:
@@ -981,9 +1292,17 @@ def _mp_sample(draws, tune, step, chains, cores, chain, random_seed,
                 strace.setup(draws + tune, idx + chain)
             traces.append(strace)
 
-        sampler = ps.ParallelSampler(
-            draws, tune, chains, cores, random_seed, start, step,
-            chain, progressbar)
+        if pool is not None:
+            sampler = pool.sampler(
+                draws, tune, chains, random_seed, start, chain, progressbar,
+                diagnostics)
+        else:
+            sampler = ps.ParallelSampler(
+                draws, tune, chains, cores, random_seed, start, step,
+                chain, progressbar, buffer_size, diagnostics)
+        chain_nums = list(range(chain, chain + chains))
+        n_checked = 0
+        stopped = False
         try:
             try:
                 with sampler:
@@ -991,13 +1310,20 @@ def _mp_sample(draws, tune, step, chains, cores, chain, random_seed,
                         trace = traces[draw.chain - chain]
                         if (trace.supports_sampler_stats
                                 and draw.stats is not None):
-                            trace.record(draw.point, draw.stats)
+                            _record(trace, draw.point, draw.stats)
                         else:
-                            trace.record(draw.point)
+                            _record(trace, draw.point)
                         if draw.is_last:
                             trace.close()
                             if draw.warnings is not None:
                                 trace._add_warnings(draw.warnings)
+                        if target_ess is None or draw.tuning:
+                            continue
+                        n_checked += 1
+                        if (n_checked % 100 == 0 and
+                                diagnostics.converged(target_ess, chains=chain_nums)):
+                            stopped = True
+                            break
             except ps.ParallelSamplingError as error:
                 trace = traces[error._chain - chain]
                 trace._add_warnings(error._warnings)
@@ -1007,8 +1333,17 @@ def _mp_sample(draws, tune, step, chains, cores, chain, random_seed,
                 multitrace = MultiTrace(traces)
                 multitrace._report._log_summary()
                 raise
+            if stopped:
+                # Keep all chains, they have converged together. The
+                # length of some backends is only known after closing.
+                for trace in traces:
+                    trace.close()
+                length = min(len(trace) for trace in traces)
+                return MultiTrace(traces)[:length]
             return MultiTrace(traces)
         except KeyboardInterrupt:
+            for trace in traces:
+                trace.close()
             traces, length = _choose_chains(traces, tune)
             return MultiTrace(traces)[:length]
         finally:
@@ -1070,7 +1405,7 @@ def stop_tuning(step):
 
 
 def sample_posterior_predictive(trace, samples=None, model=None, vars=None, size=None,
-                                random_seed=None, progressbar=True):
+                                random_seed=None, progressbar=True, batched=False):
     """Generate posterior predictive samples from a model given a trace.
 
     Parameters
@@ -1094,6 +1429,11 @@ def sample_posterior_predictive(trace, samples=None, model=None, vars=None, size
         Whether or not to display a progress bar in the command line. The bar shows the percentage
         of completion, the sampling speed in samples per second (SPS), and the estimated remaining
         time until completion ("expected time of arrival"; ETA).
+    batched : bool
+        Draw all samples of an observed variable with one call to its `random` method, using
+        parameters stacked along a leading sample axis. Only used if `size` is None. Variables
+        whose distribution can not broadcast its parameters this way (multivariate
+        distributions, custom random functions, ...) are sampled point by point as usual.
 
     Returns
     -------
@@ -1118,12 +1458,18 @@ def sample_posterior_predictive(trace, samples=None, model=None, vars=None, size
     if random_seed is not None:
         np.random.seed(random_seed)
 
+    ppc_trace = defaultdict(list)
+    if batched and size is None:
+        ppc_trace.update(_batched_posterior_predictive(trace, samples, model, vars))
+        vars = [var for var in vars if var.name not in ppc_trace]
+        if not vars:
+            return {k: np.asarray(v) for k, v in ppc_trace.items()}
+
     indices = np.arange(samples)
 
     if progressbar:
         indices = tqdm(indices, total=samples)
 
-    ppc_trace = defaultdict(list)
     try:
         for idx in indices:
             if nchain > 1:
@@ -1146,6 +1492,109 @@ def sample_posterior_predictive(trace, samples=None, model=None, vars=None, size
     return {k: np.asarray(v) for k, v in ppc_trace.items()}
 
 
+def _batched_trace_values(trace, varname, samples):
+    """Stack the values of `varname` for the first `samples` points in the
+    order used by `sample_posterior_predictive`."""
+    len_trace = len(trace)
+    idx = np.arange(samples)
+    if isinstance(trace, MultiTrace):
+        if trace.nchains > 1:
+            chain_idx, point_idx = np.divmod(idx, len_trace)
+            chain_idx = chain_idx % trace.nchains
+        else:
+            chain_idx, point_idx = np.zeros_like(idx), idx % len_trace
+        chains = sorted(trace._straces)
+        values = None
+        for c in np.unique(chain_idx):
+            vals = trace._straces[chains[c]].get_values(varname)
+            if values is None:
+                values = np.empty((samples,) + vals.shape[1:], dtype=vals.dtype)
+            mask = chain_idx == c
+            values[mask] = vals[point_idx[mask]]
+        return values
+    return np.stack([np.asarray(trace[i % len_trace][varname]) for i in idx])
+
+
+def _is_ppc_batchable(var):
+    if not isinstance(var, ObservedRV):
+        return False
+    dist = var.distribution
+    if type(dist).__module__ not in (continuous.__name__, discrete.__name__):
+        return False
+    # The parameters of these distributions are not elementwise
+    return not isinstance(dist, (discrete.Categorical, continuous.Interpolated))
+
+
+def _batched_posterior_predictive(trace, samples, model, vars):
+    """Draw posterior predictive samples for all points at once.
+
+    The distribution parameters are computed for all points with one call
+    to a function from `Model.batched_fastfn`. Returns a dict with samples
+    for those variables in `vars` that could be drawn in one batch. The
+    caller samples the remaining ones point by point.
+    """
+    vars = [var for var in vars if _is_ppc_batchable(var)]
+    if not vars:
+        return {}
+
+    try:
+        point = {var.name: _batched_trace_values(trace, var.name, samples)
+                 for var in model.free_RVs}
+    except (KeyError, ValueError):
+        return {}
+
+    # The points in the array layout of `model.batched_fastfn`
+    bij = model.bijection
+    batch = np.empty((samples, bij.ordering.size), dtype=bij.array_dtype)
+    for vmap in bij.ordering.vmap:
+        batch[:, vmap.slc] = point[vmap.var].reshape(samples, -1)
+
+    ppc = {}
+    for var in vars:
+        dist = var.distribution
+        try:
+            dist_shape = tuple(var.observations.shape.eval())
+        except AttributeError:
+            dist_shape = tuple(np.shape(var.observations))
+
+        params = []
+        for param in dist.__dict__.values():
+            if is_fast_drawable(param) or not isinstance(param, tt.TensorVariable):
+                continue
+            if any(param is p for p in params):
+                continue
+            params.append(param)
+
+        try:
+            drawn = {}
+            computed = [p for p in params if p.name not in point]
+            if computed:
+                values = model.batched_fastfn(computed)(batch)
+                for param, value in zip(computed, values):
+                    drawn[param] = value
+            for param in params:
+                if param.name in point:
+                    drawn[param] = point[param.name]
+            for param, value in drawn.items():
+                # Align the parameter with the trailing (observed) axes
+                # and broadcast it to the shape of one sample.
+                param_shape = value.shape[1:]
+                pad = (1,) * (len(dist_shape) - len(param_shape))
+                value = value.reshape((samples,) + pad + param_shape)
+                drawn[param] = np.broadcast_to(value, (samples,) + dist_shape)
+
+            with _DrawValuesContext() as context:
+                context.drawn_vars.update(drawn)
+                value = np.asarray(dist.random(point=point, size=None))
+        except (MissingInputError, ValueError, TypeError):
+            continue
+
+        if value.shape != (samples,) + dist_shape:
+            continue
+        ppc[var.name] = value
+    return ppc
+
+
 def sample_ppc(*args, **kwargs):
     """This method is deprecated.  Please use :func:`~sampling.sample_posterior_predictive`"""
     message = 'sample_ppc() is deprecated.  Please use sample_posterior_predictive()'
@@ -1321,6 +1770,9 @@ def sample_prior_predictive(samples=500, model=None, vars=None, random_seed=None
     if random_seed is not None:
         np.random.seed(random_seed)
     names = get_default_varnames(model.named_vars, include_transformed=False)
+    # `Data` containers are not random
+    names = [name for name in names
+             if not isinstance(model[name], tt.sharedvar.SharedVariable)]
     # draw_values fails with auto-transformed variables. transform them later!
     values = draw_values([model[name] for name in names], size=samples)
 
@@ -1358,6 +1810,10 @@ def init_nuts(init='auto', chains=1, n_init=500000, model=None,
           as starting point.
         * jitter+adapt_diag : Same as `adapt_diag`, but use uniform jitter in [-1, 1] as starting
           point in each chain.
+        * adapt_full : Adapt a dense mass matrix using the sample covariances. All chains use the
+          test value (usually the prior mean) as starting point.
+        * jitter+adapt_full : Same as `adapt_full`, but use uniform jitter in [-1, 1] as starting
+          point in each chain.
         * advi+adapt_diag : Run ADVI and then adapt the resulting diagonal mass matrix based on the
           sample variance of the tuning samples.
         * advi+adapt_diag_grad : Run ADVI and then adapt the resulting diagonal mass matrix based
@@ -1434,6 +1890,23 @@ def init_nuts(init='auto', chains=1, n_init=500000, model=None,
         var = np.ones_like(mean)
         potential = quadpotential.QuadPotentialDiagAdapt(
             model.ndim, mean, var, 10)
+    elif init == 'adapt_full':
+        start = [model.test_point] * chains
+        mean = np.mean([model.dict_to_array(vals) for vals in start], axis=0)
+        cov = np.eye(model.ndim)
+        potential = quadpotential.QuadPotentialFullAdapt(
+            model.ndim, mean, cov, 10)
+    elif init == 'jitter+adapt_full':
+        start = []
+        for _ in range(chains):
+            mean = {var: val.copy() for var, val in model.test_point.items()}
+            for val in mean.values():
+                val[...] += 2 * np.random.rand(*val.shape) - 1
+            start.append(mean)
+        mean = np.mean([model.dict_to_array(vals) for vals in start], axis=0)
+        cov = np.eye(model.ndim)
+        potential = quadpotential.QuadPotentialFullAdapt(
+            model.ndim, mean, cov, 10)
     elif init == 'advi+adapt_diag_grad':
         approx = pm.fit(
             random_seed=random_seed,
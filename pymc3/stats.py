@@ -1,7 +1,11 @@
 """Statistical utility functions for PyMC"""
+import collections
 from collections import namedtuple
-import itertools
+import multiprocessing
+import os
 import pkg_resources
+import shutil
+import tempfile
 import warnings
 
 import numpy as np
@@ -11,10 +15,10 @@ from scipy.optimize import minimize
 from scipy.signal import fftconvolve
 from tqdm import tqdm
 
+from .backends.base import MultiTrace
 from .model import modelcontext
 from .util import get_default_varnames
 import pymc3 as pm
-from pymc3.theanof import floatX
 
 if pkg_resources.get_distribution('scipy').version < '1.0.0':
     from scipy.misc import logsumexp
@@ -121,7 +125,7 @@ def autocov(x, lag=None):
         return acov[lag]
 
 
-def _log_post_trace(trace, model=None, progressbar=False):
+def _log_post_trace(trace, model=None, progressbar=False, block_size=1000, cores=1):
     """Calculate the elementwise log-posterior for the sampled trace.
 
     Parameters
@@ -133,27 +137,39 @@ def _log_post_trace(trace, model=None, progressbar=False):
         Whether or not to display a progress bar in the command line. The
         bar shows the percentage of completion, the evaluation speed, and
         the estimated time to completion
+    block_size : int
+        Number of draws that are evaluated together, see
+        `_log_post_trace_blocks`.
+    cores : int
+        Number of processes used to evaluate the blocks.
 
     Returns
     -------
     logp : array of shape (n_samples, n_observations)
         The contribution of the observations to the logp of the whole model.
     """
-    model = modelcontext(model)
-    cached = [(var, var.logp_elemwise) for var in model.observed_RVs]
+    blocks = _log_post_trace_blocks(trace, model, progressbar=progressbar,
+                                    block_size=block_size, cores=cores)
+    return np.concatenate(list(blocks))
+
 
-    def logp_vals_point(pt):
-        if len(model.observed_RVs) == 0:
-            return floatX(np.array([], dtype='d'))
+def _log_post_trace_blocks(trace, model=None, progressbar=False, block_size=1000,
+                           cores=1):
+    """Calculate the elementwise log-posterior for blocks of draws.
 
-        logp_vals = []
-        for var, logp in cached:
-            logp = logp(pt)
-            if var.missing_values:
-                logp = logp[~var.observations.mask]
-            logp_vals.append(logp.ravel())
+    Only one block of shape (block_size, n_observations) is held in memory
+    at a time. If `cores` is larger than one, the blocks are evaluated in
+    a process pool and yielded in order.
 
-        return np.concatenate(logp_vals)
+    Yields
+    ------
+    logp : array of shape (n_draws_in_block, n_observations)
+    """
+    model = modelcontext(model)
+    logp_fns = [var.logp_elemwise.f for var in model.observed_RVs]
+    keep = [~var.observations.mask if var.missing_values else None
+            for var in model.observed_RVs]
+    varnames = [var.name for var in model.vars]
 
     try:
         points = trace.points()
@@ -162,17 +178,124 @@ def _log_post_trace(trace, model=None, progressbar=False):
 
     points = tqdm(points) if progressbar else points
 
+    def point_blocks():
+        block = []
+        for pt in points:
+            block.append({name: pt[name] for name in varnames})
+            if len(block) == block_size:
+                yield block
+                block = []
+        if block:
+            yield block
+
+    pool = None
     try:
-        logp = (logp_vals_point(pt) for pt in points)
-        return np.stack(logp)
+        if cores > 1:
+            # The compiled functions are sent to the workers only once
+            pool = multiprocessing.Pool(processes=cores,
+                                        initializer=_init_logp_worker,
+                                        initargs=(logp_fns, keep))
+            for logp in pool.imap(_logp_worker, point_blocks()):
+                yield logp
+        else:
+            for block in point_blocks():
+                yield _logp_block(block, logp_fns, keep)
     finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
         if progressbar:
             points.close()
 
 
+def _logp_block(block, logp_fns, keep):
+    """Evaluate the elementwise logp of the observed variables at a list of points."""
+    logp = []
+    for pt in block:
+        logp_vals = [np.empty(0)]
+        for fn, idx in zip(logp_fns, keep):
+            vals = fn(**pt)
+            if idx is not None:
+                vals = vals[idx]
+            logp_vals.append(vals.ravel())
+        logp.append(np.concatenate(logp_vals))
+    return np.stack(logp)
+
+
+_worker_logp = None
+
+
+def _init_logp_worker(logp_fns, keep):
+    global _worker_logp
+    _worker_logp = (logp_fns, keep)
+
+
+def _logp_worker(block):
+    return _logp_block(block, *_worker_logp)
+
+
+def _n_draws(trace):
+    """Number of draws of all chains of a MultiTrace, or of points in a
+    list of points."""
+    if isinstance(trace, MultiTrace):
+        return sum(len(strace) for strace in trace._straces.values())
+    return len(trace)
+
+
+def _log_post_trace_memmap(blocks, n_samples, directory):
+    """Write the blocks of `_log_post_trace_blocks` to a memory-mapped
+    array of shape (n_samples, n_observations) in `directory`.
+
+    The array is stored in Fortran order, so that the samples of a block of
+    observations are contiguous on disk.
+    """
+    log_py = None
+    start = 0
+    for block in blocks:
+        if log_py is None:
+            if block.shape[1] == 0:
+                # Empty files can not be mapped
+                return np.empty((n_samples, 0))
+            log_py = np.memmap(os.path.join(directory, 'log_py.dat'), dtype='float64',
+                               mode='w+', shape=(n_samples, block.shape[1]), order='F')
+        log_py[start:start + len(block)] = block
+        start += len(block)
+    return log_py
+
+
+def _pointwise_lppd_var(blocks):
+    """Reduce blocks of elementwise log-likelihoods to the log pointwise
+    predictive density and the variance over the draws of every observation.
+
+    The log-sum-exp is accumulated with `np.logaddexp` and the variance
+    with the pairwise update of Chan et al., so the full
+    (n_samples, n_observations) matrix is never needed.
+    """
+    n = 0
+    for block in blocks:
+        k = len(block)
+        if k == 0:
+            continue
+        block_lse = logsumexp(block, axis=0)
+        block_mean = block.mean(axis=0)
+        block_m2 = np.sum((block - block_mean) ** 2, axis=0)
+        if n == 0:
+            lse, mean, m2 = block_lse, block_mean, block_m2
+        else:
+            lse = np.logaddexp(lse, block_lse)
+            delta = block_mean - mean
+            mean = mean + delta * k / (n + k)
+            m2 = m2 + block_m2 + delta ** 2 * n * k / (n + k)
+        n += k
+    if n == 0:
+        raise ValueError('The trace does not contain any samples.')
+    return lse - np.log(n), m2 / n
+
+
 WAIC_r_pointwise = namedtuple('WAIC_r_pointwise', 'WAIC, WAIC_se, p_WAIC, var_warn, WAIC_i')
 WAIC_r = namedtuple('WAIC_r', 'WAIC, WAIC_se, p_WAIC, var_warn')
-def waic(trace, model=None, pointwise=False, progressbar=False):
+def waic(trace, model=None, pointwise=False, progressbar=False, block_size=1000,
+         cores=1):
     """Calculate the widely available information criterion, its standard error
     and the effective number of parameters of the samples in trace from model.
     Read more theory here - in a paper by some of the leading authorities on
@@ -190,6 +313,13 @@ def waic(trace, model=None, pointwise=False, progressbar=False):
         Whether or not to display a progress bar in the command line. The
         bar shows the percentage of completion, the evaluation speed, and
         the estimated time to completion
+    block_size : int
+        Number of draws for which the elementwise log-likelihood is evaluated
+        together. The statistics are accumulated block by block, so memory use
+        is proportional to `block_size` times the number of observations
+        instead of the number of samples times the number of observations.
+    cores : int
+        Number of processes used to evaluate the log-likelihood. Default 1.
 
     Returns
     -------
@@ -203,13 +333,12 @@ def waic(trace, model=None, pointwise=False, progressbar=False):
     """
     model = modelcontext(model)
 
-    log_py = _log_post_trace(trace, model, progressbar=progressbar)
-    if log_py.size == 0:
+    blocks = _log_post_trace_blocks(trace, model, progressbar=progressbar,
+                                    block_size=block_size, cores=cores)
+    lppd_i, vars_lpd = _pointwise_lppd_var(blocks)
+    if lppd_i.size == 0:
         raise ValueError('The model does not contain observed values.')
 
-    lppd_i = logsumexp(log_py, axis=0, b=1.0 / log_py.shape[0])
-
-    vars_lpd = np.var(log_py, axis=0)
     warn_mg = 0
     if np.any(vars_lpd > 0.4):
         warnings.warn("""For one or more samples the posterior variance of the
@@ -237,9 +366,16 @@ def waic(trace, model=None, pointwise=False, progressbar=False):
         return WAIC_r(waic, waic_se, p_waic, warn_mg)
 
 
+# Number of log-likelihood values that `loo` loads from the memory-mapped
+# file at once
+_LOO_MMAP_BLOCK = 2 ** 24
+# Maximum number of log weights that `_psislw` smooths at once
+_PSIS_BLOCK = 2 ** 22
+
 LOO_r_pointwise = namedtuple('LOO_r_pointwise', 'LOO, LOO_se, p_LOO, shape_warn, LOO_i')
 LOO_r = namedtuple('LOO_r', 'LOO, LOO_se, p_LOO, shape_warn')
-def loo(trace, model=None, pointwise=False, reff=None, progressbar=False):
+def loo(trace, model=None, pointwise=False, reff=None, progressbar=False, block_size=1000,
+        cores=1, use_mmap=False):
     """Calculates leave-one-out (LOO) cross-validation for out of sample
     predictive model fit, following Vehtari et al. (2015). Cross-validation is
     computed using Pareto-smoothed importance sampling (PSIS).
@@ -260,6 +396,17 @@ def loo(trace, model=None, pointwise=False, reff=None, progressbar=False):
         Whether or not to display a progress bar in the command line. The
         bar shows the percentage of completion, the evaluation speed, and
         the estimated time to completion
+    block_size : int
+        Number of draws for which the elementwise log-likelihood is evaluated
+        together.
+    cores : int
+        Number of processes used to evaluate the log-likelihood and to smooth
+        the importance weights. Default 1.
+    use_mmap : bool
+        Store the elementwise log-likelihood of all samples in a temporary
+        memory-mapped file instead of in memory, and smooth the importance
+        weights of a block of observations at a time. Use this if the
+        (n_samples, n_observations) matrix does not fit into memory.
 
     Returns
     -------
@@ -279,15 +426,37 @@ def loo(trace, model=None, pointwise=False, reff=None, progressbar=False):
         else:
             eff = pm.effective_n(trace)
             eff_ave = pm.stats.dict2pd(eff, 'eff').mean()
-            samples = len(trace) * trace.nchains
-            reff = eff_ave / samples
-
-    log_py = _log_post_trace(trace, model, progressbar=progressbar)
-    if log_py.size == 0:
-        raise ValueError('The model does not contain observed values.')
+            reff = eff_ave / _n_draws(trace)
 
-    lw, ks = _psislw(-log_py, reff)
-    lw += log_py
+    directory = tempfile.mkdtemp(prefix='pymc3_loo_') if use_mmap else None
+    log_py = None
+    try:
+        blocks = _log_post_trace_blocks(trace, model, progressbar=progressbar,
+                                        block_size=block_size, cores=cores)
+        if use_mmap:
+            log_py = _log_post_trace_memmap(blocks, _n_draws(trace), directory)
+        else:
+            log_py = np.concatenate(list(blocks))
+        if log_py.size == 0:
+            raise ValueError('The model does not contain observed values.')
+
+        n_samples, n_obs = log_py.shape
+        # The weights of every observation are smoothed independently
+        step = max(1, _LOO_MMAP_BLOCK // n_samples) if use_mmap else n_obs
+        ks = np.empty(n_obs)
+        loo_lppd_i = np.empty(n_obs)
+        lppd_i = np.empty(n_obs)
+        for start in range(0, n_obs, step):
+            cols = slice(start, start + step)
+            log_py_cols = np.asarray(log_py[:, cols])
+            lw, ks[cols] = _psislw(-log_py_cols, reff, cores)
+            lw += log_py_cols
+            loo_lppd_i[cols] = - 2 * logsumexp(lw, axis=0)
+            lppd_i[cols] = logsumexp(log_py_cols, axis=0, b=1. / n_samples)
+    finally:
+        if directory is not None:
+            del log_py
+            shutil.rmtree(directory, ignore_errors=True)
 
     warn_mg = 0
     if np.any(ks > 0.7):
@@ -299,10 +468,9 @@ def loo(trace, model=None, pointwise=False, reff=None, progressbar=False):
         happen with a non-robust model and highly influential observations.""")
         warn_mg = 1
 
-    loo_lppd_i = - 2 * logsumexp(lw, axis=0)
     loo_lppd = loo_lppd_i.sum()
     loo_lppd_se = (len(loo_lppd_i) * np.var(loo_lppd_i)) ** 0.5
-    lppd = np.sum(logsumexp(log_py, axis=0, b=1. / log_py.shape[0]))
+    lppd = np.sum(lppd_i)
     p_loo = lppd + (0.5 * loo_lppd)
 
     if pointwise:
@@ -316,15 +484,21 @@ def loo(trace, model=None, pointwise=False, reff=None, progressbar=False):
         return LOO_r(loo_lppd, loo_lppd_se, p_loo, warn_mg)
 
 
-def _psislw(lw, reff):
+def _psislw(lw, reff, cores=1):
     """Pareto smoothed importance sampling (PSIS).
 
+    The right tails of all observations are partially sorted and smoothed
+    at once, in blocks of columns of at most `_PSIS_BLOCK` values.
+
     Parameters
     ----------
     lw : array
         Array of size (n_samples, n_observations)
     reff : float
         relative MCMC efficiency, `effective_n / n`
+    cores : int
+        Number of processes that smooth blocks of observations in parallel.
+        Default 1.
 
     Returns
     -------
@@ -335,55 +509,110 @@ def _psislw(lw, reff):
     """
     n, m = lw.shape
 
-    lw_out = np.copy(lw, order='F')
+    if cores > 1 and m > 1:
+        pool = multiprocessing.Pool(processes=cores)
+        try:
+            work = [(block, reff) for block in np.array_split(lw, min(cores, m), axis=1)]
+            results = pool.map(_psislw_worker, work)
+        finally:
+            pool.close()
+            pool.join()
+        lw_out = np.concatenate([result[0] for result in results], axis=1)
+        kss = np.concatenate([result[1] for result in results])
+        return lw_out, kss
+
+    lw_out = np.empty(lw.shape)
     kss = np.empty(m)
+    step = max(1, _PSIS_BLOCK // n)
+    for start in range(0, m, step):
+        cols = slice(start, start + step)
+        lw_out[:, cols], kss[cols] = _psislw_block(lw[:, cols], reff)
+
+    return lw_out, kss
+
+
+def _psislw_block(lw, reff):
+    """Pareto smoothed importance sampling of all columns of `lw` at once."""
+    n, m = lw.shape
+
+    # improve numerical accuracy
+    lw_out = lw - np.max(lw, axis=0)
+    kss = np.full(m, np.inf)
 
     # precalculate constants
     cutoff_ind = - int(np.ceil(min(n / 5., 3 * (n / reff) ** 0.5))) - 1
     cutoffmin = np.log(np.finfo(float).tiny)
     k_min = 1. / 3
-
-    # loop over sets of log weights
-    for i, x in enumerate(lw_out.T):
-        # improve numerical accuracy
-        x -= np.max(x)
-        # sort the array
-        x_sort_ind = np.argsort(x)
-        # divide log weights into body and right tail
-        xcutoff = max(x[x_sort_ind[cutoff_ind]], cutoffmin)
-
-        expxcutoff = np.exp(xcutoff)
-        tailinds, = np.where(x > xcutoff)
-        x2 = x[tailinds]
-        n2 = len(x2)
-        if n2 <= 4:
-            # not enough tail samples for gpdfit
-            k = np.inf
-        else:
-            # order of tail samples
-            x2si = np.argsort(x2)
-            # fit generalized Pareto distribution to the right tail samples
-            x2 = np.exp(x2) - expxcutoff
-            k, sigma = _gpdfit(x2[x2si])
-
-        if k >= k_min and not np.isinf(k):
-            # no smoothing if short tail or GPD fit failed
+    n_tail = - cutoff_ind - 1
+    cols = np.arange(m)
+
+    # partially sort the columns, only the right tails (including the cutoff) are ordered
+    tail_ind = np.argpartition(lw_out, n + cutoff_ind, axis=0)[n + cutoff_ind:]
+    tail_ind = tail_ind[np.argsort(lw_out[tail_ind, cols], axis=0), cols]
+    tail = lw_out[tail_ind, cols]
+    # divide log weights into body and right tail
+    xcutoff = np.maximum(tail[0], cutoffmin)
+    tail_ind, tail = tail_ind[1:], tail[1:]
+
+    if n_tail > 4:
+        # ties at the cutoff shorten the tail, these columns are smoothed one by one
+        regular = tail[0] > xcutoff
+        for i in np.flatnonzero(~regular):
+            kss[i] = _psislw_column(lw_out[:, i], cutoff_ind, cutoffmin, k_min)
+
+        reg = np.flatnonzero(regular)
+        expxcutoff = np.exp(xcutoff[reg])
+        # fit generalized Pareto distribution to the right tail samples
+        k, sigma = _gpdfit(np.exp(tail[:, reg]) - expxcutoff)
+        kss[reg] = k
+
+        # no smoothing if short tail or GPD fit failed
+        smooth = (k >= k_min) & ~np.isinf(k)
+        if np.any(smooth):
             # compute ordered statistic for the fit
-            sti = np.arange(0.5, n2) / n2
-            qq = _gpinv(sti, k, sigma)
-            qq = np.log(qq + expxcutoff)
+            sti = np.arange(0.5, n_tail) / n_tail
+            qq = _gpinv(sti, k[smooth], sigma[smooth])
             # place the smoothed tail into the output array
-            x[tailinds[x2si]] = qq
-            # truncate smoothed values to the largest raw weight 0
-            x[x > 0] = 0
-        # renormalize weights
-        x -= logsumexp(x)
-        # store tail index k
-        kss[i] = k
+            lw_out[tail_ind[:, reg[smooth]], reg[smooth]] = np.log(qq + expxcutoff[smooth])
+
+    # truncate smoothed values to the largest raw weight 0
+    np.minimum(lw_out, 0, out=lw_out)
+    # renormalize weights
+    lw_out -= logsumexp(lw_out, axis=0)
 
     return lw_out, kss
 
 
+def _psislw_column(x, cutoff_ind, cutoffmin, k_min):
+    """Smooth the right tail of one column of log weights in place and
+    return its Pareto tail index.
+    """
+    x_sort_ind = np.argsort(x)
+    xcutoff = max(x[x_sort_ind[cutoff_ind]], cutoffmin)
+
+    expxcutoff = np.exp(xcutoff)
+    tailinds, = np.where(x > xcutoff)
+    x2 = x[tailinds]
+    n2 = len(x2)
+    if n2 <= 4:
+        # not enough tail samples for gpdfit
+        return np.inf
+    # order of tail samples
+    x2si = np.argsort(x2)
+    x2 = np.exp(x2) - expxcutoff
+    k, sigma = _gpdfit(x2[x2si])
+
+    if k >= k_min and not np.isinf(k):
+        sti = np.arange(0.5, n2) / n2
+        qq = _gpinv(sti, k, sigma)
+        x[tailinds[x2si]] = np.log(qq + expxcutoff)
+    return k
+
+
+def _psislw_worker(args):
+    return _psislw(*args)
+
+
 def _gpdfit(x):
     """Estimate the parameters for the Generalized Pareto Distribution (GPD)
 
@@ -393,22 +622,25 @@ def _gpdfit(x):
     Parameters
     ----------
     x : array
-        sorted 1D data array
+        data array of shape (n,), or (n, m) for `m` independent fits, sorted
+        along the first axis
 
     Returns
     -------
-    k : float
+    k : float or array of shape (m,)
         estimated shape parameter
-    sigma : float
+    sigma : float or array of shape (m,)
         estimated scale parameter
     """
     prior_bs = 3
     prior_k = 10
     n = len(x)
     m = 30 + int(n**0.5)
+    is_1d = np.ndim(x) == 1
+    x = np.reshape(x, (n, -1))
 
     bs = 1 - np.sqrt(m / (np.arange(1, m + 1, dtype=float) - 0.5))
-    bs /= prior_bs * x[int(n/4 + 0.5) - 1]
+    bs = bs[:, None] / (prior_bs * x[int(n/4 + 0.5) - 1])
     bs += 1 / x[-1]
 
     ks = np.log1p(-bs[:, None] * x).mean(axis=1)
@@ -416,47 +648,45 @@ def _gpdfit(x):
     w = 1 / np.exp(L - L[:, None]).sum(axis=1)
 
     # remove negligible weights
-    dii = w >= 10 * np.finfo(float).eps
-    if not np.all(dii):
-        w = w[dii]
-        bs = bs[dii]
+    w[w < 10 * np.finfo(float).eps] = 0
     # normalise w
-    w /= w.sum()
+    w /= w.sum(axis=0)
 
     # posterior mean for b
-    b = np.sum(bs * w)
+    b = np.sum(bs * w, axis=0)
     # estimate for k
-    k = np.log1p(- b * x).mean()
+    k = np.log1p(- b * x).mean(axis=0)
     # add prior for k
     k = (n * k + prior_k * 0.5) / (n + prior_k)
     sigma = - k / b
 
+    if is_1d:
+        return k[0], sigma[0]
     return k, sigma
 
 
 def _gpinv(p, k, sigma):
-    """Inverse Generalized Pareto distribution function"""
-    x = np.full_like(p, np.nan)
-    if sigma <= 0:
-        return x
-    ok = (p > 0) & (p < 1)
-    if np.all(ok):
-        if np.abs(k) < np.finfo(float).eps:
-            x = - np.log1p(-p)
-        else:
-            x = np.expm1(-k * np.log1p(-p)) / k
-        x *= sigma
-    else:
-        if np.abs(k) < np.finfo(float).eps:
-            x[ok] = - np.log1p(-p[ok])
-        else:
-            x[ok] = np.expm1(-k * np.log1p(-p[ok])) / k
-        x *= sigma
-        x[p == 0] = 0
-        if k >= 0:
-            x[p == 1] = np.inf
-        else:
-            x[p == 1] = - sigma / k
+    """Inverse Generalized Pareto distribution function
+
+    `k` and `sigma` may be arrays of shape (m,), the result then has shape
+    (len(p), m).
+    """
+    p = np.asarray(p, dtype=float)
+    p = p.reshape(p.shape + (1,) * np.ndim(k))
+    p, k, sigma = np.broadcast_arrays(p, k, sigma)
+    x = np.full(p.shape, np.nan)
+    valid = sigma > 0
+    ok = valid & (p > 0) & (p < 1)
+    small_k = ok & (np.abs(k) < np.finfo(float).eps)
+    x[small_k] = - np.log1p(-p[small_k])
+    large_k = ok & ~small_k
+    x[large_k] = np.expm1(-k[large_k] * np.log1p(-p[large_k])) / k[large_k]
+    x[ok] *= sigma[ok]
+    x[valid & (p == 0)] = 0
+    upper = valid & (p == 1)
+    x[upper & (k >= 0)] = np.inf
+    upper &= k < 0
+    x[upper] = - sigma[upper] / k[upper]
 
     return x
 
@@ -682,7 +912,18 @@ def calc_min_interval(x, alpha):
 
     Assumes that x is sorted numpy array.
     """
+    hdi_min, hdi_max = _calc_min_intervals(x, alpha)
+    return hdi_min, hdi_max
+
+
+def _calc_min_intervals(x, alpha):
+    """Determine the minimum intervals of all columns of `x` at once.
+
+    Assumes that x is sorted along the first axis.
+    """
     n = len(x)
+    shape = np.shape(x)[1:]
+    x = np.reshape(x, (n, -1))
     cred_mass = 1.0 - alpha
 
     interval_idx_inc = int(np.floor(cred_mass * n))
@@ -692,10 +933,11 @@ def calc_min_interval(x, alpha):
     if len(interval_width) == 0:
         raise ValueError('Too few elements for interval calculation')
 
-    min_idx = np.argmin(interval_width)
-    hdi_min = x[min_idx]
-    hdi_max = x[min_idx + interval_idx_inc]
-    return hdi_min, hdi_max
+    min_idx = np.argmin(interval_width, axis=0)
+    columns = np.arange(x.shape[1])
+    hdi_min = x[min_idx, columns]
+    hdi_max = x[min_idx + interval_idx_inc, columns]
+    return np.stack([hdi_min, hdi_max], axis=-1).reshape(shape + (2,))
 
 
 @statfunc
@@ -718,43 +960,10 @@ def hpd(x, alpha=0.05, transform=lambda x: x):
     # Make a copy of trace
     x = transform(x.copy())
 
-    # For multivariate node
-    if x.ndim > 1:
-
-        # Transpose first, then sort
-        tx = np.transpose(x, list(range(x.ndim))[1:] + [0])
-        dims = np.shape(tx)
+    # For multivariate node, sort all elements at once along the draw axis
+    sx = np.sort(x, axis=0)
 
-        # Container list for intervals
-        intervals = np.resize(0.0, dims[:-1] + (2,))
-
-        for index in make_indices(dims[:-1]):
-
-            try:
-                index = tuple(index)
-            except TypeError:
-                pass
-
-            # Sort trace
-            sx = np.sort(tx[index])
-
-            # Append to list
-            intervals[index] = calc_min_interval(sx, alpha)
-
-        # Transpose back before returning
-        return np.array(intervals)
-
-    else:
-        # Sort univariate node
-        sx = np.sort(x)
-
-        return np.array(calc_min_interval(sx, alpha))
-
-
-def _hpd_df(x, alpha):
-    cnames = ['hpd_{0:g}'.format(100 * alpha / 2),
-              'hpd_{0:g}'.format(100 * (1 - alpha / 2))]
-    return pd.DataFrame(hpd(x, alpha), columns=cnames)
+    return _calc_min_intervals(sx, alpha)
 
 
 @statfunc
@@ -774,29 +983,17 @@ def mc_error(x, batches=5):
     -------
     `float` representing the error
     """
-    if x.ndim > 1:
+    if batches == 1:
+        return np.std(x, 0) / np.sqrt(len(x))
 
-        dims = np.shape(x)
-        #ttrace = np.transpose(np.reshape(trace, (dims[0], sum(dims[1:]))))
-        trace = np.transpose([t.ravel() for t in x])
+    # If batches do not divide evenly, trim excess samples
+    batch_size = len(x) // batches
+    batched_traces = np.reshape(x[:batches * batch_size],
+                                (batches, batch_size) + np.shape(x)[1:])
 
-        return np.reshape([mc_error(t, batches) for t in trace], dims[1:])
+    means = np.mean(batched_traces, 1)
 
-    else:
-        if batches == 1:
-            return np.std(x) / np.sqrt(len(x))
-
-        try:
-            batched_traces = np.resize(x, (batches, int(len(x) / batches)))
-        except ValueError:
-            # If batches do not divide evenly, trim excess samples
-            resid = len(x) % batches
-            new_shape = (batches, (len(x) - resid) / batches)
-            batched_traces = np.resize(x[:-resid], new_shape)
-
-        means = np.mean(batched_traces, 1)
-
-        return np.std(means) / np.sqrt(batches)
+    return np.std(means, 0) / np.sqrt(batches)
 
 
 @statfunc
@@ -852,7 +1049,7 @@ def dict2pd(statdict, labelname):
 
 def summary(trace, varnames=None, transform=lambda x: x, stat_funcs=None,
                extend=False, include_transformed=False,
-               alpha=0.05, start=0, batches=None):
+               alpha=0.05, start=0, batches=None, chunk_size=None):
     R"""Create a data frame with summary statistics.
 
     Parameters
@@ -897,6 +1094,12 @@ def summary(trace, varnames=None, transform=lambda x: x, stat_funcs=None,
         Batch size for calculating standard deviation for non-independent
         samples. Defaults to the smaller of 100 or the number of samples.
         This is only meaningful when `stat_funcs` is None.
+    chunk_size : None or int
+        Maximum number of elements of a variable (e.g., x__0, x__1,...)
+        for which the default statistics are computed at once. Only this
+        many elements are copied into memory at a time, which allows
+        summarizing traces stored on disk (e.g. with the NPY backend) that
+        do not fit in memory. Defaults to all elements of a variable.
 
     Returns
     -------
@@ -945,102 +1148,63 @@ def summary(trace, varnames=None, transform=lambda x: x, stat_funcs=None,
     if batches is None:
         batches = min([100, len(trace)])
 
-    funcs = [lambda x: pd.Series(np.mean(x, 0), name='mean'),
-             lambda x: pd.Series(np.std(x, 0), name='sd'),
-             lambda x: pd.Series(mc_error(x, batches), name='mc_error'),
-             lambda x: _hpd_df(x, alpha)]
-
-    if stat_funcs is not None:
-        if extend:
-            funcs = funcs + stat_funcs
-        else:
-            funcs = stat_funcs
-
-    var_dfs = []
+    if stat_funcs is not None and not extend:
+        var_dfs = []
+        for var in varnames:
+            vals = transform(trace.get_values(var, burn=start, combine=True))
+            flat_vals = vals.reshape(vals.shape[0], -1)
+            var_df = pd.concat([f(flat_vals) for f in stat_funcs], axis=1)
+            var_df.index = ttab.create_flat_names(var, vals.shape[1:])
+            var_dfs.append(var_df)
+        return pd.concat(var_dfs, axis=0)
+
+    stat_dfs = []
     for var in varnames:
-        vals = transform(trace.get_values(var, burn=start, combine=True))
-        flat_vals = vals.reshape(vals.shape[0], -1)
-        var_df = pd.concat([f(flat_vals) for f in funcs], axis=1)
-        var_df.index = ttab.create_flat_names(var, vals.shape[1:])
-        var_dfs.append(var_df)
-    dforg = pd.concat(var_dfs, axis=0)
-
-    if (stat_funcs is not None) and (not extend):
-        return dforg
-    elif trace.nchains < 2:
-        return dforg
-    else:
-        n_eff = pm.effective_n(trace,
-                               varnames=varnames,
-                               include_transformed=include_transformed)
-        n_eff_pd = dict2pd(n_eff, 'n_eff')
-        rhat = pm.gelman_rubin(trace,
-                               varnames=varnames,
-                               include_transformed=include_transformed)
-        rhat_pd = dict2pd(rhat, 'Rhat')
-        return pd.concat([dforg, n_eff_pd, rhat_pd],
-                         axis=1, join_axes=[dforg.index])
-
-
-def _calculate_stats(sample, batches, alpha):
-    means = sample.mean(0)
-    sds = sample.std(0)
-    mces = mc_error(sample, batches)
-    intervals = hpd(sample, alpha)
-    for key, idxs in _groupby_leading_idxs(sample.shape[1:]):
-        yield key
-        for idx in idxs:
-            mean, sd, mce = [stat[idx] for stat in (means, sds, mces)]
-            interval = intervals[idx].squeeze().tolist()
-            yield {'mean': mean, 'sd': sd, 'mce': mce, 'hpd': interval}
-
-
-def _calculate_posterior_quantiles(sample, qlist):
-    var_quantiles = quantiles(sample, qlist=qlist)
-    # Replace ends of qlist with 'lo' and 'hi'
-    qends = {qlist[0]: 'lo', qlist[-1]: 'hi'}
-    qkeys = {q: qends[q] if q in qends else 'q{}'.format(q) for q in qlist}
-    for key, idxs in _groupby_leading_idxs(sample.shape[1:]):
-        yield key
-        for idx in idxs:
-            yield {qkeys[q]: var_quantiles[q][idx] for q in qlist}
-
-
-def _groupby_leading_idxs(shape):
-    """Group the indices for `shape` by the leading indices of `shape`.
-
-    All dimensions except for the rightmost dimension are used to create
-    groups.
-
-    A 3d shape will be grouped by the indices for the two leading
-    dimensions.
-
-        >>> for key, idxs in _groupby_leading_idxs((3, 2, 2)):
-        ...     print('key: {}'.format(key))
-        ...     print(list(idxs))
-        key: (0, 0)
-        [(0, 0, 0), (0, 0, 1)]
-        key: (0, 1)
-        [(0, 1, 0), (0, 1, 1)]
-        key: (1, 0)
-        [(1, 0, 0), (1, 0, 1)]
-        key: (1, 1)
-        [(1, 1, 0), (1, 1, 1)]
-        key: (2, 0)
-        [(2, 0, 0), (2, 0, 1)]
-        key: (2, 1)
-        [(2, 1, 0), (2, 1, 1)]
-
-    A 1d shape will only have one group.
-
-        >>> for key, idxs in _groupby_leading_idxs((2,)):
-        ...     print('key: {}'.format(key))
-        ...     print(list(idxs))
-        key: ()
-        [(0,), (1,)]
+        chains = trace.get_values(var, combine=False, squeeze=False)
+        names = ttab.create_flat_names(var, chains[0].shape[1:])
+        flat_chains = [vals.reshape(vals.shape[0], -1) for vals in chains]
+        size = flat_chains[0].shape[1]
+        step = size if chunk_size is None else max(int(chunk_size), 1)
+        for lo in range(0, size, step):
+            chunk = [vals[:, lo:lo + step] for vals in flat_chains]
+            values = transform(np.concatenate([vals[start:] for vals in chunk]))
+            stat_df = _summary_stats(values, alpha, batches)
+            if extend:
+                stat_df = pd.concat([stat_df] + [f(values) for f in stat_funcs],
+                                    axis=1)
+            if trace.nchains > 1:
+                stat_df = pd.concat([stat_df, _diagnostics_df(chunk)], axis=1)
+            stat_df.index = names[lo:lo + step]
+            stat_dfs.append(stat_df)
+    return pd.concat(stat_dfs, axis=0)
+
+
+def _summary_stats(values, alpha, batches):
+    """Compute the default summary statistics for all columns of `values`
+    at once, where the rows of `values` are the samples.
+    """
+    hpd_names = ['hpd_{0:g}'.format(100 * alpha / 2),
+                 'hpd_{0:g}'.format(100 * (1 - alpha / 2))]
+    intervals = _calc_min_intervals(np.sort(values, axis=0), alpha)
+    return pd.DataFrame(collections.OrderedDict([
+        ('mean', np.mean(values, 0)),
+        ('sd', np.std(values, 0)),
+        ('mc_error', mc_error(values, batches)),
+        (hpd_names[0], intervals[:, 0]),
+        (hpd_names[1], intervals[:, 1]),
+    ]))
+
+
+def _diagnostics_df(chains):
+    """Compute n_eff and Rhat for all columns of the (draws, elements)
+    arrays in `chains` at once.
     """
-    idxs = itertools.product(*[range(s) for s in shape])
-    return itertools.groupby(idxs, lambda x: x[:-1])
+    from .diagnostics import effective_n, gelman_rubin
+    x = np.array(chains)
+    return pd.DataFrame(collections.OrderedDict([
+        ('n_eff', effective_n(x)),
+        ('Rhat', gelman_rubin(x)),
+    ]))
 
 
 def bfmi(trace):
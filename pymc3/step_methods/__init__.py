@@ -1,6 +1,6 @@
 from .compound import CompoundStep
 
-from .hmc import HamiltonianMC, NUTS
+from .hmc import HamiltonianMC, NUTS, BatchedNUTS
 
 from .metropolis import Metropolis
 from .metropolis import DEMetropolis
@@ -184,7 +184,12 @@ class PopulationArrayStepShared(ArrayStepShared):
     of other chains in the population.
 
     Works by linking a list of Points that is updated as the chains are iterated.
+
+    Step methods that set `vectorize` can also step all chains at once with
+    `astep_population`, which is used when the population is sampled in a
+    single process.
     """
+    vectorize = False
 
     def __init__(self, vars, shared, blocked=True):
         """
@@ -216,6 +221,23 @@ class PopulationArrayStepShared(ArrayStepShared):
                 'increase the number of chains.'.format(self.this_chain, self.other_chains))
         return
 
+    def astep_population(self, Q0):
+        """Steps all chains of the population at once.
+
+        Parameters
+        ----------
+        Q0 : array
+            `(nchains, ndim)` array space states of the chains
+
+        Returns
+        -------
+        Q : array
+            The new states of the chains
+        stats : list
+            The sampler stats of each chain
+        """
+        raise NotImplementedError()
+
 
 class GradientSharedStep(BlockedStep):
     def __init__(self, vars, model=None, blocked=True,
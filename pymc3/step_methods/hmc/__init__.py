@@ -1,2 +1,3 @@
 from .hmc import HamiltonianMC
 from .nuts import NUTS
+from .batched_nuts import BatchedNUTS
@@ -125,7 +125,13 @@ class BaseHMC(arraystep.GradientSharedStep):
         """Perform a single HMC iteration."""
         p0 = self.potential.random()
         start = self.integrator.compute_state(q0, p0)
+        self._check_start(start)
+        step_size = self._current_step_size()
+        hmc_step = self._hamiltonian_step(start, p0, step_size)
+        return self._finish_astep(hmc_step)
 
+    def _check_start(self, start):
+        """Raise a SamplingError if the energy of the start is not finite."""
         if not np.isfinite(start.energy):
             model = self._model
             check_test_point = model.check_test_point()
@@ -148,15 +154,19 @@ class BaseHMC(arraystep.GradientSharedStep):
             self._warnings.append(warning)
             raise SamplingError("Bad initial energy")
 
+    def _current_step_size(self):
+        """Step size for the next trajectory."""
         adapt_step = self.tune and self.adapt_step_size
         step_size = self.step_adapt.current(adapt_step)
         self.step_size = step_size
 
         if self._step_rand is not None:
             step_size = self._step_rand(step_size)
+        return step_size
 
-        hmc_step = self._hamiltonian_step(start, p0, step_size)
-
+    def _finish_astep(self, hmc_step):
+        """Adapt to a finished trajectory and return the new point and stats."""
+        adapt_step = self.tune and self.adapt_step_size
         self.step_adapt.update(hmc_step.accept_stat, adapt_step)
         self.potential.update(hmc_step.end.q, hmc_step.end.q_grad, self.tune)
         if hmc_step.divergence_info:
@@ -192,6 +202,11 @@ class BaseHMC(arraystep.GradientSharedStep):
     def reset(self, start=None):
         self.tune = True
         self.potential.reset()
+        self.step_adapt.reset_stats()
+        self.iter_count = 0
+        self._warnings = []
+        self._samples_after_tune = 0
+        self._num_divs_sample = 0
 
     def warnings(self):
         # list.copy() is not available in python2
@@ -0,0 +1,249 @@
+from copy import copy, deepcopy
+
+import numpy as np
+from scipy import linalg
+
+from .integration import CpuLeapfrogIntegrator, IntegrationError, State
+from .nuts import NUTS, _Tree, logbern
+from pymc3.theanof import floatX
+
+__all__ = ['BatchedNUTS']
+
+
+class _LogpRequest(object):
+    """A position whose logp and gradient are computed in the next batch.
+
+    The gradient is written to `grad` and the logp is stored in `logp`.
+    """
+
+    __slots__ = ('q', 'grad', 'logp')
+
+    def __init__(self, q, grad):
+        self.q = q
+        self.grad = grad
+        self.logp = None
+
+
+class _BatchedTree(_Tree):
+    """NUTS tree whose leapfrog steps are evaluated in batches of chains.
+
+    The `*_batched` methods are generator versions of the methods of
+    `_Tree`. They yield a `_LogpRequest` for every leapfrog step and expect
+    it to be evaluated before they are advanced. Instead of returning it,
+    they append their result to the list `result`.
+    """
+
+    def extend_batched(self, direction, result):
+        if direction > 0:
+            inner = self.right
+            epsilon = floatX(np.asarray(self.step_size))
+        else:
+            inner = self.left
+            epsilon = floatX(np.asarray(-self.step_size))
+
+        subtree = []
+        for request in self._build_subtree_batched(
+                inner, self.depth, epsilon, subtree):
+            yield request
+        tree, diverging, turning = subtree[0]
+        result.append(
+            self._add_subtree(direction, inner, tree, diverging, turning))
+
+    def _leapfrog_batched(self, epsilon, state, out, result):
+        integrator = self.integrator
+        try:
+            new = integrator._begin_step(epsilon, state, out=out)
+            request = _LogpRequest(new.q, new.q_grad)
+            yield request
+            result.append(integrator._finish_step(epsilon, new, request.logp))
+        except (linalg.LinAlgError, ValueError) as err:
+            error = integrator._integration_error(err)
+            if error is None:
+                raise
+            raise error
+
+    def _single_step_batched(self, left, epsilon, result):
+        out = self.pool.get()
+        step = []
+        try:
+            for request in self._leapfrog_batched(epsilon, left, out, step):
+                yield request
+        except IntegrationError as err:
+            self.pool.release(out)
+            result.append(self._diverged(left, str(err), err))
+        else:
+            result.append(self._leaf(left, step[0]))
+
+    def _build_subtree_batched(self, left, depth, epsilon, result):
+        if depth == 0:
+            for request in self._single_step_batched(left, epsilon, result):
+                yield request
+            return
+
+        subtree1 = []
+        for request in self._build_subtree_batched(
+                left, depth - 1, epsilon, subtree1):
+            yield request
+        tree1, diverging, turning = subtree1[0]
+        if diverging or turning:
+            result.append(subtree1[0])
+            return
+
+        subtree2 = []
+        for request in self._build_subtree_batched(
+                tree1.right, depth - 1, epsilon, subtree2):
+            yield request
+        tree2, diverging, turning = subtree2[0]
+        result.append(
+            self._merge_subtrees(tree1, tree2, diverging, turning))
+
+
+class BatchedNUTS(NUTS):
+    R"""No-U-Turn Sampler that advances several chains in a single process.
+
+    The positions of the chains are the rows of an `(nchains, ndim)`
+    matrix. The trees of all chains are built in lockstep: the logp and
+    gradient of all chains that still extend their tree are computed in a
+    single call of the function of `Model.batched_logp_dlogp_function` per
+    leapfrog step. Chains whose tree has terminated, because it turned or
+    diverged, are masked from the batch until the next draw.
+
+    Every chain has its own potential and step size adaptation and follows
+    the same transitions as `NUTS`. `pm.sample` draws all chains with this
+    sampler in one process if it is passed as the step method. It has to
+    sample all free variables of the model.
+
+    Parameters
+    ----------
+    vars : list of Theano variables, default all continuous vars
+    kwargs: passed to NUTS
+    """
+
+    name = 'batched_nuts'
+
+    def __init__(self, vars=None, **kwargs):
+        super(BatchedNUTS, self).__init__(vars, **kwargs)
+
+        missing = [var.name for var in self._model.vars if var not in self.vars]
+        if missing:
+            raise ValueError('BatchedNUTS has to sample all free variables, '
+                             'but not %s.' % ', '.join(missing))
+
+        self._batched_logp_dlogp = self._model.batched_logp_dlogp_function(
+            self.vars, dtype=self._logp_dlogp_func.dtype)
+        self._batched_logp_dlogp.set_extra_values({})
+        self._chains = []
+
+    def _new_chain(self):
+        """Copy of the sampler with its own potential and adaptation."""
+        chain = copy(self)
+        chain.potential = deepcopy(self.potential)
+        chain.integrator = CpuLeapfrogIntegrator(
+            chain.potential, self._logp_dlogp_func)
+        chain.step_adapt = deepcopy(self.step_adapt)
+        chain._warnings = []
+        chain._chains = []
+        return chain
+
+    def init_chains(self, nchains):
+        """Start `nchains` chains with the initial potential and step size."""
+        self._chains = [self._new_chain() for _ in range(nchains)]
+
+    def chain_warnings(self, chain):
+        """The warnings of chain number `chain`."""
+        return self._chains[chain].warnings()
+
+    def step_chains(self, points):
+        """Perform a NUTS iteration for each chain.
+
+        Parameters
+        ----------
+        points : list of dicts
+            The current points of the chains
+
+        Returns
+        -------
+        The new points and a list with the sampler stats of each chain
+        """
+        func = self._logp_dlogp_func
+        q0 = np.array([func.dict_to_array(point) for point in points])
+        q, stats = self.astep_chains(q0)
+        return [func.array_to_full_dict(row) for row in q], stats
+
+    def astep_chains(self, q0):
+        """Perform a NUTS iteration for each row of the `(nchains, ndim)`
+        array `q0`.
+
+        Returns the new positions as an `(nchains, ndim)` array and a list
+        with the sampler stats of each chain.
+        """
+        nchains = len(q0)
+        if len(self._chains) != nchains:
+            self.init_chains(nchains)
+
+        results = [[] for _ in range(nchains)]
+        transitions = []
+        for chain, q, result in zip(self._chains, q0, results):
+            chain.tune = self.tune
+            transitions.append(chain._astep_batched(q, result))
+
+        requests = {}
+
+        def advance(c):
+            try:
+                requests[c] = next(transitions[c])
+            except StopIteration:
+                del requests[c]
+
+        for c in range(nchains):
+            requests[c] = None
+            advance(c)
+
+        while requests:
+            active = sorted(requests)
+            batch = np.array([requests[c].q for c in active])
+            logp, dlogp = self._batched_logp_dlogp(batch)
+            for i, c in enumerate(active):
+                request = requests[c]
+                request.logp = logp[i]
+                request.grad[:] = dlogp[i]
+                advance(c)
+
+        q = np.empty_like(q0)
+        stats = []
+        for c, result in enumerate(results):
+            q[c], chain_stats = result[0]
+            stats.append(chain_stats)
+        return q, stats
+
+    def _astep_batched(self, q0, result):
+        """Generator version of `astep` for `astep_chains`."""
+        p0 = self.potential.random()
+        request = _LogpRequest(q0, np.empty_like(q0))
+        yield request
+
+        logp = request.logp
+        v = self.potential.velocity(p0)
+        kinetic = self.potential.energy(p0, velocity=v)
+        start = State(q0, p0, v, request.grad, kinetic - logp, logp)
+
+        self._check_start(start)
+        step_size = self._current_step_size()
+        tree = _BatchedTree(len(p0), self.integrator, start, step_size,
+                            self.Emax)
+
+        for _ in range(self._current_max_treedepth()):
+            direction = logbern(np.log(0.5)) * 2 - 1
+            extended = []
+            for request in tree.extend_batched(direction, extended):
+                yield request
+            divergence_info, turning = extended[0]
+
+            if divergence_info or turning:
+                break
+        else:
+            if not self.tune:
+                self._reached_max_treedepth += 1
+
+        hmc_step = self._tree_step_data(tree, divergence_info)
+        result.append(self._finish_astep(hmc_step))
@@ -95,10 +95,16 @@ class HamiltonianMC(BaseHMC):
         energy_change = -np.inf
         state = start
         div_info = None
+        pool = self.integrator.pool
+        pool.reset()
         try:
             for _ in range(n_steps):
-                state = self.integrator.step(step_size, state)
+                out = pool.get()
+                new_state = self.integrator.step(step_size, state, out=out)
+                pool.release(state)
+                state = new_state
         except IntegrationError as e:
+            pool.release(out)
             div_info = DivergenceInfo('Divergence encountered.', e, state)
         else:
             if not np.isfinite(state.energy):
@@ -116,7 +122,8 @@ class HamiltonianMC(BaseHMC):
             end = start
             accepted = False
         else:
-            end = state
+            # the buffers of the state are recycled in the next trajectory
+            end = state._replace(q=state.q.copy())
             accepted = True
 
         stats = {
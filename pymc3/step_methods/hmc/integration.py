@@ -11,6 +11,69 @@ class IntegrationError(RuntimeError):
     pass
 
 
+class StatePool(object):
+    """Preallocated buffers for the States of a trajectory.
+
+    States from `get` are passed as `out` to `CpuLeapfrogIntegrator.step`,
+    and vectors from `get_vector` hold momentum sums. `release` and
+    `release_vector` recycle buffers that are no longer used, `reset`
+    recycles all of them at the start of a new trajectory. Buffers that do
+    not belong to the pool are ignored on release. Ownership is tracked by
+    `id`, so a pickled pool starts without buffers.
+    """
+
+    def __init__(self, ndim, dtype):
+        self.ndim = ndim
+        self.dtype = dtype
+        self._clear()
+
+    def _clear(self):
+        self._states = []
+        self._free_states = []
+        self._vectors = []
+        self._free_vectors = []
+        self._owned = set()
+
+    def __getstate__(self):
+        return {'ndim': self.ndim, 'dtype': self.dtype}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._clear()
+
+    def _empty(self):
+        array = np.empty(self.ndim, dtype=self.dtype)
+        self._owned.add(id(array))
+        return array
+
+    def get(self):
+        if self._free_states:
+            return self._free_states.pop()
+        state = State(self._empty(), self._empty(), self._empty(), self._empty(),
+                      None, None)
+        self._states.append(state)
+        return state
+
+    def release(self, state):
+        if state is not None and id(state.q) in self._owned:
+            self._free_states.append(state)
+
+    def get_vector(self):
+        if self._free_vectors:
+            return self._free_vectors.pop()
+        vector = self._empty()
+        self._vectors.append(vector)
+        return vector
+
+    def release_vector(self, vector):
+        if vector is not None and id(vector) in self._owned:
+            self._free_vectors.append(vector)
+
+    def reset(self):
+        self._free_states = list(self._states)
+        self._free_vectors = list(self._vectors)
+
+
 class CpuLeapfrogIntegrator(object):
     def __init__(self, potential, logp_dlogp_func):
         """Leapfrog integrator using CPU."""
@@ -21,6 +84,8 @@ class CpuLeapfrogIntegrator(object):
             raise ValueError("dtypes of potential (%s) and logp function (%s)"
                              "don't match."
                              % (self._potential.dtype, self._dtype))
+        self._axpy = linalg.blas.get_blas_funcs('axpy', dtype=self._dtype)
+        self.pool = StatePool(self._logp_dlogp_func.size, self._dtype)
 
     def compute_state(self, q, p):
         """Compute Hamiltonian functions using a position and momentum."""
@@ -44,29 +109,49 @@ class CpuLeapfrogIntegrator(object):
         state: State namedtuple,
             current position data
         out: (optional) State namedtuple,
-            preallocated arrays to write to in place
+            preallocated arrays to write to in place, e.g. from `self.pool`
 
         Returns
         -------
-        None if `out` is provided, else a State namedtuple
+        A State namedtuple, using the arrays of `out` if it is provided
         """
         try:
-            return self._step(epsilon, state, out=None)
-        except linalg.LinAlgError as err:
-            msg = "LinAlgError during leapfrog step."
-            raise IntegrationError(msg)
-        except ValueError as err:
-            # Raised by many scipy.linalg functions
-            scipy_msg = "array must not contain infs or nans"
-            if len(err.args) > 0 and scipy_msg in err.args[0].lower():
-                msg = "Infs or nans in scipy.linalg during leapfrog step."
-                raise IntegrationError(msg)
-            else:
+            return self._step(epsilon, state, out=out)
+        except (linalg.LinAlgError, ValueError) as err:
+            error = self._integration_error(err)
+            if error is None:
                 raise
+            raise error
+
+    @staticmethod
+    def _integration_error(err):
+        """Translate an error of a leapfrog step to an `IntegrationError`.
+
+        Returns None for errors that are not caused by the integration.
+        """
+        if isinstance(err, linalg.LinAlgError):
+            return IntegrationError("LinAlgError during leapfrog step.")
+        # Raised by many scipy.linalg functions
+        scipy_msg = "array must not contain infs or nans"
+        if len(err.args) > 0 and scipy_msg in err.args[0].lower():
+            return IntegrationError(
+                "Infs or nans in scipy.linalg during leapfrog step.")
+        return None
 
     def _step(self, epsilon, state, out=None):
+        new = self._begin_step(epsilon, state, out=out)
+        logp = self._logp_dlogp_func(new.q, new.q_grad)
+        return self._finish_step(epsilon, new, logp)
+
+    def _begin_step(self, epsilon, state, out=None):
+        """Update the momentum by half a step and the position by a full step.
+
+        Returns a State with the arrays of the new state. Its energy and
+        logp are None, the gradient at the new position has to be written
+        to its `q_grad` before the step is finished with `_finish_step`.
+        """
         pot = self._potential
-        axpy = linalg.blas.get_blas_funcs('axpy', dtype=self._dtype)
+        axpy = self._axpy
 
         q, p, v, q_grad, energy, logp = state
         if out is None:
@@ -75,9 +160,9 @@ class CpuLeapfrogIntegrator(object):
             v_new = np.empty_like(q)
             q_new_grad = np.empty_like(q)
         else:
-            q_new, p_new, v_new, q_new_grad, energy = out
-            q_new[:] = q
-            p_new[:] = p
+            q_new, p_new, v_new, q_new_grad = out.q, out.p, out.v, out.q_grad
+            np.copyto(q_new, q)
+            np.copyto(p_new, p)
 
         dt = 0.5 * epsilon
 
@@ -90,16 +175,16 @@ class CpuLeapfrogIntegrator(object):
         # q_new = q + epsilon * v_new
         axpy(v_new, q_new, a=epsilon)
 
-        logp = self._logp_dlogp_func(q_new, q_new_grad)
+        return State(q_new, p_new, v_new, q_new_grad, None, None)
+
+    def _finish_step(self, epsilon, new, logp):
+        """Finish a step of `_begin_step` given the logp at the new position."""
+        dt = 0.5 * epsilon
 
         # p_new = p_new + dt * q_new_grad
-        axpy(q_new_grad, p_new, a=dt)
+        self._axpy(new.q_grad, new.p, a=dt)
 
-        kinetic = pot.velocity_energy(p_new, v_new)
+        kinetic = self._potential.velocity_energy(new.p, new.v)
         energy = kinetic - logp
 
-        if out is not None:
-            out.energy = energy
-            return
-        else:
-            return State(q_new, p_new, v_new, q_new_grad, energy, logp)
+        return new._replace(energy=energy, model_logp=logp)
@@ -157,15 +157,19 @@ class NUTS(BaseHMC):
         self.early_max_treedepth = early_max_treedepth
         self._reached_max_treedepth = 0
 
-    def _hamiltonian_step(self, start, p0, step_size):
+    def reset(self, start=None):
+        super(NUTS, self).reset(start)
+        self._reached_max_treedepth = 0
+
+    def _current_max_treedepth(self):
         if self.tune and self.iter_count < 200:
-            max_treedepth = self.early_max_treedepth
-        else:
-            max_treedepth = self.max_treedepth
+            return self.early_max_treedepth
+        return self.max_treedepth
 
+    def _hamiltonian_step(self, start, p0, step_size):
         tree = _Tree(len(p0), self.integrator, start, step_size, self.Emax)
 
-        for _ in range(max_treedepth):
+        for _ in range(self._current_max_treedepth()):
             direction = logbern(np.log(0.5)) * 2 - 1
             divergence_info, turning = tree.extend(direction)
 
@@ -175,9 +179,14 @@ class NUTS(BaseHMC):
             if not self.tune:
                 self._reached_max_treedepth += 1
 
+        return self._tree_step_data(tree, divergence_info)
+
+    def _tree_step_data(self, tree, divergence_info):
         stats = tree.stats()
         accept_stat = stats['mean_tree_accept']
-        return HMCStepData(tree.proposal, accept_stat, divergence_info, stats)
+        # the buffers of the proposal are recycled in the next trajectory
+        proposal = tree.proposal._replace(q=tree.proposal.q.copy(), state=None)
+        return HMCStepData(proposal, accept_stat, divergence_info, stats)
 
     @staticmethod
     def competence(var, has_grad):
@@ -200,8 +209,8 @@ class NUTS(BaseHMC):
         return warnings
 
 
-# A proposal for the next position
-Proposal = namedtuple("Proposal", "q, q_grad, energy, p_accept, logp")
+# A proposal for the next position, and the State it was taken from
+Proposal = namedtuple("Proposal", "q, q_grad, energy, p_accept, logp, state")
 
 # A subtree of the binary tree built by nuts.
 Subtree = namedtuple(
@@ -224,9 +233,15 @@ class _Tree(object):
         Emax : float
             The maximum energy change to accept before aborting the
             transition as diverging.
+
+        The States of the leapfrog steps are written to buffers of
+        `integrator.pool`. Buffers of states that are neither an end of a
+        subtree nor its proposal are recycled while the tree is built.
         """
         self.ndim = ndim
         self.integrator = integrator
+        self.pool = integrator.pool
+        self.pool.reset()
         self.start = start
         self.step_size = step_size
         self.Emax = Emax
@@ -234,14 +249,23 @@ class _Tree(object):
 
         self.left = self.right = start
         self.proposal = Proposal(
-            start.q, start.q_grad, start.energy, 1.0, start.model_logp)
+            start.q, start.q_grad, start.energy, 1.0, start.model_logp, start)
         self.depth = 0
         self.log_size = 0
         self.accept_sum = 0
         self.n_proposals = 0
-        self.p_sum = start.p.copy()
+        self.p_sum = self.pool.get_vector()
+        np.copyto(self.p_sum, start.p)
         self.max_energy_change = 0
 
+    def _release(self, states, keep):
+        """Recycle the buffers of `states` that are not in `keep`."""
+        released = set(id(state) for state in keep)
+        for state in states:
+            if state is not None and id(state) not in released:
+                released.add(id(state))
+                self.pool.release(state)
+
     def extend(self, direction):
         """Double the treesize by extending the tree in the given direction.
 
@@ -255,12 +279,20 @@ class _Tree(object):
         was reached (the trajectory is turning back).
         """
         if direction > 0:
+            inner = self.right
             tree, diverging, turning = self._build_subtree(
                 self.right, self.depth, floatX(np.asarray(self.step_size)))
-            self.right = tree.right
         else:
+            inner = self.left
             tree, diverging, turning = self._build_subtree(
                 self.left, self.depth, floatX(np.asarray(-self.step_size)))
+        return self._add_subtree(direction, inner, tree, diverging, turning)
+
+    def _add_subtree(self, direction, inner, tree, diverging, turning):
+        """Join the tree with a subtree that was built from its end `inner`."""
+        if direction > 0:
+            self.right = tree.right
+        else:
             self.left = tree.right
 
         self.depth += 1
@@ -271,11 +303,17 @@ class _Tree(object):
             return diverging, turning
 
         size1, size2 = self.log_size, tree.log_size
+        rejected = tree.proposal
         if logbern(size2 - size1):
+            rejected = self.proposal
             self.proposal = tree.proposal
 
         self.log_size = np.logaddexp(self.log_size, tree.log_size)
         self.p_sum[:] += tree.p_sum
+        if tree.n_proposals > 1:
+            self.pool.release_vector(tree.p_sum)
+        self._release([inner, tree.left, rejected.state],
+                      [self.left, self.right, self.start, self.proposal.state])
 
         left, right = self.left, self.right
         p_sum = self.p_sum
@@ -285,30 +323,39 @@ class _Tree(object):
 
     def _single_step(self, left, epsilon):
         """Perform a leapfrog step and handle error cases."""
+        out = self.pool.get()
         try:
-            right = self.integrator.step(epsilon, left)
+            right = self.integrator.step(epsilon, left, out=out)
         except IntegrationError as err:
-            error_msg = str(err)
-            error = err
-        else:
-            energy_change = right.energy - self.start_energy
-            if np.isnan(energy_change):
-                energy_change = np.inf
-
-            if np.abs(energy_change) > np.abs(self.max_energy_change):
-                self.max_energy_change = energy_change
-            if np.abs(energy_change) < self.Emax:
-                p_accept = min(1, np.exp(-energy_change))
-                log_size = -energy_change
-                proposal = Proposal(
-                    right.q, right.q_grad, right.energy, p_accept, right.model_logp)
-                tree = Subtree(right, right, right.p,
-                               proposal, log_size, p_accept, 1)
-                return tree, None, False
-            else:
-                error_msg = ("Energy change in leapfrog step is too large: %s."
-                             % energy_change)
-                error = None
+            self.pool.release(out)
+            return self._diverged(left, str(err), err)
+        return self._leaf(left, right)
+
+    def _leaf(self, left, right):
+        """Subtree of the single leapfrog step from `left` to `right`."""
+        energy_change = right.energy - self.start_energy
+        if np.isnan(energy_change):
+            energy_change = np.inf
+
+        if np.abs(energy_change) > np.abs(self.max_energy_change):
+            self.max_energy_change = energy_change
+        if np.abs(energy_change) < self.Emax:
+            p_accept = min(1, np.exp(-energy_change))
+            log_size = -energy_change
+            proposal = Proposal(
+                right.q, right.q_grad, right.energy, p_accept, right.model_logp,
+                right)
+            tree = Subtree(right, right, right.p,
+                           proposal, log_size, p_accept, 1)
+            return tree, None, False
+
+        self.pool.release(right)
+        error_msg = ("Energy change in leapfrog step is too large: %s."
+                     % energy_change)
+        return self._diverged(left, error_msg, None)
+
+    def _diverged(self, left, error_msg, error):
+        """Empty subtree of a leapfrog step from `left` that diverged."""
         tree = Subtree(None, None, None, None, -np.inf, 0, 1)
         divergance_info = DivergenceInfo(error_msg, error, left)
         return tree, divergance_info, False
@@ -324,18 +371,31 @@ class _Tree(object):
 
         tree2, diverging, turning = self._build_subtree(
             tree1.right, depth - 1, epsilon)
+        return self._merge_subtrees(tree1, tree2, diverging, turning)
 
+    def _merge_subtrees(self, tree1, tree2, diverging, turning):
+        """Join two adjacent subtrees of the same depth."""
         left, right = tree1.left, tree2.right
 
         if not (diverging or turning):
-            p_sum = tree1.p_sum + tree2.p_sum
+            # sum the momenta in place, single steps have no p_sum buffer
+            if tree1.n_proposals > 1:
+                p_sum = tree1.p_sum
+                p_sum += tree2.p_sum
+            else:
+                p_sum = self.pool.get_vector()
+                np.add(tree1.p_sum, tree2.p_sum, out=p_sum)
+            if tree2.n_proposals > 1:
+                self.pool.release_vector(tree2.p_sum)
             turning = (p_sum.dot(left.v) <= 0) or (p_sum.dot(right.v) <= 0)
 
             log_size = np.logaddexp(tree1.log_size, tree2.log_size)
             if logbern(tree2.log_size - log_size):
-                proposal = tree2.proposal
+                proposal, rejected = tree2.proposal, tree1.proposal
             else:
-                proposal = tree1.proposal
+                proposal, rejected = tree1.proposal, tree2.proposal
+            self._release([tree1.right, tree2.left, rejected.state],
+                          [left, right, proposal.state])
         else:
             p_sum = tree1.p_sum
             log_size = tree1.log_size
@@ -8,7 +8,8 @@ from pymc3.theanof import floatX
 
 
 __all__ = ['quad_potential', 'QuadPotentialDiag', 'QuadPotentialFull',
-           'QuadPotentialFullInv', 'QuadPotentialDiagAdapt', 'isquadpotential']
+           'QuadPotentialFullInv', 'QuadPotentialDiagAdapt', 'QuadPotentialFullAdapt',
+           'QuadPotentialLowRankAdapt', 'isquadpotential']
 
 
 def quad_potential(C, is_cov):
@@ -329,7 +330,7 @@ class _WeightedVariance(object):
             return (self.raw_var / self.w_sum).astype(self._dtype)
 
     def current_mean(self):
-        return self.mean.copy(dtype=self._dtype)
+        return np.array(self.mean, dtype=self._dtype)
 
 
 class QuadPotentialDiag(QuadPotential):
@@ -456,6 +457,233 @@ class QuadPotentialFull(QuadPotential):
     __call__ = random
 
 
+def _regularize(n_samples, cov):
+    """Shrink an estimated covariance matrix (or vector of variances) towards
+    a small multiple of the identity, more so if it was estimated from few
+    samples."""
+    cov = (n_samples / (n_samples + 5.)) * cov
+    if cov.ndim == 2:
+        cov[np.diag_indices_from(cov)] += 1e-3 * (5. / (n_samples + 5.))
+    else:
+        cov += 1e-3 * (5. / (n_samples + 5.))
+    return cov
+
+
+class _WeightedCovariance(object):
+    """Online algorithm for computing mean and covariance."""
+
+    def __init__(self, nelem, initial_mean=None, initial_covariance=None,
+                 initial_weight=0, dtype='d'):
+        self._dtype = dtype
+        self.w_sum = float(initial_weight)
+        if initial_mean is None:
+            self.mean = np.zeros(nelem, dtype='d')
+        else:
+            self.mean = np.array(initial_mean, dtype='d', copy=True)
+        if initial_covariance is None:
+            self.raw_cov = np.zeros((nelem, nelem), dtype='d')
+        else:
+            self.raw_cov = np.array(initial_covariance, dtype='d', copy=True)
+
+        self.raw_cov[:] *= self.w_sum
+
+        if self.raw_cov.shape != (nelem, nelem):
+            raise ValueError('Invalid shape for initial covariance.')
+        if self.mean.shape != (nelem,):
+            raise ValueError('Invalid shape for initial mean.')
+
+    def add_sample(self, x, weight):
+        x = np.asarray(x)
+        self.w_sum += weight
+        prop = weight / self.w_sum
+        old_diff = x - self.mean
+        self.mean[:] += prop * old_diff
+        new_diff = x - self.mean
+        self.raw_cov[:] += weight * np.outer(old_diff, new_diff)
+
+    def current_covariance(self, out=None):
+        if self.w_sum == 0:
+            raise ValueError('Can not compute covariance without samples.')
+        if out is not None:
+            return np.divide(self.raw_cov, self.w_sum, out=out)
+        else:
+            return (self.raw_cov / self.w_sum).astype(self._dtype)
+
+    def current_mean(self):
+        return np.array(self.mean, dtype=self._dtype)
+
+
+class QuadPotentialFullAdapt(QuadPotentialFull):
+    """Adapt a dense mass matrix from the sample covariances.
+
+    The covariance is estimated over the same foreground and background
+    windows as in :class:`QuadPotentialDiagAdapt`. It is regularized towards
+    the identity and factorized again only at the end of each window.
+    """
+
+    def __init__(self, n, initial_mean, initial_cov=None, initial_weight=0,
+                 adaptation_window=101, dtype=None):
+        """Set up a dense mass matrix."""
+        if initial_cov is not None and initial_cov.ndim != 2:
+            raise ValueError('Initial covariance must be two-dimensional.')
+        if initial_mean.ndim != 1:
+            raise ValueError('Initial mean must be one-dimensional.')
+        if initial_cov is not None and initial_cov.shape != (n, n):
+            raise ValueError('Wrong shape for initial_cov: expected %s got %s'
+                             % (n, initial_cov.shape))
+        if len(initial_mean) != n:
+            raise ValueError('Wrong shape for initial_mean: expected %s got %s'
+                             % (n, len(initial_mean)))
+
+        if dtype is None:
+            dtype = theano.config.floatX
+
+        if initial_cov is None:
+            initial_cov = np.eye(n, dtype=dtype)
+            initial_weight = 1
+
+        self.dtype = dtype
+        self._n = n
+        self._foreground_cov = _WeightedCovariance(
+            self._n, initial_mean, initial_cov, initial_weight, self.dtype)
+        self._background_cov = _WeightedCovariance(self._n, dtype=self.dtype)
+        self._n_samples = 0
+        self.adaptation_window = adaptation_window
+        self._update(initial_cov)
+
+    def _update(self, cov):
+        self.A = np.array(cov, dtype=self.dtype)
+        self.L = scipy.linalg.cholesky(cov, lower=True)
+
+    def _update_from_weightcov(self, weightcov):
+        cov = weightcov.current_covariance()
+        self._update(_regularize(weightcov.w_sum, cov))
+
+    def update(self, sample, grad, tune):
+        """Inform the potential about a new sample during tuning."""
+        if not tune:
+            return
+
+        self._foreground_cov.add_sample(sample, weight=1)
+        self._background_cov.add_sample(sample, weight=1)
+        self._n_samples += 1
+
+        if self._n_samples % self.adaptation_window == 0:
+            self._update_from_weightcov(self._foreground_cov)
+            self._foreground_cov = self._background_cov
+            self._background_cov = _WeightedCovariance(self._n, dtype=self.dtype)
+
+    def raise_ok(self, vmap):
+        """Check if the mass matrix is ok, and raise ValueError if not."""
+        diag = np.diag(self.A)
+        if np.any(diag <= 0) or np.any(~np.isfinite(diag)):
+            raise ValueError('Mass matrix contains zeros or non-finite values '
+                             'on the diagonal.')
+
+
+class QuadPotentialLowRankAdapt(QuadPotential):
+    """Adapt a diagonal plus low rank mass matrix for high dimensional models.
+
+    The covariance is approximated as `S^(1/2) (I + U (diag(lam) - 1) U^T) S^(1/2)`,
+    where `S` holds the sample variances and `U`, `lam` are the `rank` leading
+    eigenpairs (largest `|log(lam)|`) of the sample correlations of the
+    draws in the foreground window. They are computed from the SVD of the
+    draws without forming a dense matrix, and all operations of the
+    potential cost `O(n * rank)`.
+    """
+
+    def __init__(self, n, initial_mean, initial_diag=None, rank=10,
+                 adaptation_window=101, dtype=None):
+        """Set up a diagonal plus low rank mass matrix."""
+        if initial_diag is not None and initial_diag.ndim != 1:
+            raise ValueError('Initial diagonal must be one-dimensional.')
+        if initial_mean.ndim != 1:
+            raise ValueError('Initial mean must be one-dimensional.')
+        if initial_diag is not None and len(initial_diag) != n:
+            raise ValueError('Wrong shape for initial_diag: expected %s got %s'
+                             % (n, len(initial_diag)))
+        if len(initial_mean) != n:
+            raise ValueError('Wrong shape for initial_mean: expected %s got %s'
+                             % (n, len(initial_mean)))
+
+        if dtype is None:
+            dtype = theano.config.floatX
+
+        if initial_diag is None:
+            initial_diag = np.ones(n, dtype=dtype)
+
+        self.dtype = dtype
+        self._n = n
+        self.rank = rank
+        self._stds = np.sqrt(initial_diag).astype(dtype)
+        self._inv_stds = floatX(1.) / self._stds
+        self._U = np.zeros((n, 0), dtype=dtype)
+        self._lam = np.zeros(0, dtype=dtype)
+        self._foreground = []
+        self._background = []
+        self._n_samples = 0
+        self.adaptation_window = adaptation_window
+
+    def velocity(self, x, out=None):
+        """Compute the current velocity at a position in parameter space."""
+        xs = self._stds * x
+        v = xs + self._U.dot((self._lam - 1) * self._U.T.dot(xs))
+        return np.multiply(self._stds, v, out=out)
+
+    def energy(self, x, velocity=None):
+        """Compute kinetic energy at a position in parameter space."""
+        if velocity is None:
+            velocity = self.velocity(x)
+        return 0.5 * x.dot(velocity)
+
+    def velocity_energy(self, x, v_out):
+        """Compute velocity and return kinetic energy at a position in parameter space."""
+        self.velocity(x, out=v_out)
+        return 0.5 * np.dot(x, v_out)
+
+    def random(self):
+        """Draw random value from QuadPotential."""
+        z = normal(size=self._n).astype(self.dtype)
+        p = z + self._U.dot((self._lam ** -0.5 - 1) * self._U.T.dot(z))
+        return self._inv_stds * p
+
+    def _update_from_samples(self, samples):
+        samples = np.asarray(samples)
+        m = len(samples)
+        var = _regularize(m, samples.var(axis=0))
+        stds = np.sqrt(var)
+        z = (samples - samples.mean(axis=0)) / (stds * np.sqrt(m))
+        _, svals, vt = np.linalg.svd(z, full_matrices=False)
+        # shrink the eigenvalues towards one
+        lam = (m * svals ** 2 + 5.) / (m + 5.)
+        keep = np.argsort(-np.abs(np.log(lam)))[:self.rank]
+
+        self._stds = stds.astype(self.dtype)
+        self._inv_stds = floatX(1.) / self._stds
+        self._U = vt[keep].T.astype(self.dtype)
+        self._lam = lam[keep].astype(self.dtype)
+
+    def update(self, sample, grad, tune):
+        """Inform the potential about a new sample during tuning."""
+        if not tune:
+            return
+
+        self._foreground.append(np.array(sample, dtype='d'))
+        self._background.append(self._foreground[-1])
+        self._n_samples += 1
+
+        if self._n_samples % self.adaptation_window == 0:
+            self._update_from_samples(self._foreground)
+            self._foreground = self._background
+            self._background = []
+
+    def raise_ok(self, vmap):
+        """Check if the mass matrix is ok, and raise ValueError if not."""
+        if np.any(self._stds == 0) or np.any(~np.isfinite(self._stds)):
+            raise ValueError('Mass matrix contains zeros or non-finite values '
+                             'on the diagonal.')
+
+
 try:
     import sksparse.cholmod as cholmod
     chol_available = True
@@ -1,7 +1,9 @@
 import numpy as np
 import numpy.random as nr
 import theano
+import theano.tensor as tt
 import scipy.linalg
+import scipy.stats
 import warnings
 
 from ..distributions import draw_values
@@ -63,6 +65,11 @@ class MultivariateNormalProposal(Proposal):
             b = np.random.randn(self.n)
             return np.dot(self.chol, b)
 
+    def logp(self, s, value):
+        """Log-density at `value` of a zero-mean normal with covariance `s`."""
+        return scipy.stats.multivariate_normal(
+            np.zeros(s.shape[0]), cov=s).logpdf(value)
+
 
 class Metropolis(ArrayStepShared):
     """
@@ -517,6 +524,10 @@ class DEMetropolis(PopulationArrayStepShared):
         Optional model for sampling step. Defaults to None (taken from context).
     mode :  string or `Mode` instance.
         compilation mode passed to Theano functions
+    vectorize : bool
+        Step all chains of the population at once when sampling in a single
+        process, evaluating the logp of all proposals with one compiled
+        function. Defaults to True.
 
     References
     ----------
@@ -536,7 +547,8 @@ class DEMetropolis(PopulationArrayStepShared):
     }]
 
     def __init__(self, vars=None, S=None, proposal_dist=None, lamb=None, scaling=0.001,
-                 tune=True, tune_interval=100, model=None, mode=None, **kwargs):
+                 tune=True, tune_interval=100, model=None, mode=None, vectorize=True,
+                 **kwargs):
         warnings.warn('Population based sampling methods such as DEMetropolis are experimental.' \
             ' Use carefully and be extra critical about their results!')
 
@@ -567,6 +579,14 @@ class DEMetropolis(PopulationArrayStepShared):
 
         shared = pm.make_shared_replacements(vars, model)
         self.delta_logp = delta_logp(model.logpt, vars, shared)
+        self.vectorize = vectorize
+        # compiled on the first vectorized step, it is not needed when the
+        # chains are stepped one at a time
+        self._logpt = model.logpt
+        self._shared_replacements = shared
+        self._population_logp = None
+        # logp of the population after the last vectorized step
+        self._population_state = None
         super(DEMetropolis, self).__init__(vars, shared)
 
     def astep(self, q0):
@@ -601,6 +621,61 @@ class DEMetropolis(PopulationArrayStepShared):
 
         return q_new, [stats]
 
+    @property
+    def population_logp(self):
+        if self._population_logp is None:
+            self._population_logp = population_logp(
+                self._logpt, self.vars, self._shared_replacements)
+        return self._population_logp
+
+    def astep_population(self, Q0):
+        Q0 = floatX(Q0)
+        nchains = len(Q0)
+        if self._population_state is None:
+            # per chain tuning, as if each chain had its own copy of the step
+            self._population_state = {
+                'scaling': np.tile(self.scaling, (nchains, 1)),
+                'accepted': np.zeros(nchains),
+                'steps_until_tune': self.tune_interval,
+                'q': None,
+                'logp': None,
+            }
+        state = self._population_state
+        if not state['steps_until_tune'] and self.tune:
+            for c in range(nchains):
+                state['scaling'][c] = tune(
+                    state['scaling'][c], state['accepted'][c] / float(self.tune_interval))
+            state['steps_until_tune'] = self.tune_interval
+            state['accepted'][:] = 0
+
+        if state['q'] is not None and np.array_equal(state['q'], Q0):
+            logp0 = state['logp']
+        else:
+            logp0 = self.population_logp(Q0)
+
+        epsilon = np.array([self.proposal_dist() for _ in range(nchains)]) * state['scaling']
+
+        # differential evolution proposals for all chains at once
+        ir1, ir2 = de_pairs(nchains)
+        Q = floatX(Q0 + self.lamb * (Q0[ir1] - Q0[ir2]) + epsilon)
+
+        logp = self.population_logp(Q)
+        accept = logp - logp0
+        with np.errstate(invalid='ignore'):
+            accepted = np.isfinite(accept) & (np.log(nr.uniform(size=nchains)) < accept)
+        Q_new = np.where(accepted[:, None], Q, Q0)
+        state['q'] = Q_new
+        state['logp'] = np.where(accepted, logp, logp0)
+        state['accepted'] += accepted
+        state['steps_until_tune'] -= 1
+
+        stats = [[{
+            'tune': self.tune,
+            'accept': np.exp(accept[c]),
+        }] for c in range(nchains)]
+
+        return Q_new, stats
+
     @staticmethod
     def competence(var, has_grad):
         if var.dtype in pm.discrete_types:
@@ -608,6 +683,25 @@ class DEMetropolis(PopulationArrayStepShared):
         return Competence.COMPATIBLE
 
 
+def de_pairs(nchains):
+    """Draw two distinct other chains for every chain of a population.
+
+    Returns
+    -------
+    ir1, ir2 : arrays of chain indices, with `ir1[c]`, `ir2[c]` and `c`
+        all different
+    """
+    chains = np.arange(nchains)
+    ir1 = nr.randint(nchains - 1, size=nchains)
+    ir1 += ir1 >= chains
+    lo = np.minimum(chains, ir1)
+    hi = np.maximum(chains, ir1)
+    ir2 = nr.randint(nchains - 2, size=nchains)
+    ir2 += ir2 >= lo
+    ir2 += ir2 >= hi
+    return ir1, ir2
+
+
 def sample_except(limit, excluded):
     candidate = nr.choice(limit - 1)
     if candidate >= excluded:
@@ -631,3 +725,17 @@ def delta_logp(logp, vars, shared):
     f = theano.function([inarray1, inarray0], logp1 - logp0)
     f.trust_input = True
     return f
+
+
+@theano.configparser.change_flags(compute_test_value='ignore')
+def population_logp(logp, vars, shared):
+    """Compile the logp of all rows of an `(nchains, ndim)` matrix of
+    array space points into one function."""
+    [logp0], inarray0 = pm.join_nonshared_inputs([logp], vars, shared)
+
+    inmatrix = tt.matrix('inmatrix', dtype=inarray0.dtype)
+    logps, _ = theano.map(pm.CallableTensor(logp0), sequences=[inmatrix])
+
+    f = theano.function([inmatrix], logps)
+    f.trust_input = True
+    return f
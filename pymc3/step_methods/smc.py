@@ -1,12 +1,14 @@
 """
 Sequential Monte Carlo sampler
 """
+import multiprocessing
+
 import numpy as np
 import theano
+import theano.tensor as tt
 import pymc3 as pm
 from tqdm import tqdm
 
-from .arraystep import metrop_select
 from .metropolis import MultivariateNormalProposal
 from ..theanof import floatX, make_shared_replacements, join_nonshared_inputs, inputvars
 from ..model import modelcontext
@@ -79,7 +81,8 @@ class SMC:
         self.threshold = threshold
 
 
-def sample_smc(draws=5000, step=None, progressbar=False, model=None, random_seed=-1):
+def sample_smc(draws=5000, step=None, cores=None, progressbar=False, model=None,
+               random_seed=-1):
     """
     Sequential Monte Carlo sampling
 
@@ -90,6 +93,10 @@ def sample_smc(draws=5000, step=None, progressbar=False, model=None, random_seed
         independent Markov Chains. Defaults to 5000.
     step : :class:`SMC`
         SMC initialization object
+    cores : int
+        The number of processes used to mutate the particles in parallel. The particles are
+        split evenly across a pool of worker processes that is started once per call. The
+        results are identical to the serial path for the same `random_seed`. Defaults to 1.
     progressbar : bool
         Flag for displaying a progress bar
     model : pymc3 Model
@@ -102,25 +109,56 @@ def sample_smc(draws=5000, step=None, progressbar=False, model=None, random_seed
     if random_seed != -1:
         np.random.seed(random_seed)
 
-    beta = 0.
-    stage = 0
-    acc_rate = 1.
-    proposed = draws * step.n_steps
     model.marginal_likelihood = 1
     variables = inputvars(model.vars)
     discrete = np.concatenate([[v.dtype in pm.discrete_types] * (v.dsize or 1) for v in variables])
-    any_discrete = discrete.any()
-    all_discrete = discrete.all()
     shared = make_shared_replacements(variables, model)
-    prior_logp = logp_forw([model.varlogpt], variables, shared)
-    likelihood_logp = logp_forw([model.datalogpt], variables, shared)
+    prior_logp = logp_forw_batched([model.varlogpt], variables, shared)
+    likelihood_logp = logp_forw_batched([model.datalogpt], variables, shared)
+
+    if cores is None:
+        cores = 1
+    pool = None
+    if cores > 1:
+        # The compiled functions are sent to the workers only once
+        pool = multiprocessing.Pool(
+            processes=cores,
+            initializer=_init_worker,
+            initargs=(prior_logp, likelihood_logp),
+        )
 
     pm._log.info("Sample initial stage: ...")
-    posterior, var_info = _initial_population(draws, model, variables)
+    posterior = _initial_population(draws, model, variables)
+
+    try:
+        posterior = _sample_stages(
+            posterior, step, draws, model, prior_logp, likelihood_logp,
+            discrete, pool, cores, progressbar)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    trace = _posterior_to_trace(posterior, model)
+
+    return trace
+
+
+def _sample_stages(posterior, step, draws, model, prior_logp, likelihood_logp,
+                   discrete, pool, cores, progressbar):
+    """
+    Run the SMC stages until beta reaches 1, mutating the particles in `pool` if given
+    """
+    beta = 0.
+    stage = 0
+    acc_rate = 1.
+    proposed = draws * step.n_steps
+    any_discrete = discrete.any()
+    all_discrete = discrete.all()
 
     while beta < 1:
         # compute plausibility weights (measure fitness)
-        likelihoods = np.array([likelihood_logp(sample) for sample in posterior]).squeeze()
+        likelihoods = likelihood_logp(posterior)
         beta, old_beta, weights, sj = _calc_beta(beta, likelihoods, step.threshold)
         model.marginal_likelihood *= sj
         # resample based on plausibility weights (selection)
@@ -146,43 +184,93 @@ def sample_smc(draws=5000, step=None, progressbar=False, model=None, random_seed
         pm._log.info(
             "Stage: {:d} Beta: {:f} Steps: {:d}".format(stage, beta, step.n_steps, acc_rate)
         )
-        # Apply Metropolis kernel (mutation)
+        # Apply Metropolis kernel (mutation) to all particles at once. The random numbers are
+        # drawn here, so the result does not depend on how the particles are split among cores.
         proposed = draws * step.n_steps
-        accepted = 0.
-        priors = np.array([prior_logp(sample) for sample in posterior]).squeeze()
-        tempered_post = priors + likelihoods * beta
-        for draw in tqdm(range(draws), disable=not progressbar):
-            old_tempered_post = tempered_post[draw]
-            q_old = posterior[draw]
-            deltas = np.squeeze(proposal(step.n_steps) * step.scaling)
-            for n_step in range(step.n_steps):
-                delta = deltas[n_step]
-
-                if any_discrete:
-                    if all_discrete:
-                        delta = np.round(delta, 0).astype("int64")
-                        q_old = q_old.astype("int64")
-                        q_new = (q_old + delta).astype("int64")
-                    else:
-                        delta[discrete] = np.round(delta[discrete], 0)
-                        q_new = floatX(q_old + delta)
-                else:
-                    q_new = floatX(q_old + delta)
-
-                new_tempered_post = prior_logp(q_new) + likelihood_logp(q_new)[0] * beta
-
-                q_old, accept = metrop_select(new_tempered_post - old_tempered_post, q_new, q_old)
-                if accept:
-                    accepted += 1
-                    posterior[draw] = q_old
-                    old_tempered_post = new_tempered_post
+        deltas = np.empty((step.n_steps,) + posterior.shape)
+        log_u = np.empty((step.n_steps, draws))
+        for n_step in range(step.n_steps):
+            deltas[n_step] = proposal(draws) * step.scaling
+            log_u[n_step] = np.log(np.random.uniform(size=draws))
+        if any_discrete:
+            if all_discrete:
+                deltas = np.round(deltas, 0)
+            else:
+                deltas[:, :, discrete] = np.round(deltas[:, :, discrete], 0)
+
+        if pool is None:
+            posterior, accepted = _mutate(
+                posterior, likelihoods, deltas, log_u, beta, prior_logp, likelihood_logp,
+                progressbar)
+        else:
+            chunks = np.array_split(np.arange(draws), cores)
+            work = [(posterior[idx], likelihoods[idx], deltas[:, idx], log_u[:, idx], beta)
+                    for idx in chunks]
+            results = list(tqdm(pool.imap(_mutate_worker, work), total=len(work),
+                                disable=not progressbar))
+            posterior = np.concatenate([result[0] for result in results])
+            accepted = sum(result[1] for result in results)
 
         acc_rate = accepted / proposed
         stage += 1
 
-    trace = _posterior_to_trace(posterior, variables, model, var_info)
+    return posterior
 
-    return trace
+
+def _mutate(posterior, likelihoods, deltas, log_u, beta, prior_logp, likelihood_logp,
+            progressbar=False):
+    """
+    Apply `len(deltas)` Metropolis steps to all particles of `posterior`.
+
+    Parameters
+    ----------
+    posterior : array
+        Particles, shape (n_particles, ndim)
+    likelihoods : array
+        Likelihood of the particles
+    deltas : array
+        Proposed steps, shape (n_steps, n_particles, ndim)
+    log_u : array
+        Logarithm of uniform random numbers used in the acceptance test,
+        shape (n_steps, n_particles)
+    beta : float
+        tempering parameter of the current stage
+
+    Returns
+    -------
+    posterior : array
+        Mutated particles
+    accepted : int
+        Number of accepted proposals
+    """
+    posterior = posterior.copy()
+    accepted = 0
+    tempered_post = prior_logp(posterior) + likelihoods * beta
+    for n_step in tqdm(range(len(deltas)), disable=not progressbar):
+        proposals = floatX(posterior + deltas[n_step])
+
+        new_tempered_post = prior_logp(proposals) + likelihood_logp(proposals) * beta
+
+        mr = new_tempered_post - tempered_post
+        accept = np.isfinite(mr) & (log_u[n_step] < mr)
+        posterior[accept] = proposals[accept]
+        tempered_post[accept] = new_tempered_post[accept]
+        accepted += accept.sum()
+
+    return posterior, accepted
+
+
+_worker_logp = None
+
+
+def _init_worker(prior_logp, likelihood_logp):
+    global _worker_logp
+    _worker_logp = (prior_logp, likelihood_logp)
+
+
+def _mutate_worker(args):
+    posterior, likelihoods, deltas, log_u, beta = args
+    return _mutate(posterior, likelihoods, deltas, log_u, beta, *_worker_logp)
 
 
 def _initial_population(draws, model, variables):
@@ -191,17 +279,12 @@ def _initial_population(draws, model, variables):
     """
 
     population = []
-    var_info = {}
-    start = model.test_point
     init_rnd = pm.sample_prior_predictive(draws, model=model)
-    for v in variables:
-        var_info[v.name] = (start[v.name].shape, start[v.name].size)
-
     for i in range(draws):
         point = pm.Point({v.name: init_rnd[v.name][i] for v in variables}, model=model)
         population.append(model.dict_to_array(point))
 
-    return np.array(floatX(population)), var_info
+    return np.array(floatX(population))
 
 
 def _calc_beta(beta, likelihoods, threshold=0.5):
@@ -283,24 +366,17 @@ def _tune(acc_rate):
     return (a + b * acc_rate) ** 2
 
 
-def _posterior_to_trace(posterior, variables, model, var_info):
+def _posterior_to_trace(posterior, model):
     """
     Save results into a PyMC3 trace
     """
-    lenght_pos = len(posterior)
-    varnames = [v.name for v in variables]
-
     with model:
         strace = NDArray(model)
-        strace.setup(lenght_pos, 0)
-    for i in range(lenght_pos):
-        value = []
-        size = 0
-        for var in varnames:
-            shape, new_size = var_info[var]
-            value.append(posterior[i][size : size + new_size].reshape(shape))
-            size += new_size
-        strace.record({k: v for k, v in zip(varnames, value)})
+        strace.setup(len(posterior), 0)
+    # the particles are laid out like `model.bijection`
+    for particle in posterior:
+        strace.record_flat(particle)
+    strace.close()
     return MultiTrace([strace])
 
 
@@ -320,3 +396,29 @@ def logp_forw(out_vars, vars, shared):
     f = theano.function([inarray0], out_list)
     f.trust_input = True
     return f
+
+
+def logp_forw_batched(out_vars, vars, shared):
+    """Compile Theano function of the model evaluated at every row of a matrix of points.
+
+    The returned function takes an array of shape (n_points, ndim) and returns the value of
+    the first output variable for each point as an array of shape (n_points,).
+
+    Parameters
+    ----------
+    out_vars : List
+        containing :class:`pymc3.Distribution` for the output variables
+    vars : List
+        containing :class:`pymc3.Distribution` for the input variables
+    shared : List
+        containing :class:`theano.tensor.Tensor` for depended shared data
+    """
+    out_list, inarray0 = join_nonshared_inputs(out_vars, vars, shared)
+    inarray = tt.TensorType(inarray0.dtype, (False,) + inarray0.broadcastable)('inarray')
+    inarray.tag.test_value = inarray0.tag.test_value[None, :]
+    out, _ = theano.scan(
+        lambda point: theano.clone(out_list[0], replace={inarray0: point}),
+        sequences=[inarray],
+    )
+    f = theano.function([inarray], out, allow_input_downcast=True)
+    return f
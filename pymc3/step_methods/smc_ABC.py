@@ -9,7 +9,8 @@ from tqdm import tqdm
 
 from .arraystep import metrop_select
 from .metropolis import MultivariateNormalProposal
-from ..theanof import floatX
+from .smc import logp_forw_batched
+from ..theanof import floatX, make_shared_replacements
 from ..model import modelcontext, treelist, FreeRV
 from ..backends.ndarray import NDArray
 from ..backends.base import MultiTrace
@@ -49,6 +50,13 @@ class SMC_ABC():
     proposal_name :
         Type of proposal distribution. Currently the only valid option is `MultivariateNormal`.
 
+    Notes
+    -----
+    If the simulator function has an attribute `batched` set to True, `sample_smc_abc` calls it
+    once per step with one array per parameter, holding the values of all particles, and expects
+    the simulated data of all particles stacked along the first axis. Summary statistics and
+    distances are then computed for the whole population at once, see `get_sum_stats_batched`.
+
     References
     ----------
     .. [Minson2013] Minson, S. E. and Simons, M. and Beck, J. L., (2013),
@@ -115,6 +123,10 @@ def sample_smc_abc(draws=5000, step=None, progressbar=False, model=None, random_
     prior_logp = theano.function(variables, model.varlogpt)
     simulator = model.observed_RVs[0]
     function = simulator.distribution.function
+    batched = getattr(function, 'batched', False)
+    if batched:
+        shared = make_shared_replacements(variables, model)
+        prior_logp_batched = logp_forw_batched([model.varlogpt], variables, shared)
     observed_sum_stat = get_sum_stats(simulator.observations, sum_stat=step.sum_stat)
     epsilon = np.inf
     distance_list = []
@@ -164,7 +176,10 @@ def sample_smc_abc(draws=5000, step=None, progressbar=False, model=None, random_
         proposal_list = []
 
         #if step.epsilons is None:
-        if stage == 0:
+        if stage == 0 and batched:
+            simulated_sample = function(*posterior[::10].T)
+            epsilon_list.append(calc_epsilon(simulated_sample[0], step.iqr_scale, step, step.epsilons, stage, step.routine))
+        elif stage == 0:
             simulated_sample = [function(*sample) for sample in posterior][::10]
             epsilon_list.append(calc_epsilon(simulated_sample[0], step.iqr_scale, step, step.epsilons, stage, step.routine))
         else:
@@ -174,37 +189,42 @@ def sample_smc_abc(draws=5000, step=None, progressbar=False, model=None, random_
         epsilon = epsilon_list[stage]
         pm._log.info('Sampling stage {} with Epsilon {:f}'.format(stage, epsilon))
 
-        for draw in tqdm(range(draws), disable=not progressbar):
-            q_old = posterior[draw]
-            deltas = np.squeeze(proposal(step.n_steps) * step.scaling)
-            for n_step in range(0, step.n_steps):
-                delta = deltas[n_step]
-                if any_discrete:
-                    if all_discrete:
-                        delta = np.round(delta, 0).astype('int64')
-                        q_old = q_old.astype('int64')
-                        q_new = (q_old + delta).astype('int64')
+        if batched:
+            new_posterior_list, proposal_list, distance_list, accepted, proposed = _mutate_batched(
+                posterior, proposal, covariance, step, epsilon, function, prior_logp_batched,
+                observed_sum_stat, distance_function, discrete, progressbar)
+        else:
+            for draw in tqdm(range(draws), disable=not progressbar):
+                q_old = posterior[draw]
+                deltas = np.squeeze(proposal(step.n_steps) * step.scaling)
+                for n_step in range(0, step.n_steps):
+                    delta = deltas[n_step]
+                    if any_discrete:
+                        if all_discrete:
+                            delta = np.round(delta, 0).astype('int64')
+                            q_old = q_old.astype('int64')
+                            q_new = (q_old + delta).astype('int64')
+                        else:
+                            delta[discrete] = np.round(delta[discrete], 0)
+                            q_new = (q_old + delta)
                     else:
-                        delta[discrete] = np.round(delta[discrete], 0)
-                        q_new = (q_old + delta)
-                else:
-                    q_new = q_old + delta
+                        q_new = q_old + delta
                 
-                if np.isfinite(prior_logp(*q_new)):
+                    if np.isfinite(prior_logp(*q_new)):
 
-                    simulated_data = function(*q_new)
+                        simulated_data = function(*q_new)
                     
-                    simulated_stat = get_sum_stats(simulated_data, sum_stat=step.sum_stat)
-                    distance = distance_function(simulated_stat, observed_sum_stat)
-
-                    if distance < epsilon:
-                        accepted += 1.
-                        new_posterior_list.append(q_new)
-                        proposal_list.append(proposal.logp(covariance * step.scaling, q_new))
-                        distance_list.append(distance)
-                        break
+                        simulated_stat = get_sum_stats(simulated_data, sum_stat=step.sum_stat)
+                        distance = distance_function(simulated_stat, observed_sum_stat)
+
+                        if distance < epsilon:
+                            accepted += 1.
+                            new_posterior_list.append(q_new)
+                            proposal_list.append(proposal.logp(covariance * step.scaling, q_new))
+                            distance_list.append(distance)
+                            break
                     
-                proposed += 1.
+                    proposed += 1.
 
         if new_posterior_list:
             new_posterior = np.array(new_posterior_list)
@@ -213,7 +233,10 @@ def sample_smc_abc(draws=5000, step=None, progressbar=False, model=None, random_
             posterior = new_posterior[resampling_indexes]
             proposal_array = np.array(proposal_list)
             proposal_array = proposal_array[resampling_indexes]
-            priors = np.array([prior_logp(*sample) for sample in posterior])
+            if batched:
+                priors = prior_logp_batched(posterior)
+            else:
+                priors = np.array([prior_logp(*sample) for sample in posterior])
             un_weights = priors - proposal_array
             acc_rate = accepted / proposed
             stage += 1
@@ -225,6 +248,70 @@ def sample_smc_abc(draws=5000, step=None, progressbar=False, model=None, random_
 
     return trace
 
+def _mutate_batched(posterior, proposal, covariance, step, epsilon, function, prior_logp,
+                    observed_sum_stat, distance_function, discrete, progressbar=False):
+    """
+    Apply the rejection kernel to all particles at once, using a batched simulator.
+
+    Every particle proposes up to `step.n_steps` moves and keeps the first one whose distance to
+    the observed summary statistics is smaller than `epsilon`.
+
+    Returns
+    -------
+    new_posterior_list : list
+        Accepted particles
+    proposal_list : list
+        Proposal log-density of the accepted particles
+    distance_list : list
+        Distances of the accepted particles
+    accepted : float
+        Number of accepted proposals
+    proposed : float
+        Number of rejected proposals
+    """
+    draws = len(posterior)
+    any_discrete = discrete.any()
+    all_discrete = discrete.all()
+    new_posterior_list = []
+    proposal_list = []
+    distance_list = []
+    accepted = 0.
+    proposed = 0.
+    active = np.ones(draws, dtype=bool)
+
+    for n_step in tqdm(range(step.n_steps), disable=not progressbar):
+        deltas = np.atleast_2d(proposal(draws)[active] * step.scaling)
+        if any_discrete:
+            if all_discrete:
+                deltas = np.round(deltas, 0)
+            else:
+                deltas[:, discrete] = np.round(deltas[:, discrete], 0)
+        q_new = posterior[active] + deltas
+        if all_discrete:
+            q_new = q_new.astype('int64')
+        idx = np.flatnonzero(active)
+
+        finite = np.isfinite(prior_logp(q_new))
+        accept = np.zeros(len(q_new), dtype=bool)
+        if finite.any():
+            simulated_data = function(*q_new[finite].T)
+            simulated_stat = get_sum_stats_batched(simulated_data, sum_stat=step.sum_stat)
+            simulated_stat = simulated_stat.reshape((-1,) + observed_sum_stat.shape)
+            distances = distance_function(simulated_stat, observed_sum_stat)
+            accept[finite] = distances < epsilon
+            for q, distance in zip(q_new[accept], distances[accept[finite]]):
+                new_posterior_list.append(q)
+                proposal_list.append(proposal.logp(covariance * step.scaling, q))
+                distance_list.append(distance)
+
+        accepted += accept.sum()
+        proposed += (~accept).sum()
+        active[idx[accept]] = False
+        if not active.any():
+            break
+
+    return new_posterior_list, proposal_list, distance_list, accepted, proposed
+
 # FIXME!!!!
 def _initial_population(samples, model, variables):
     """
@@ -359,20 +446,66 @@ def get_sum_stats(data, sum_stat=SMC_ABC().sum_stat):
 
     return np.atleast_1d(np.squeeze(sum_stat_vector))
 
+def get_sum_stats_batched(data, sum_stat=SMC_ABC().sum_stat):
+    """
+    Compute the summary statistics of many data sets at once.
+
+    Parameters:
+    -----------
+    data : array
+        Simulated data sets stacked along the first axis, with shape (n_sets, n_obs) or
+        (n_sets, n_obs, n_columns).
+    sum_stat : list
+        List of summary statistics to be computed. Accepted strings are mean, std, var.
+        Python functions can be passed in this argument, they are called with an `axis`
+        keyword if they accept one (e.g. numpy functions and ufunc reductions), and are
+        applied to each column of each data set otherwise.
+
+    Returns:
+    --------
+    sum_stat_array : array
+        Array with shape (n_sets, n_stats) containing the summary statistics of each data set,
+        in the same order as the flattened output of `get_sum_stats` for a single data set.
+    """
+    data = np.asarray(data)
+    if data.ndim == 2:
+        data = data[:, :, np.newaxis]
+    sum_stat_array = np.zeros((data.shape[0], len(sum_stat), data.shape[2]))
+
+    for i, stat in enumerate(sum_stat):
+        if stat == 'mean':
+            sum_stat_array[:, i] = data.mean(axis=1)
+        elif stat == 'std':
+            sum_stat_array[:, i] = data.std(axis=1)
+        elif stat == 'var':
+            sum_stat_array[:, i] = data.var(axis=1)
+        else:
+            try:
+                sum_stat_array[:, i] = stat(data, axis=1)
+            except TypeError:
+                sum_stat_array[:, i] = np.apply_along_axis(stat, 1, data)
+
+    return sum_stat_array.reshape(data.shape[0], -1)
+
+# The distance functions reduce over the axes of the observed summary statistics `b`, so `a`
+# can also hold the summary statistics of many data sets, stacked along a leading axis.
+def _stat_axes(a, b):
+    return tuple(range(np.ndim(a) - np.ndim(b), np.ndim(a)))
+
 def absolute_difference(a, b):
-    return np.sum(np.abs(a - b))
+    return np.sum(np.abs(a - b), axis=_stat_axes(a, b))
 
 def sum_of_squared_distance(a, b):
-    return np.sum((a - b)**2)
+    return np.sum((a - b)**2, axis=_stat_axes(a, b))
 
 def mean_absolute_error(a, b):
-    return np.sum(np.abs(a - b))/len(a)
+    return np.sum(np.abs(a - b), axis=_stat_axes(a, b))/len(b)
 
 def mean_squared_error(a, b):
-    return np.sum((a - b)**2)/len(a)
+    return np.sum((a - b)**2, axis=_stat_axes(a, b))/len(b)
 
 def euclidean_distance(a, b):
-    return np.sqrt(np.sum((a - b)**2))
+    return np.sqrt(np.sum((a - b)**2, axis=_stat_axes(a, b)))
 
 def get_distance(func_name):
     d = {'absolute difference': absolute_difference,
@@ -37,6 +37,10 @@ class DualAverageAdaptation(object):
         self._log_bar = mk * self._log_step + (1 - mk) * self._log_bar
         self._count += 1
 
+    def reset_stats(self):
+        """Forget the acceptance statistics, but keep the step size."""
+        self._tuned_stats = []
+
     def stats(self):
         return {
             'step_size': np.exp(self._log_step),
@@ -7,7 +7,7 @@ from ..step_methods import Slice, Metropolis, NUTS
 from ..distributions import Normal
 from ..tuning import find_MAP
 from ..sampling import sample
-from ..diagnostics import effective_n, geweke, gelman_rubin
+from ..diagnostics import effective_n, geweke, gelman_rubin, OnlineDiagnostics
 from .test_examples import build_disaster_model
 import pytest
 import theano
@@ -167,6 +167,16 @@ class TestDiagnostics(SeededTest):
         n_effective = effective_n(ptrace)['x']
         assert_allclose(n_effective, n_jobs * n_samples, 2)
 
+    def test_effective_n_batched(self):
+        """Check that all elements are computed as if they were separate traces"""
+        np.random.seed(20180927)
+        x = np.cumsum(np.random.randn(4, 50, 3), axis=1)
+        n_effective = effective_n(x)
+        rhat = gelman_rubin(x)
+        for i in range(x.shape[2]):
+            assert_allclose(n_effective[i], effective_n(x[:, :, i]))
+            assert_allclose(rhat[i], gelman_rubin(x[:, :, i]))
+
     def test_effective_n_right_shape_python_float(self,
                                                   shape=None, test_shape=None):
         """Check effective sample size shape is correct w/ python float"""
@@ -213,3 +223,71 @@ class TestDiagnostics(SeededTest):
         """Check effective sample size shape is correct w/ scalar as shape=1"""
         self.test_effective_n_right_shape_python_float(shape=1,
                                                        test_shape=(1,))
+
+
+class TestOnlineDiagnostics(SeededTest):
+    def ar1(self, chains, draws, rho):
+        x = np.zeros((chains, draws, 3))
+        x[:, 0] = np.random.randn(chains, 3)
+        for i in range(1, draws):
+            x[:, i] = rho * x[:, i - 1] + np.random.randn(chains, 3)
+        return x
+
+    def update(self, diagnostics, x):
+        for chain in range(x.shape[0]):
+            for draw in x[chain]:
+                diagnostics.update(chain, {'a': draw[0], 'b': draw[1:]})
+
+    def test_gelman_rubin(self):
+        x = self.ar1(4, 200, 0.5)
+        diagnostics = OnlineDiagnostics()
+        self.update(diagnostics, x)
+        rhat = diagnostics.gelman_rubin()
+        assert_allclose(rhat['a'], gelman_rubin(x[:, :, 0]))
+        assert_allclose(rhat['b'], gelman_rubin(x[:, :, 1:]))
+
+    def test_effective_n(self):
+        rho = 0.5
+        x = self.ar1(4, 5000, rho)
+        diagnostics = OnlineDiagnostics()
+        self.update(diagnostics, x)
+        n_effective = diagnostics.effective_n()
+        expected = x.shape[0] * x.shape[1] * (1 - rho) / (1 + rho)
+        assert n_effective['b'].shape == (2,)
+        assert_allclose(n_effective['a'], expected, rtol=0.3)
+        assert_allclose(n_effective['b'], expected, rtol=0.3)
+        assert_allclose(n_effective['b'], effective_n(x[:, :, 1:]), rtol=0.3)
+
+    def test_stopping_point(self):
+        rho, target_ess = 0.9, 200
+        x = self.ar1(4, 5000, rho)
+        diagnostics = OnlineDiagnostics()
+        for draws in range(100, x.shape[1] + 1, 100):
+            self.update(diagnostics, x[:, draws - 100:draws])
+            if diagnostics.converged(target_ess):
+                break
+        assert draws < x.shape[1]
+        # The batch means of short batches are still autocorrelated and
+        # must not make the chains stop early
+        assert np.all(effective_n(x[:, :draws]) > 0.75 * target_ess)
+        expected = x.shape[0] * draws * (1 - rho) / (1 + rho)
+        assert expected > 0.75 * target_ess
+
+    def test_not_enough_draws(self):
+        diagnostics = OnlineDiagnostics(min_batches=16)
+        assert not diagnostics.converged(1)
+        self.update(diagnostics, self.ar1(1, 10, 0.))
+        assert np.isnan(diagnostics.effective_n()['a'])
+        assert np.isnan(diagnostics.gelman_rubin()['a'])
+        assert not diagnostics.converged(1)
+        self.update(diagnostics, self.ar1(1, 10, 0.))
+        assert diagnostics.n_draws(0) == 20
+        assert np.isfinite(diagnostics.effective_n()['a'])
+        assert diagnostics.converged(1)
+        assert not diagnostics.converged(1, chains=[0, 1])
+
+    def test_divergences(self):
+        diagnostics = OnlineDiagnostics()
+        for diverging in [True, False, True]:
+            diagnostics.update(0, {'a': 0.}, [{'diverging': diverging}])
+        assert diagnostics.divergences == {0: 2}
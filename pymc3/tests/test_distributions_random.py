@@ -11,6 +11,7 @@ import theano
 
 import pymc3 as pm
 from pymc3.distributions.distribution import draw_values
+from pymc3.memoize import DEFAULT_MAXSIZE, LRUCache, cache_info, set_cache_size
 from .helpers import SeededTest
 from .test_distributions import (
     build_model, Domain, product, R, Rplus, Rplusbig, Runif, Rplusdunif,
@@ -115,6 +116,41 @@ class TestDrawValues(SeededTest):
         assert isinstance(mu, np.ndarray)
         assert isinstance(tau, np.ndarray)
 
+    def test_draw_values_cache(self):
+        def count(kind):
+            return sum(key[0] == kind for key in cache)
+
+        with pm.Model() as model:
+            mu = pm.Normal('mu', mu=0., sd=1.)
+            exp_mu = pm.Deterministic('exp_mu', pm.math.exp(mu))
+            y = pm.Normal('y', mu=exp_mu, sd=1.)
+            params = [y.distribution.mu, y.distribution.tau]
+
+            first = draw_values(params, point={'mu': 1.})
+            cache = model._cache['draw_values']
+            assert isinstance(cache, LRUCache)
+            assert count('graph') == 1
+            assert count('order') == 1
+
+            second = draw_values(params, point={'mu': 1.})
+            npt.assert_almost_equal(first, second)
+            assert model._cache['draw_values'] is cache
+            assert count('order') == 1
+            assert cache.hits == 1
+
+            draw_values(params)
+            assert count('order') == 2
+            set_cache_size(1, model)
+            assert len(cache) == 1
+            assert cache_info(model).evictions >= 2
+            set_cache_size(DEFAULT_MAXSIZE, model)
+
+            pm.Normal('z', mu=y)
+            draw_values(params, point={'mu': 1.})
+            assert count('graph') == 1
+            assert count('order') == 1
+        npt.assert_almost_equal(second[0], np.exp(1.))
+
 
 class BaseTestCases(object):
     class BaseTestCase(SeededTest):
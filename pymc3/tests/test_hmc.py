@@ -1,8 +1,11 @@
+import pickle
+
 import numpy as np
 import numpy.testing as npt
 
 from . import models
 from pymc3.step_methods.hmc.base_hmc import BaseHMC
+from pymc3.step_methods.hmc.integration import StatePool
 from pymc3.exceptions import SamplingError
 import pymc3
 import pytest
@@ -32,6 +35,43 @@ def test_leapfrog_reversible():
             npt.assert_allclose(state.p, start.p, rtol=1e-5)
 
 
+def test_leapfrog_out():
+    np.random.seed(42)
+    start, model, _ = models.non_normal(3)
+    step = BaseHMC(vars=model.vars, model=model)
+    step.integrator._logp_dlogp_func.set_extra_values({})
+    q = floatX(np.random.randn(model.ndim))
+    start = step.integrator.compute_state(q, floatX(step.potential.random()))
+    expected = step.integrator.step(.1, start)
+
+    out = step.integrator.pool.get()
+    state = step.integrator.step(.1, start, out=out)
+    assert state.q is out.q and state.p is out.p and state.q_grad is out.q_grad
+    for a, b in zip(state, expected):
+        npt.assert_allclose(a, b)
+
+
+def test_nuts_state_pool():
+    with pymc3.Model():
+        pymc3.Normal("x", mu=0, sd=1, shape=5)
+        step = pymc3.NUTS(max_treedepth=8)
+        trace = pymc3.sample(50, step=step, tune=50, chains=1)
+    # interior states of the trajectories are recycled
+    assert trace['tree_size'].max() >= 7
+    assert len(step.integrator.pool._states) <= 3 * trace['depth'].max() + 3
+
+
+def test_state_pool_pickle():
+    pool = StatePool(3, 'float64')
+    pool.get()
+    pool.get_vector()
+    pool = pickle.loads(pickle.dumps(pool))
+    assert not pool._states and not pool._vectors and not pool._owned
+    state = pool.get()
+    pool.release(state)
+    assert pool.get() is state
+
+
 def test_nuts_tuning():
     model = pymc3.Model()
     with model:
@@ -51,3 +91,76 @@ def test_nuts_error_reporting(caplog):
             trace = pymc3.sample(init='adapt_diag', chains=1)
         assert "Bad initial energy, check any log  probabilities that are inf or -inf: a        -inf\nb" in caplog.text
 
+
+
+def test_batched_nuts_logp_dlogp():
+    with pymc3.Model():
+        pymc3.Normal("x", mu=0, sd=1, shape=3)
+        pymc3.HalfNormal("s", sd=1)
+        step = pymc3.BatchedNUTS()
+    func = step._logp_dlogp_func
+    q = floatX(np.random.randn(5, func.size))
+    logp, dlogp = step._batched_logp_dlogp(q)
+    assert logp.shape == (5,) and dlogp.shape == (5, func.size)
+    for row, logp_row, dlogp_row in zip(q, logp, dlogp):
+        expected_logp, expected_dlogp = func(row)
+        npt.assert_allclose(logp_row, expected_logp)
+        npt.assert_allclose(dlogp_row, expected_dlogp)
+
+
+def test_batched_nuts_single_chain():
+    with pymc3.Model() as model:
+        pymc3.Normal("x", mu=0, sd=1, shape=3)
+        nuts = pymc3.NUTS()
+        batched = pymc3.BatchedNUTS()
+    point = model.test_point
+    np.random.seed(42)
+    expected = []
+    for _ in range(10):
+        point, stats = nuts.step(point)
+        expected.append(point['x'])
+    np.random.seed(42)
+    points = [model.test_point]
+    for values in expected:
+        points, stats = batched.step_chains(points)
+        npt.assert_allclose(points[0]['x'], values)
+    assert len(stats) == 1 and 'tree_size' in stats[0][0]
+
+
+def test_batched_nuts_sample():
+    with pymc3.Model():
+        pymc3.Normal("x", mu=np.array([0, 5]), sd=np.array([1, 2]), shape=2)
+        step = pymc3.BatchedNUTS()
+        trace = pymc3.sample(300, step=step, tune=200, chains=3, cores=1,
+                             random_seed=1, progressbar=False,
+                             compute_convergence_checks=False)
+    assert trace.nchains == 3
+    assert not step.tune
+    npt.assert_allclose(trace['x'].mean(0), [0, 5], atol=0.4)
+    npt.assert_allclose(trace['x'].std(0), [1, 2], rtol=0.2)
+    # every chain adapts its own step size
+    step_sizes = trace.get_sampler_stats('step_size', combine=False)
+    assert len(set(sizes[-1] for sizes in step_sizes)) == 3
+
+
+def test_batched_nuts_trace(tmpdir):
+    with pymc3.Model():
+        pymc3.Normal("x", mu=0, sd=1)
+        step = pymc3.BatchedNUTS()
+        db = pymc3.backends.Text(str(tmpdir.join('trace')))
+        trace = pymc3.sample(20, step=step, tune=10, chains=2, chain_idx=3,
+                             trace=db, progressbar=False,
+                             compute_convergence_checks=False)
+        stored = pymc3.backends.text.load(str(tmpdir.join('trace')))
+    assert trace.chains == [3, 4]
+    assert len(trace) == 20
+    assert stored.chains == [3, 4]
+    assert len(stored) == 30
+
+
+def test_batched_nuts_requires_all_vars():
+    with pymc3.Model() as model:
+        x = pymc3.Normal("x", mu=0, sd=1)
+        pymc3.Poisson("k", mu=1)
+        with pytest.raises(ValueError):
+            pymc3.BatchedNUTS(vars=[x])
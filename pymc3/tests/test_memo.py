@@ -1,4 +1,10 @@
-from pymc3.memoize import memoize
+import gc
+import weakref
+
+import numpy as np
+
+from pymc3.memoize import (memoize, WithMemoization, cache_info, clear_cache,
+                           set_cache_size, OWNER_REGISTRY)
 
 
 def getmemo():
@@ -14,3 +20,53 @@ def test_memo():
     assert f('x', ['y', 'z']) == "x['y', 'z']"
     assert f('x', ['a', 'z']) == "x['a', 'z']"
     assert f('x', ['y', 'z']) == "x['y', 'z']"
+
+
+def test_memo_lru():
+    calls = []
+
+    @memoize(maxsize=2)
+    def f(a):
+        calls.append(a)
+        return np.zeros(a)
+
+    f(1)
+    f(2)
+    f(1)
+    f(3)  # evicts 2, the least recently used
+    f(1)
+    assert calls == [1, 2, 3]
+    f(2)
+    assert calls == [1, 2, 3, 2]
+    info = cache_info(f)
+    assert info.hits == 2
+    assert info.misses == 4
+    assert info.evictions == 2
+    assert info.size == 2
+    assert info.maxsize == 2
+    assert info.nbytes == 1 * 8 + 2 * 8
+
+    set_cache_size(1, f)
+    assert len(f.cache) == 1
+    clear_cache(f)
+    assert cache_info(f).size == 0
+
+
+class Owner(WithMemoization):
+    @memoize(bound=True, maxsize=1)
+    def g(self, a):
+        return [a]
+
+
+def test_memo_bound_owner():
+    owner = Owner()
+    assert owner.g(1) is owner.g(1)
+    owner.g(2)
+    info = cache_info(owner)
+    assert (info.hits, info.misses, info.evictions, info.size) == (1, 2, 1, 1)
+    assert owner in OWNER_REGISTRY
+
+    ref = weakref.ref(owner)
+    del owner
+    gc.collect()
+    assert ref() is None
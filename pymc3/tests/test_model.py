@@ -3,6 +3,7 @@ from theano import theano, tensor as tt
 import numpy as np
 import pandas as pd
 import numpy.testing as npt
+import scipy.stats as st
 import unittest
 
 import pymc3 as pm
@@ -288,3 +289,118 @@ class TestValueGradFunction(unittest.TestCase):
         assert logp.size == 1
         assert dlogp.size == 4
         npt.assert_allclose(dlogp, 0., atol=1e-5)
+
+
+class TestBatchedValueGradFunction(object):
+    def check(self, model, vectorized, grad_vars=None):
+        with model:
+            batched = model.batched_logp_dlogp_function(grad_vars)
+            func = model.logp_dlogp_function(grad_vars)
+        assert batched.vectorized == vectorized
+        batched.set_extra_values(model.test_point)
+        func.set_extra_values(model.test_point)
+        array = np.random.RandomState(1).randn(5, func.size)
+        logp, dlogp = batched(array.astype(func.dtype))
+        assert logp.shape == (5,)
+        assert dlogp.shape == (5, func.size)
+        for row, logp_row, dlogp_row in zip(array, logp, dlogp):
+            expected_logp, expected_dlogp = func(row.astype(func.dtype))
+            npt.assert_allclose(logp_row, expected_logp, rtol=1e-5)
+            npt.assert_allclose(dlogp_row, expected_dlogp, rtol=1e-5,
+                                atol=1e-8)
+        return batched
+
+    def test_broadcasting(self):
+        data = np.random.RandomState(0).randn(20, 3)
+        with pm.Model() as model:
+            mu = pm.Normal('mu', 0, 10, shape=3)
+            sd = pm.HalfNormal('sd', 2)
+            pm.Normal('y', mu, sd, observed=data)
+            pm.Potential('p', -(mu ** 2).sum())
+        self.check(model, vectorized=True)
+
+    def test_indexing_and_dot(self):
+        rng = np.random.RandomState(0)
+        X = rng.randn(20, 2)
+        with pm.Model() as model:
+            a = pm.Normal('a', 0, 1, shape=4)
+            b = pm.Normal('b', 0, 1, shape=2)
+            mu = a[np.arange(20) % 4] + pm.math.dot(X, b)
+            pm.Normal('y', mu, 1, observed=rng.randn(20))
+        self.check(model, vectorized=True)
+
+    def test_extra_vars(self):
+        with pm.Model() as model:
+            x = pm.Normal('x', shape=2)
+            k = pm.Poisson('k', 3)
+            pm.Normal('y', x.sum() * k, 1, observed=[1., 2.])
+        batched = self.check(model, vectorized=True, grad_vars=[x])
+        with pytest.raises(ValueError) as err:
+            batched(np.zeros(batched.size, dtype=batched.dtype))
+        err.match('Invalid shape')
+
+    def test_fallback(self):
+        with pm.Model() as model:
+            pm.MvNormal('x', mu=np.zeros(2), cov=np.array([[1., .5], [.5, 1.]]),
+                        shape=2)
+        self.check(model, vectorized=False)
+
+
+class TestFunctionCache(object):
+    def build(self, data):
+        shared = theano.shared(data, 'data')
+        with pm.Model() as model:
+            mu = pm.Normal('mu', shape=2)
+            k = pm.Poisson('k', 3)
+            pm.Normal('y', mu[0] + k, 1, observed=shared)
+        return model, shared
+
+    def test_reuse(self, tmpdir):
+        old = pm.set_function_cache(str(tmpdir))
+        try:
+            data = np.arange(3.)
+            model, _ = self.build(data)
+            expected = model.logp_dlogp_function()
+            expected.set_extra_values({'k': 2})
+            model.fastlogp(model.test_point)
+            n_cached = len(tmpdir.listdir())
+            assert n_cached == 2
+
+            model, shared = self.build(data)
+            func = model.logp_dlogp_function()
+            func.set_extra_values({'k': 2})
+            logp = model.fastlogp
+            assert len(tmpdir.listdir()) == n_cached
+
+            array = np.array([0.5, -1.])
+            npt.assert_allclose(func(array)[0], expected(array)[0])
+            npt.assert_allclose(func(array)[1], expected(array)[1])
+
+            shared.set_value(data + 1)
+            point = model.test_point
+            expected_logp = (
+                st.norm.logpdf(data + 1, 3, 1).sum() + st.poisson.logpmf(3, 3)
+                + st.norm.logpdf([0, 0]).sum())
+            assert np.ndim(logp(point)) == 0
+            npt.assert_allclose(logp(point), expected_logp)
+        finally:
+            pm.set_function_cache(old)
+
+    def test_reuse_with_new_constant_data(self, tmpdir):
+        old = pm.set_function_cache(str(tmpdir))
+        try:
+            data = np.arange(3.)
+            with pm.Model() as model:
+                pm.Normal('y', pm.Normal('mu'), 1, observed=data)
+            model.fastlogp(model.test_point)
+            n_cached = len(tmpdir.listdir())
+
+            with pm.Model() as model:
+                pm.Normal('y', pm.Normal('mu'), 1, observed=data + 1)
+            logp = model.fastlogp(model.test_point)
+            assert len(tmpdir.listdir()) == n_cached
+            expected_logp = (st.norm.logpdf(data + 1, 0, 1).sum()
+                             + st.norm.logpdf(0))
+            npt.assert_allclose(logp, expected_logp)
+        finally:
+            pm.set_function_cache(old)
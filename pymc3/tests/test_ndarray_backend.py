@@ -1,6 +1,10 @@
+import gc
+import os
+
 import numpy as np
 import numpy.testing as npt
 from pymc3.tests import backend_fixtures as bf
+from pymc3.tests import models
 from pymc3.backends import base, ndarray
 import pymc3 as pm
 import pytest
@@ -96,6 +100,137 @@ class TestNDArray2dSelection(bf.SelectionTestCase):
     shape = (2, 3)
 
 
+class TestMemmapNDArray0dSampling(bf.SamplingTestCase):
+    backend = ndarray.MemmapNDArray
+    name = 'memmap-db'
+    sampler_vars = STATS1
+    shape = ()
+
+
+class TestMemmapNDArray2dSampling(bf.SamplingTestCase):
+    backend = ndarray.MemmapNDArray
+    name = 'memmap-db'
+    shape = (2, 3)
+
+
+class TestMemmapNDArray1dSelection(bf.SelectionTestCase):
+    backend = ndarray.MemmapNDArray
+    name = 'memmap-db'
+    sampler_vars = STATS2
+    shape = 2
+
+
+class TestMemmapNDArrayContinue(bf.ModelBackendSetupTestCase):
+    backend = ndarray.MemmapNDArray
+    name = 'memmap-db'
+    shape = 2
+
+    def test_continue_chain(self):
+        varname = list(self.test_point.keys())[0]
+        self.strace.setup(3, chain=0)
+        for i in range(3):
+            self.strace.record({k: np.full_like(v, i)
+                                for k, v in self.test_point.items()})
+        self.strace.close()
+        self.strace.setup(2, chain=0)
+        for i in range(3, 5):
+            self.strace.record({k: np.full_like(v, i)
+                                for k, v in self.test_point.items()})
+        self.strace.close()
+
+        values = self.strace.get_values(varname)
+        assert isinstance(values, np.memmap)
+        assert values.shape == (5,) + self.test_point[varname].shape
+        npt.assert_equal(values[:, 0], np.arange(5))
+        npt.assert_equal(self.strace[1:4].get_values(varname)[:, 0], [1, 2, 3])
+        npt.assert_equal(self.strace.point(4)[varname][0], 4)
+
+
+def test_memmap_shortcut_directories():
+    _, model, _ = models.beta_bernoulli(2)
+    traces = [pm.sampling._choose_backend('memmap', 0, model=model)
+              for _ in range(2)]
+    assert traces[0].directory != traces[1].directory
+    directory = traces[0].directory
+    traces[0].setup(10, 0)
+    assert os.listdir(directory)
+    del traces[0]
+    gc.collect()
+    assert not os.path.exists(directory)
+
+
+def test_memmap_named_directory_kept(tmpdir):
+    _, model, _ = models.beta_bernoulli(2)
+    directory = str(tmpdir.join('trace'))
+    trace = ndarray.MemmapNDArray(directory, model=model)
+    trace.setup(10, 0)
+    del trace
+    gc.collect()
+    assert os.listdir(directory)
+
+
+class TestNDArrayRecordFlat(object):
+    def setup_method(self):
+        with pm.Model() as self.model:
+            mu = pm.Normal('mu', shape=3)
+            sd = pm.HalfNormal('sd')
+            pm.Deterministic('scaled', mu * sd)
+            pm.Deterministic('total', mu.sum())
+        self.bij = self.model.bijection
+        rng = np.random.RandomState(0)
+        self.arrays = rng.normal(size=(5, self.bij.ordering.size))
+        self.mu = self.arrays[:, self.bij.ordering['mu'].slc]
+
+    def _trace(self, draws=5):
+        with self.model:
+            strace = ndarray.NDArray()
+        strace.setup(draws, 0, STATS1)
+        return strace
+
+    def _stats(self, i):
+        return [{'a': float(i), 'b': i % 2 == 0}]
+
+    def test_record_flat(self):
+        expected = self._trace()
+        strace = self._trace()
+        strace.flat_buffer_draws = 2
+        for i, array in enumerate(self.arrays):
+            expected.record(self.bij.rmap(array), self._stats(i))
+            strace.record_flat(array, self._stats(i))
+            if i == 2:
+                assert len(strace) == 3
+                npt.assert_allclose(strace.point(2)['scaled'],
+                                    expected.point(2)['scaled'])
+        strace.close()
+
+        for varname in expected.varnames:
+            npt.assert_allclose(strace.get_values(varname),
+                                expected.get_values(varname))
+        for key in ['a', 'b']:
+            npt.assert_equal(strace.get_sampler_stats(key),
+                             expected.get_sampler_stats(key))
+
+    def test_record_flat_and_record(self):
+        strace = self._trace()
+        for i, array in enumerate(self.arrays):
+            if i % 2:
+                strace.record(self.bij.rmap(array), self._stats(i))
+            else:
+                strace.record_flat(array, self._stats(i))
+        strace.close()
+        npt.assert_allclose(strace.get_values('mu'), self.mu)
+        npt.assert_allclose(strace.get_values('total'), self.mu.sum(axis=1))
+
+    def test_close_early(self):
+        strace = self._trace(draws=10)
+        for i, array in enumerate(self.arrays):
+            strace.record_flat(array, self._stats(i))
+        strace.close()
+        assert len(strace) == 5
+        assert strace.get_values('sd').shape == (5,)
+        npt.assert_allclose(strace[1:3].get_values('mu'), self.mu[1:3])
+
+
 class TestMultiTrace(bf.ModelBackendSetupTestCase):
     name = None
     backend = ndarray.NDArray
@@ -0,0 +1,162 @@
+import os
+
+import numpy as np
+import numpy.testing as npt
+import pymc3 as pm
+from pymc3.tests import backend_fixtures as bf
+from pymc3.tests import models
+from pymc3.backends import ndarray, npy
+import pytest
+import theano
+
+
+STATS = [{
+    'a': np.float64,
+    'b': np.bool
+}, {
+    'a': np.float64,
+    'c': np.int64,
+}]
+
+
+class TestNPYSampling(object):
+    name = 'npy-db'
+
+    def test_supports_sampler_stats(self):
+        with pm.Model():
+            pm.Normal("mu", mu=0, sd=1, shape=2)
+            db = npy.NPY(self.name)
+            trace = pm.sample(20, tune=10, init=None, trace=db, cores=2)
+        assert 'diverging' in trace.stat_names
+        assert trace.get_sampler_stats('diverging').shape == (40,)
+
+    def teardown_method(self):
+        bf.remove_file_or_directory(self.name)
+
+
+class TestNPY0dSampling(bf.SamplingTestCase):
+    backend = npy.NPY
+    name = 'npy-db'
+    shape = ()
+
+
+class TestNPY0dSamplingStats(bf.SamplingTestCase):
+    backend = npy.NPY
+    name = 'npy-db'
+    sampler_vars = STATS
+    shape = ()
+
+
+class TestNPY2dSampling(bf.SamplingTestCase):
+    backend = npy.NPY
+    name = 'npy-db'
+    shape = (2, 3)
+
+
+@pytest.mark.xfail(condition=(theano.config.floatX == "float32"), reason="Fails on float32")
+class TestNPY0dSelection(bf.SelectionTestCase):
+    backend = npy.NPY
+    name = 'npy-db'
+    shape = ()
+
+
+class TestNPY2dSelection(bf.SelectionTestCase):
+    backend = npy.NPY
+    name = 'npy-db'
+    shape = (2, 3)
+
+
+class TestNPY1dSelectionStats(bf.SelectionTestCase):
+    backend = npy.NPY
+    name = 'npy-db'
+    sampler_vars = STATS
+    shape = 2
+
+
+class TestNPYDumpLoad(bf.DumpLoadTestCase):
+    backend = npy.NPY
+    load_func = staticmethod(npy.load)
+    name = 'npy-db'
+    shape = (2, 3)
+
+
+@pytest.mark.xfail(condition=(theano.config.floatX == "float32"), reason="Fails on float32")
+class TestNPYDumpFunction(bf.BackendEqualityTestCase):
+    backend0 = backend1 = ndarray.NDArray
+    name0 = None
+    name1 = 'npy-db'
+    shape = (2, 3)
+
+    @classmethod
+    def setup_class(cls):
+        super(TestNPYDumpFunction, cls).setup_class()
+        npy.dump(cls.name1, cls.mtrace1)
+        with cls.model:
+            cls.mtrace1 = npy.load(cls.name1)
+
+
+class TestNDArrayNPYEquality(bf.BackendEqualityTestCase):
+    backend0 = ndarray.NDArray
+    name0 = None
+    backend1 = npy.NPY
+    name1 = 'npy-db'
+    shape = (2, 3)
+
+
+class TestNPYFiles(object):
+    name = 'npy-db'
+
+    def setup_method(self):
+        self.test_point, self.model, _ = models.beta_bernoulli((2, 3))
+
+    def teardown_method(self):
+        bf.remove_file_or_directory(self.name)
+
+    def record(self, strace, values):
+        for val in values:
+            strace.record({varname: np.tile(val, value.shape)
+                           for varname, value in self.test_point.items()})
+
+    def test_npy_readable(self):
+        with self.model:
+            strace = npy.NPY(self.name)
+        strace.setup(4, 0)
+        self.record(strace, range(4))
+        strace.close()
+        for varname in strace.varnames:
+            filename = os.path.join(self.name, 'chain-0', varname + '.npy')
+            npt.assert_equal(np.load(filename, mmap_mode='r'),
+                             strace.get_values(varname))
+
+    def test_resume(self):
+        with self.model:
+            strace = npy.NPY(self.name)
+        strace.setup(2, 0)
+        self.record(strace, range(2))
+        strace.close()
+
+        with self.model:
+            strace = npy.NPY(self.name)
+        strace.setup(2, 0)
+        assert len(strace) == 2
+        self.record(strace, range(2, 4))
+        strace.close()
+        npt.assert_equal(strace.get_values('x')[:, 0, 0], np.arange(4))
+
+    def test_load_interrupted(self):
+        with self.model:
+            strace = npy.NPY(self.name)
+        strace.setup(4, 0)
+        self.record(strace, range(3))
+        for column in strace._all_columns():
+            column.flush()
+        # Simulate an incomplete last draw
+        filename = os.path.join(self.name, 'chain-0', 'x.npy')
+        with open(filename, 'ab') as fh:
+            fh.write(b'\x00' * 5)
+
+        with self.model:
+            trace = npy.load(self.name)
+        assert len(trace) == 3
+        npt.assert_equal(trace.get_values('x')[:, 0, 0], np.arange(3))
+        strace.close()
@@ -1,9 +1,12 @@
 import time
 import sys
 import pytest
+import numpy as np
+import theano
 
 import pymc3.parallel_sampling as ps
 import pymc3 as pm
+from pymc3.backends.report import WarningType
 
 
 @pytest.mark.skipif(sys.version_info < (3,3),
@@ -70,3 +73,110 @@ def test_iterator():
     with sampler:
         for draw in sampler:
             pass
+
+
+@pytest.mark.skipif(sys.version_info < (3,3),
+                    reason="requires python3.3")
+def test_iterator_buffered():
+    with pm.Model() as model:
+        a = pm.Normal('a', shape=1)
+        pm.HalfNormal('b')
+        step1 = pm.NUTS([a])
+        step2 = pm.Metropolis([model.b_log__])
+
+    step = pm.CompoundStep([step1, step2])
+
+    start = {'a': 1., 'b_log__': 2.}
+    sampler = ps.ParallelSampler(10, 7, 3, 2, [2, 3, 4], [start] * 3,
+                                 step, 0, False, buffer_size=4)
+    draws = {0: [], 1: [], 2: []}
+    with sampler:
+        for draw in sampler:
+            draws[draw.chain].append(draw)
+    for chain_draws in draws.values():
+        assert [d.draw_idx for d in chain_draws] == list(range(17))
+        assert [d.tuning for d in chain_draws] == [True] * 7 + [False] * 10
+        assert [d.is_last for d in chain_draws] == [False] * 16 + [True]
+        assert chain_draws[0].point['a'].shape == (1,)
+
+
+@pytest.mark.skipif(sys.version_info < (3,3),
+                    reason="requires python3.3")
+def test_sampler_pool_reuse():
+    data = theano.shared(np.zeros(10))
+    with pm.Model() as model:
+        a = pm.Normal('a')
+        pm.Normal('obs', mu=a, sd=0.1, observed=data)
+        step = pm.Metropolis()
+
+    start = {'a': 0.}
+    with ps.SamplerPool(step, cores=2, model=model, buffer_size=5) as pool:
+        workers = [worker._process.pid for worker in pool._workers]
+        for value in [0., 10.]:
+            data.set_value(np.full(10, value))
+            sampler = pool.sampler(100, 100, 3, [2, 3, 4], [start] * 3,
+                                   progressbar=False)
+            points = {0: [], 1: [], 2: []}
+            with sampler:
+                for draw in sampler:
+                    points[draw.chain].append(draw.point['a'])
+            for chain_points in points.values():
+                assert len(chain_points) == 200
+                assert abs(np.mean(chain_points[100:]) - value) < 1
+        assert [worker._process.pid for worker in pool._workers] == workers
+
+
+@pytest.mark.skipif(sys.version_info < (3,3),
+                    reason="requires python3.3")
+def test_sampler_pool_resets_counters():
+    sd = theano.shared(1.)
+    with pm.Model() as model:
+        pm.Normal('a', sd=sd)
+        step = pm.NUTS(step_scale=1., max_treedepth=3, early_max_treedepth=1)
+
+    def run(pool, value, tune=0):
+        sd.set_value(value)
+        sampler = pool.sampler(100, tune, 1, [1], [{'a': 0.}],
+                               progressbar=False)
+        stats = []
+        with sampler:
+            for draw in sampler:
+                stats.extend(draw.stats)
+                if draw.is_last:
+                    kinds = [warn.kind for warn in draw.warnings]
+        return stats, kinds
+
+    with ps.SamplerPool(step, cores=1, model=model) as pool:
+        # The step size is far too large for the first job
+        stats, kinds = run(pool, 1e-3)
+        assert all(stat['diverging'] for stat in stats)
+        assert WarningType.DIVERGENCES in kinds
+        # and far too small for the second one
+        stats, kinds = run(pool, 100.)
+        assert not any(stat['diverging'] for stat in stats)
+        assert WarningType.DIVERGENCES not in kinds
+        assert WarningType.TREEDEPTH in kinds
+        stats, kinds = run(pool, 1.)
+        assert WarningType.TREEDEPTH not in kinds
+        # early_max_treedepth applies again while tuning
+        stats, kinds = run(pool, 100., tune=50)
+        assert max(stat['depth'] for stat in stats[:50]) == 1
+
+
+@pytest.mark.skipif(sys.version_info < (3,3),
+                    reason="requires python3.3")
+def test_sample_with_pool():
+    data = theano.shared(np.zeros(10))
+    with pm.Model() as model:
+        a = pm.Normal('a')
+        pm.Normal('obs', mu=a, sd=0.1, observed=data)
+        pool = ps.SamplerPool(pm.Metropolis(), cores=2)
+        with pool:
+            trace = pm.sample(50, tune=50, chains=2, pool=pool,
+                              compute_convergence_checks=False)
+            assert trace.nchains == 2
+            assert len(trace) == 50
+            with pytest.raises(ValueError):
+                pm.sample(50, step=pm.Metropolis(), pool=pool)
+            with pytest.raises(ValueError):
+                pm.sample(50, chains=2, pool=pool, buffer_size=5)
@@ -137,3 +137,51 @@ def test_user_potential():
         step = pymc3.NUTS(potential=pot)
         pymc3.sample(10, init=None, step=step, chains=1)
     assert called
+
+
+@pytest.mark.parametrize('potential', [
+    lambda n: quadpotential.QuadPotentialFullAdapt(
+        n, np.zeros(n), adaptation_window=500, dtype='float64'),
+    lambda n: quadpotential.QuadPotentialLowRankAdapt(
+        n, np.zeros(n), rank=n, adaptation_window=500, dtype='float64'),
+])
+def test_adapt_dense(potential):
+    np.random.seed(42)
+    cov = np.random.rand(5, 5)
+    cov = cov.dot(cov.T) + np.eye(5)
+    samples = np.random.multivariate_normal(np.zeros(5), cov, size=1000)
+    pot = potential(5)
+    identity = np.array([pot.velocity(x) for x in np.eye(5)])
+    for sample in samples[:499]:
+        pot.update(sample, None, True)
+    # the mass matrix only changes at the end of a window
+    npt.assert_allclose([pot.velocity(x) for x in np.eye(5)], identity)
+    for sample in samples[499:]:
+        pot.update(sample, None, True)
+    cov_ = np.array([pot.velocity(x) for x in np.eye(5)])
+    npt.assert_allclose(cov_, cov, atol=0.2 * np.abs(cov).max())
+
+    x = np.random.randn(5)
+    npt.assert_allclose(pot.energy(x), 0.5 * x.dot(cov_).dot(x))
+    vals = np.array([pot.random() for _ in range(5000)])
+    npt.assert_allclose(np.cov(vals.T), np.linalg.inv(cov_), atol=0.1)
+
+
+def test_adapt_full_sample():
+    with pymc3.Model():
+        pymc3.MvNormal('x', mu=np.zeros(3), cov=np.array([[1, .9, 0], [.9, 1, 0], [0, 0, 2]]),
+                       shape=3)
+        trace = pymc3.sample(200, tune=300, init='jitter+adapt_full', chains=1)
+    assert trace['x'].shape == (200, 3)
+
+
+@pytest.mark.parametrize('estimator', [quadpotential._WeightedVariance,
+                                       quadpotential._WeightedCovariance])
+def test_weighted_current_mean(estimator):
+    est = estimator(3, dtype='float32')
+    est.add_sample(np.array([1., 2., 3.]), 1)
+    est.add_sample(np.array([3., 2., 1.]), 1)
+    mean = est.current_mean()
+    assert mean.dtype == np.float32
+    assert mean is not est.mean
+    npt.assert_allclose(mean, [2., 2., 2.])
@@ -52,6 +52,17 @@ class TestSample(SeededTest):
         assert random_numbers[0] == random_numbers[1]
         assert (draws[0] == draws[1]).all()
 
+    def test_parallel_sample_buffered(self):
+        traces = []
+        for buffer_size in [1, 7]:
+            with self.model:
+                traces.append(pm.sample(20, tune=5, chains=2, cores=2,
+                                        step=self.step, buffer_size=buffer_size,
+                                        random_seed=[1, 2]))
+        for chain in range(2):
+            npt.assert_equal(traces[0].get_values('x', chains=chain),
+                             traces[1].get_values('x', chains=chain))
+
     def test_sample(self):
         test_cores = [1]
         with self.model:
@@ -100,6 +111,41 @@ class TestSample(SeededTest):
         assert tr.get_values('x', chains=0)[0][0] > 0
         assert tr.get_values('x', chains=1)[0][0] < 0
 
+    @pytest.mark.parametrize('cores', [1, 2])
+    def test_target_ess(self, cores):
+        with self.model:
+            trace = pm.sample(5000, tune=100, chains=2, cores=cores,
+                              step=pm.Metropolis(), target_ess=200,
+                              random_seed=[1, 2])
+        assert len(trace) < 5000
+        assert trace.nchains == 2
+        diagnostics = trace.report.online_diagnostics
+        assert diagnostics.converged(200)
+        if cores == 1:
+            assert diagnostics.n_draws(0) == diagnostics.n_draws(1)
+
+    def test_target_ess_sqlite(self, tmpdir):
+        with self.model:
+            db = pm.backends.SQLite(str(tmpdir.join('trace.sqlite')))
+            trace = pm.sample(5000, tune=100, chains=2, cores=2,
+                              step=pm.Metropolis(), target_ess=200,
+                              trace=db, random_seed=[1, 2])
+        assert len(trace) < 5000
+        assert trace.nchains == 2
+        diagnostics = trace.report.online_diagnostics
+        # No queued draws are lost when sampling stops
+        assert len(trace) == min(diagnostics.n_draws(c) for c in trace.chains)
+
+    def test_iter_sample_diagnostics(self):
+        diagnostics = pm.diagnostics.OnlineDiagnostics()
+        with self.model:
+            samps = pm.sampling.iter_sample(draws=20, step=self.step,
+                                            start=self.start, tune=5,
+                                            diagnostics=diagnostics)
+            for trace in samps:
+                pass
+        assert diagnostics.n_draws(0) == 15
+
     def test_sample_tune_len(self):
         with self.model:
             trace = pm.sample(draws=100, tune=50, cores=1)
@@ -273,6 +319,33 @@ class TestSamplePPC(SeededTest):
             assert 'a' in ppc
             assert ppc['a'].shape == (10, 4, 2)
 
+    def test_batched(self):
+        data = np.array([0., 1., 3.])
+        with pm.Model() as model:
+            mu = pm.Normal('mu', mu=0, sd=1, shape=3)
+            sd = pm.HalfNormal('sd', sd=1)
+            a = pm.Normal('a', mu=mu * 2, sd=sd, observed=data)
+            b = pm.Poisson('b', mu=sd, observed=np.ones((4, 3)))
+            c = pm.MvNormal('c', mu=mu, cov=np.eye(3), observed=data)
+            trace = pm.sample(100, tune=50, chains=2, cores=1)
+
+        with model:
+            ppc = pm.sample_posterior_predictive(trace, samples=150, batched=True,
+                                                 progressbar=False)
+            assert ppc['a'].shape == (150, 3)
+            assert ppc['b'].shape == (150, 4, 3)
+            assert ppc['c'].shape == (150, 3)
+
+            points = [trace._straces[1].point(20)] * 2000
+            ppc_loop = pm.sample_posterior_predictive(points, samples=2000, vars=[a],
+                                                      progressbar=False)
+            ppc_batch = pm.sample_posterior_predictive(points, samples=2000, vars=[a],
+                                                       batched=True, progressbar=False)
+            npt.assert_allclose(ppc_loop['a'].mean(0), ppc_batch['a'].mean(0),
+                                atol=0.2)
+            npt.assert_allclose(ppc_loop['a'].std(0), ppc_batch['a'].std(0),
+                                rtol=0.1)
+
     def test_sum_normal(self):
         with pm.Model() as model:
             a = pm.Normal('a', sd=0.2)
@@ -1,6 +1,7 @@
 import pymc3 as pm
 from .helpers import SeededTest
 import numpy as np
+import pytest
 import theano
 
 
@@ -39,3 +40,74 @@ class TestShared(SeededTest):
         assert prior_trace1['b'].shape == (1000,)
         assert prior_trace1['obs'].shape == (1000, 200)
         np.testing.assert_allclose(x_pred, pp_trace1['obs'].mean(axis=0), atol=1e-1)
+
+
+class TestData(SeededTest):
+    def test_set_data(self):
+        x = np.random.normal(size=100)
+        y = x + np.random.normal(scale=1e-2, size=100)
+
+        x_pred = np.linspace(-3, 3, 200)
+
+        with pm.Model() as model:
+            x_data = pm.Data('x', x)
+            y_data = pm.Data('y', y)
+            b = pm.Normal('b', 0., 10.)
+            pm.Normal('obs', b * x_data, np.sqrt(1e-2), observed=y_data)
+            assert model['x'] is x_data
+
+            trace = pm.sample(500, init=None, progressbar=False)
+            pp_trace0 = pm.sample_posterior_predictive(trace, 200)
+
+            pm.set_data({'x': x_pred, 'y': np.zeros(200)})
+            pp_trace1 = pm.sample_posterior_predictive(trace, 200)
+
+        assert pp_trace0['obs'].shape == (200, 100)
+        np.testing.assert_allclose(x, pp_trace0['obs'].mean(axis=0), atol=1e-1)
+        assert pp_trace1['obs'].shape == (200, 200)
+        np.testing.assert_allclose(x_pred, pp_trace1['obs'].mean(axis=0), atol=1e-1)
+
+    def test_no_recompile(self):
+        with pm.Model() as model:
+            y_data = pm.Data('y', np.zeros(10))
+            mu = pm.Normal('mu', 0., 1.)
+            pm.Normal('obs', mu, 1., observed=y_data)
+            logp = model.logp
+            point = model.test_point
+            logp0 = logp(point)
+
+            pm.set_data({'y': np.ones(20)})
+            # logp of the new observations under the already compiled function
+            expected = logp0 + 20 * -0.5 + 10 * -0.5 * np.log(2 * np.pi)
+            np.testing.assert_allclose(logp(point), expected)
+
+    def test_set_data_errors(self):
+        with pm.Model():
+            pm.Normal('mu', 0., 1.)
+            with pytest.raises(TypeError):
+                pm.set_data({'mu': np.zeros(3)})
+        with pytest.raises(TypeError):
+            pm.Data('y', np.zeros(3))
+
+    def test_minibatch(self):
+        data = np.random.normal(size=(100, 2))
+        with pm.Model():
+            x_data = pm.Data('x', data)
+            mb = pm.Minibatch(x_data, 10)
+            assert mb.shared is x_data
+            assert mb.eval().shape == (10, 2)
+            pm.set_data({'x': np.random.normal(size=(5, 2))})
+            assert np.all(np.in1d(mb.eval(), x_data.get_value()))
+            with pytest.raises(ValueError):
+                pm.Minibatch(x_data, 10, in_memory_size=50)
+
+    def test_symbolic_total_size(self):
+        with pm.Model() as model:
+            x_data = pm.Data('x', np.zeros(10))
+            mu = pm.Normal('mu', 0., 1.)
+            pm.Normal('obs', mu, 1., observed=np.zeros(5),
+                      total_size=x_data.shape[0])
+            logp = model.fn(model.observed_RVs[0].logpt)
+            logp0 = logp(model.test_point)
+            pm.set_data({'x': np.zeros(20)})
+            np.testing.assert_allclose(logp(model.test_point), 2 * logp0)
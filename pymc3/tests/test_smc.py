@@ -48,6 +48,15 @@ class TestSMC(SeededTest):
         np.testing.assert_allclose(self.muref, mu1d, rtol=0., atol=0.03)
 
 
+    def test_parallel_identical(self):
+        traces = []
+        for cores in (1, 2):
+            with self.SMC_test:
+                traces.append(pm.sample(draws=200, step=pm.SMC(), cores=cores,
+                                        random_seed=42))
+        np.testing.assert_array_equal(traces[0]['X'], traces[1]['X'])
+
+
     def test_discrete_continuous(self):
         with pm.Model() as model:
             a = pm.Poisson('a', 5)
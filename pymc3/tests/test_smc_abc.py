@@ -0,0 +1,74 @@
+import numpy as np
+import numpy.testing as npt
+import pytest
+
+import pymc3 as pm
+from pymc3.distributions.distribution import NoDistribution
+from pymc3.step_methods import smc_ABC
+
+
+class _Simulator(NoDistribution):
+    def __init__(self, function, *args, **kwargs):
+        self.function = function
+        super(_Simulator, self).__init__(*args, **kwargs)
+
+
+def _simulate(a):
+    return np.random.normal(a, 1, size=100)
+
+
+def _simulate_batched(a):
+    return np.random.normal(a[:, None], 1, size=(len(a), 100))
+
+
+_simulate_batched.batched = True
+
+
+class TestBatchedSumStats(object):
+
+    @pytest.mark.parametrize('shape', [(6, 20), (6, 20, 3)])
+    def test_matches_single(self, shape):
+        data = np.random.randn(*shape)
+        sum_stat = ['mean', 'std', 'var', np.median, lambda x: x.max()]
+        batched = smc_ABC.get_sum_stats_batched(data, sum_stat=sum_stat)
+        single = np.array([smc_ABC.get_sum_stats(d, sum_stat=sum_stat).ravel() for d in data])
+        npt.assert_allclose(batched, single)
+
+    @pytest.mark.parametrize('metric', ['absolute difference', 'sum of squared_distance',
+                                        'mean absolute_error', 'mean squared_error',
+                                        'euclidean'])
+    @pytest.mark.parametrize('shape', [(4,), (3, 2)])
+    def test_distances(self, metric, shape):
+        distance = smc_ABC.get_distance(metric)
+        stats = np.random.randn(5, *shape)
+        observed = np.random.randn(*shape)
+        npt.assert_allclose(distance(stats, observed),
+                            [distance(s, observed) for s in stats])
+
+    def test_mean_error_multiple_columns(self):
+        # The mean is taken over the summary statistics, not their columns
+        data = np.random.randn(20, 2)
+        observed = smc_ABC.get_sum_stats(data, sum_stat=['mean', 'std'])
+        simulated = smc_ABC.get_sum_stats(data + 1., sum_stat=['mean', 'std'])
+        assert observed.shape == (2, 2)
+        npt.assert_allclose(smc_ABC.mean_absolute_error(simulated, observed), 1.)
+        npt.assert_allclose(smc_ABC.mean_squared_error(simulated, observed), 1.)
+
+
+class TestSampleBatched(object):
+
+    def sample(self, function, data):
+        with pm.Model():
+            pm.Normal('a', 0, 5)
+            _Simulator('sim', function, shape=100, dtype='float64', observed=data)
+            step = smc_ABC.SMC_ABC(min_epsilon=0.3)
+            return smc_ABC.sample_smc_abc(500, step=step, random_seed=1)
+
+    def test_matches_single(self):
+        data = np.random.RandomState(0).normal(2, 1, size=100)
+        single = self.sample(_simulate, data)['a']
+        batched = self.sample(_simulate_batched, data)['a']
+        assert batched.shape == single.shape == (500,)
+        npt.assert_allclose(batched.mean(), data.mean(), atol=0.3)
+        npt.assert_allclose(batched.mean(), single.mean(), atol=0.1)
+        npt.assert_allclose(batched.std(), single.std(), rtol=0.3)
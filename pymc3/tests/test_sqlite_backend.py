@@ -1,5 +1,9 @@
 import os
+import sqlite3
+import numpy as np
+import numpy.testing as npt
 from pymc3.tests import backend_fixtures as bf
+from pymc3.tests import models
 from pymc3.backends import ndarray, sqlite
 import tempfile
 import pytest
@@ -65,3 +69,55 @@ class TestNDArraySqliteEquality(bf.BackendEqualityTestCase):
     backend1 = sqlite.SQLite
     name1 = DBNAME
     shape = (2, 3)
+
+
+class TestSQLiteStorage(object):
+    name = DBNAME
+
+    def setup_method(self):
+        self.test_point, self.model, _ = models.beta_bernoulli((2, 3))
+
+    def teardown_method(self):
+        bf.remove_file_or_directory(self.name)
+
+    def test_blob_and_wal(self):
+        with self.model:
+            strace = sqlite.SQLite(self.name, queue_limit=2)
+        strace.setup(5, 0)
+        for idx in range(5):
+            strace.record({'x': np.tile(idx, (2, 3)), 'y': idx})
+        strace.close()
+
+        con = sqlite3.connect(self.name)
+        assert con.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+        blob = con.execute('SELECT value FROM [x] WHERE draw = 1').fetchone()[0]
+        con.close()
+        npt.assert_equal(np.frombuffer(blob, dtype=strace.var_dtypes['x']),
+                         np.ones(6))
+        npt.assert_equal(strace.get_values('x')[:, 0, 0], np.arange(5))
+        npt.assert_equal(strace.point(-1)['x'], np.tile(4, (2, 3)))
+        # the arrays can be changed in place
+        values = strace.get_values('x')
+        values += 1
+        point = strace.point(-1)
+        point['x'] *= 2
+        npt.assert_equal(point['x'], np.tile(8, (2, 3)))
+
+    def test_load_column_layout(self):
+        con = sqlite3.connect(self.name)
+        for varname, ncols in [('x', 6), ('y', 1)]:
+            cols = ['v{}'.format(i) for i in range(ncols)]
+            con.execute('CREATE TABLE [{}] (recid INTEGER NOT NULL PRIMARY '
+                        'KEY AUTOINCREMENT, draw INTEGER, chain INT(5), {})'
+                        .format(varname, ', '.join(c + ' FLOAT' for c in cols)))
+            for draw in range(3):
+                con.execute('INSERT INTO [{}] VALUES (NULL, ?, 0, {})'
+                            .format(varname, ', '.join(['?'] * ncols)),
+                            (draw,) + (draw,) * ncols)
+        con.commit()
+        con.close()
+
+        with self.model:
+            trace = sqlite.load(self.name)
+        npt.assert_equal(trace.get_values('x')[:, 1, 2], np.arange(3))
+        npt.assert_equal(trace.get_values('y'), np.arange(3))
@@ -6,6 +6,7 @@ import pymc3 as pm
 from .helpers import SeededTest
 from ..tests import backend_fixtures as bf
 from ..backends import ndarray
+from ..backends.base import MultiTrace
 from ..stats import (summary, autocorr, autocov, hpd, mc_error, quantiles,
                      make_indices, bfmi, r2_score)
 from ..theanof import floatX_array
@@ -145,6 +146,41 @@ class TestStats(SeededTest):
         assert_almost_equal(calculated_waic.WAIC, actual_waic, decimal=2)
         assert_almost_equal(calculated_waic.WAIC_se, actual_waic_se, decimal=2)
 
+    def test_waic_loo_blocks(self, monkeypatch):
+        """Test waic and loo in blocks of draws and with a memmap"""
+        x_obs = np.arange(6)
+
+        with pm.Model() as model:
+            p = pm.Beta('p', 1., 1., transform=None)
+            pm.Binomial('x', 5, p, observed=x_obs)
+            trace = pm.sample(100, pm.Metropolis(), chains=2)
+
+        log_py = pmstats._log_post_trace(trace, model)
+        npt.assert_allclose(pmstats._log_post_trace(trace, model, block_size=7),
+                            log_py)
+
+        waic = pm.waic(trace, model, pointwise=True)
+        waic_blocks = pm.waic(trace, model, pointwise=True, block_size=7)
+        npt.assert_allclose(waic_blocks.WAIC_i, waic.WAIC_i)
+        npt.assert_allclose(waic_blocks.p_WAIC, waic.p_WAIC)
+
+        loo = pm.loo(trace, model, pointwise=True)
+        monkeypatch.setattr(pmstats, '_LOO_MMAP_BLOCK', 2 * len(log_py))
+        loo_mmap = pm.loo(trace, model, pointwise=True, block_size=7, use_mmap=True)
+        npt.assert_allclose(loo_mmap.LOO_i, loo.LOO_i)
+        npt.assert_allclose(loo_mmap.p_LOO, loo.p_LOO)
+
+        # chains of different lengths
+        trace = MultiTrace([trace._straces[0], trace._straces[1][:60]])
+        loo = pm.loo(trace, model, pointwise=True, reff=1.)
+        loo_mmap = pm.loo(trace, model, pointwise=True, reff=1., use_mmap=True)
+        npt.assert_allclose(loo_mmap.LOO_i, loo.LOO_i)
+
+        # a list of points
+        points = list(trace.points())
+        loo_mmap = pm.loo(points, model, pointwise=True, reff=1., use_mmap=True)
+        npt.assert_allclose(loo_mmap.LOO_i, loo.LOO_i)
+
     def test_hpd(self):
         """Test HPD calculation"""
         interval = hpd(self.normal_sample)
@@ -194,52 +230,20 @@ class TestStats(SeededTest):
             trace = pm.sample(100, step=step)
         summary(trace)
 
-    def test_calculate_stats_0d_variable(self):
-        sample = np.arange(10)
-        result = list(pm.stats._calculate_stats(sample, 5, 0.05))
-        assert result[0] == ()
+    def test_summary_stats_0d_variable(self):
+        values = np.arange(10.)[:, None]
+        result = pm.stats._summary_stats(values, 0.05, 5)
+        assert list(result.columns) == ['mean', 'sd', 'mc_error',
+                                        'hpd_2.5', 'hpd_97.5']
+        assert len(result) == 1
+        assert_almost_equal(result['mean'][0], 4.5)
+
+    def test_summary_stats_1d_variable(self):
+        values = np.arange(10.).reshape(5, 2)
+        result = pm.stats._summary_stats(values, 0.05, 5)
         assert len(result) == 2
-
-    def test_calculate_stats_variable_1d_variable(self):
-        sample = np.arange(10).reshape(5, 2)
-        result = list(pm.stats._calculate_stats(sample, 5, 0.05))
-        assert result[0] == ()
-        assert len(result) == 3
-
-    def test_calculate_pquantiles_0d_variable(self):
-        sample = np.arange(10)[:, None]
-        qlist = (0.25, 25, 50, 75, 0.98)
-        result = list(pm.stats._calculate_posterior_quantiles(sample, qlist))
-        assert result[0] == ()
-        assert len(result) == 2
-
-    def test_groupby_leading_idxs_0d_variable(self):
-        result = {k: list(v) for k, v in pm.stats._groupby_leading_idxs(())}
-        assert list(result.keys()) == [()]
-        assert result[()] == [()]
-
-    def test_groupby_leading_idxs_1d_variable(self):
-        result = {k: list(v) for k, v in pm.stats._groupby_leading_idxs((2,))}
-        assert list(result.keys()) == [()]
-        assert result[()] == [(0,), (1,)]
-
-    def test_groupby_leading_idxs_2d_variable(self):
-        result = {k: list(v) for k, v in pm.stats._groupby_leading_idxs((2, 3))}
-        expected_keys = [(0,), (1,)]
-        keys = list(result.keys())
-        assert len(keys) == len(expected_keys)
-        for key in keys:
-            assert result[key] == [key + (0,), key + (1,), key + (2,)]
-
-    def test_groupby_leading_idxs_3d_variable(self):
-        result = {k: list(v) for k, v in pm.stats._groupby_leading_idxs((2, 3, 2))}
-
-        expected_keys = [(0, 0), (0, 1), (0, 2),
-                         (1, 0), (1, 1), (1, 2)]
-        keys = list(result.keys())
-        assert len(keys) == len(expected_keys)
-        for key in keys:
-            assert result[key] == [key + (0,), key + (1,)]
+        assert_almost_equal(result['mean'].values, [4., 5.])
+        assert_almost_equal(result['sd'].values, values.std(0))
 
     def test_bfmi(self):
         trace = {'energy': np.array([1, 2, 3, 4])}
@@ -292,6 +296,13 @@ class TestDfSummary(bf.ModelBackendSampledTestCase):
                                    'n_eff', 'Rhat']),
                          ds.columns)
 
+    def test_chunk_size(self):
+        ds = summary(self.mtrace, batches=3)
+        for chunk_size in (1, 4):
+            ds_chunked = summary(self.mtrace, batches=3, chunk_size=chunk_size)
+            assert list(ds.index) == list(ds_chunked.index)
+            npt.assert_allclose(ds.values, ds_chunked.values)
+
     def test_value_alignment(self):
         mtrace = self.mtrace
         ds = summary(mtrace, batches=3)
@@ -343,3 +354,25 @@ class TestDfSummary(bf.ModelBackendSampledTestCase):
         lw = np.random.randn(20000, 10)
         _, ks = pm.stats._psislw(lw, 1.)
         npt.assert_array_less(ks, .5)
+
+    def test_psis_vectorized(self, monkeypatch):
+        """Compare the batched smoothing with smoothing every column on its own"""
+        lw = np.random.standard_t(2, size=(1000, 20))
+        # ties at the cutoff shorten the tail of some columns
+        lw[:, :5] = np.round(lw[:, :5])
+        monkeypatch.setattr(pm.stats, '_PSIS_BLOCK', 7000)
+        lw_out, ks = pm.stats._psislw(lw, .8)
+
+        cutoff_ind = - int(np.ceil(min(1000 / 5., 3 * (1000 / .8) ** 0.5))) - 1
+        cutoffmin = np.log(np.finfo(float).tiny)
+        for i in range(lw.shape[1]):
+            x = lw[:, i] - lw[:, i].max()
+            k = pm.stats._psislw_column(x, cutoff_ind, cutoffmin, 1. / 3)
+            x = np.minimum(x, 0)
+            x -= pm.stats.logsumexp(x)
+            npt.assert_allclose(ks[i], k)
+            npt.assert_allclose(np.sort(lw_out[:, i]), np.sort(x))
+
+        lw_out_mp, ks_mp = pm.stats._psislw(lw, .8, cores=2)
+        npt.assert_allclose(lw_out_mp, lw_out)
+        npt.assert_allclose(ks_mp, ks)
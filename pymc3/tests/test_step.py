@@ -1,6 +1,7 @@
 import shutil
 import tempfile
 import sys
+from copy import copy
 
 from .checks import close_to
 from .models import (
@@ -10,7 +11,9 @@ from .models import (
     mv_prior_simple,
     simple_2model_continuous,
 )
-from pymc3.sampling import assign_step_methods, sample
+from pymc3.sampling import (assign_step_methods, sample, PopulationStepper,
+                            _SharedPopulation)
+from pymc3.step_methods.metropolis import de_pairs
 from pymc3.parallel_sampling import ParallelSamplingError
 from pymc3.exceptions import SamplingError
 from pymc3.model import Model
@@ -36,6 +39,7 @@ from pymc3.distributions import (
     Categorical,
     Beta,
     HalfNormal,
+    Poisson,
 )
 
 from numpy.testing import assert_array_almost_equal
@@ -467,206 +471,206 @@ class TestStepMethods(object):  # yield test doesn't work subclassing object
         ),
         SMC: np.array(
             [
-                0.53154128,
-                1.69014751,
-                0.38863621,
-                1.36550742,
-                0.54937705,
-                0.85452502,
-                1.34000193,
-                0.04963276,
-                0.73207585,
-                -0.45504452,
-                0.99087969,
-                0.53800418,
-                1.69481083,
-                0.19015456,
-                0.54587521,
-                0.51198155,
-                0.17514563,
-                -0.62023686,
-                0.73211032,
-                1.0269751,
-                0.82004582,
-                1.07714066,
-                1.27243655,
-                0.8603388,
-                -0.96709536,
-                -0.4963755,
-                0.47436677,
-                0.34392296,
-                0.08501226,
-                0.95779747,
-                1.21125461,
-                -0.04609757,
-                0.29714065,
-                0.89447118,
-                0.00472546,
-                0.50365803,
-                1.73127064,
-                1.04164544,
-                -0.22236077,
-                1.33631993,
-                0.96357527,
-                1.06122196,
-                0.12798557,
-                0.4665272,
-                -0.1162582,
-                1.62002463,
-                1.44557222,
-                -0.49218985,
-                1.2175313,
-                0.25761981,
-                0.82879531,
-                0.16321047,
-                1.34260731,
-                -0.05709803,
-                0.18903618,
-                0.76825821,
-                0.08211472,
-                0.53817434,
-                0.53379232,
-                -0.47094362,
-                1.14433914,
-                0.03770296,
-                1.30737805,
-                0.39671022,
-                1.22440728,
-                0.09600212,
-                -0.49796137,
-                -0.44963869,
-                0.95208986,
-                -0.04308567,
-                0.45937807,
-                2.59887219,
-                0.36326674,
-                1.16659465,
-                2.26888158,
-                -0.64081701,
-                0.13085995,
-                1.5847621,
-                0.29342994,
-                -0.7802778,
-                0.62631291,
-                0.56155063,
-                0.63017152,
-                1.88801376,
-                0.32864795,
-                0.19722366,
-                0.62506725,
-                -0.04154236,
-                0.74923865,
-                0.64958051,
-                1.05205509,
-                1.12818507,
-                0.35463018,
-                1.49394093,
-                -1.32280176,
-                0.48922758,
-                -0.67185953,
-                0.01282045,
-                -0.00832875,
-                0.60746178,
-                1.04869967,
-                0.43197615,
-                0.14665959,
-                -0.08117829,
-                0.43216574,
-                0.87241428,
-                -0.07985268,
-                -0.93380876,
-                1.73662159,
-                0.23926283,
-                -0.69068641,
-                1.17829179,
-                -0.16332134,
-                -0.5112194,
-                -0.43442261,
-                0.34948852,
-                1.11002685,
-                0.42445302,
-                0.68379355,
-                -0.12877628,
-                0.59561974,
-                0.67230016,
-                1.67895815,
-                1.51053172,
-                1.14415702,
-                1.00682996,
-                1.09882483,
-                0.28820149,
-                -0.75250142,
-                -0.66453929,
-                -0.0991988,
-                0.2907921,
-                0.04077525,
-                -0.44036405,
-                0.44894708,
-                0.68646345,
-                0.03986746,
-                0.50061203,
-                1.18904715,
-                0.36231722,
-                -0.16347099,
-                0.35343108,
-                1.15870795,
-                0.5973369,
-                1.50731862,
-                0.69983246,
-                1.50854043,
-                0.97489667,
-                0.25267479,
-                0.26369507,
-                1.59775053,
-                1.56383915,
-                0.1721522,
-                -0.96935772,
-                1.47191825,
-                0.79858327,
-                0.69071774,
-                -0.17667758,
-                0.61438524,
-                0.99424152,
-                -0.23558854,
-                -0.27873225,
-                0.16615446,
-                0.02589567,
-                -0.38007309,
-                0.24960815,
-                1.17127086,
-                1.96577002,
-                0.83224965,
-                0.9386008,
-                -0.16018964,
-                0.25239747,
-                -0.09936852,
-                -0.20376629,
-                1.39291948,
-                -0.2083358,
-                0.51435573,
-                1.38304537,
-                0.23272616,
-                -0.15257289,
-                0.77293718,
-                0.33558962,
-                -0.99534345,
-                -0.03472376,
-                0.07169895,
-                1.62726823,
-                0.08074445,
-                0.38765492,
-                0.7844363,
-                0.89340893,
-                0.28605836,
-                0.83632054,
-                0.54210362,
-                -0.55168005,
-                0.91756515,
-                0.16982656,
-                -0.36404392,
-                1.0011945,
-                -0.2659181,
-                0.31691263,
+                0.15668268,
+                1.07937008,
+                0.54222631,
+                0.98548505,
+                0.27377728,
+                -0.07728174,
+                0.35352471,
+                -0.11656893,
+                1.71785112,
+                1.71589434,
+                0.7276981,
+                0.35509084,
+                0.69800512,
+                1.34720303,
+                -0.38132635,
+                0.07201716,
+                -0.24941484,
+                1.54486803,
+                0.69201161,
+                0.76684902,
+                1.75394271,
+                0.57509004,
+                -0.70432785,
+                0.84368219,
+                1.16486391,
+                1.30270367,
+                1.4902066,
+                0.87516564,
+                0.6128628,
+                1.5473461,
+                1.05931137,
+                0.81218644,
+                1.39176843,
+                1.73889055,
+                1.67882869,
+                1.87681074,
+                0.34911594,
+                0.54267104,
+                0.39606997,
+                0.12320314,
+                -1.36807394,
+                0.66359136,
+                0.17362506,
+                1.77416141,
+                1.30458929,
+                0.9624743,
+                -0.00479393,
+                0.33175362,
+                0.71330893,
+                -1.06491443,
+                -0.81892467,
+                -0.04779622,
+                1.01265405,
+                1.0719507,
+                -0.10184508,
+                0.77600363,
+                0.27862423,
+                0.64392643,
+                1.7404382,
+                0.61229069,
+                0.12033398,
+                1.35205793,
+                1.07826077,
+                1.88255289,
+                0.83783394,
+                1.30488929,
+                0.73533771,
+                -0.27067253,
+                -0.10738494,
+                1.9288425,
+                0.08150162,
+                1.01626402,
+                1.57268373,
+                1.32157392,
+                0.85113768,
+                0.35983418,
+                0.21945554,
+                -0.84551301,
+                -0.1716273,
+                1.25023228,
+                0.48444637,
+                1.55375568,
+                -1.3126322,
+                2.22646711,
+                0.50848105,
+                0.13490382,
+                1.3434089,
+                1.14475718,
+                0.68753132,
+                0.97842983,
+                0.34676811,
+                -0.42656267,
+                1.33244118,
+                0.60085226,
+                0.40998477,
+                -0.2319107,
+                -0.05302093,
+                1.39993736,
+                1.71806194,
+                -1.56710637,
+                0.14959919,
+                1.77263755,
+                0.96266579,
+                0.81815683,
+                1.0353405,
+                1.02304075,
+                0.34322331,
+                0.50374399,
+                0.94835353,
+                1.18193396,
+                -0.84727245,
+                0.68255352,
+                -0.35717389,
+                -0.71740852,
+                0.756531,
+                1.22532003,
+                1.2450216,
+                -1.17748353,
+                -1.15381478,
+                0.63336703,
+                0.53835267,
+                -0.23536758,
+                -0.04408663,
+                -0.02518171,
+                0.91826679,
+                0.0425091,
+                0.01954847,
+                1.32312134,
+                1.00360686,
+                0.09200149,
+                -0.62487131,
+                0.44443988,
+                1.0009193,
+                0.44802216,
+                0.53528072,
+                1.76735431,
+                0.36280693,
+                1.10713529,
+                0.81700026,
+                0.59531038,
+                0.05802824,
+                1.10464942,
+                0.35711757,
+                0.81938635,
+                0.0264399,
+                -0.26342429,
+                1.29773671,
+                0.13078623,
+                0.80849223,
+                0.72613136,
+                0.23401041,
+                1.18583261,
+                -0.35046234,
+                0.34200874,
+                0.64744521,
+                -0.82850389,
+                -0.13155048,
+                0.75601485,
+                0.09694309,
+                1.05160058,
+                -0.06838092,
+                1.40915375,
+                0.33542755,
+                0.6725396,
+                -0.47349165,
+                -0.12927292,
+                0.30305027,
+                0.78117971,
+                1.36916026,
+                -0.42585204,
+                1.11186714,
+                0.90802591,
+                1.73969386,
+                0.88815098,
+                0.88621245,
+                0.05214231,
+                0.51518097,
+                0.77692525,
+                0.50580066,
+                1.49986682,
+                0.46169714,
+                0.9128454,
+                1.28747914,
+                -0.80249481,
+                -0.66823756,
+                -0.01039903,
+                -0.0614315,
+                0.62502326,
+                1.23586589,
+                -1.11244667,
+                -0.46097946,
+                0.27230254,
+                -0.00151905,
+                0.00851966,
+                -0.07147108,
+                -0.58802432,
+                0.48403001,
+                0.72817089,
+                0.62360977,
+                1.13307835,
             ]
         ),
     }
@@ -962,6 +966,53 @@ class TestPopulationSamplers(object):
                 ), "Parallelized {} " "chains are identical.".format(stepper)
         pass
 
+    @pytest.mark.parametrize("parallelize", [False, True])
+    def test_compound_population(self, parallelize):
+        with Model() as model:
+            x = Normal("x", 0, 1, shape=2)
+            k = Poisson("k", 3)
+            trace = sample(
+                chains=4, draws=20, tune=10, step=[DEMetropolis([x]), Metropolis([k])],
+                parallelize=parallelize
+            )
+        assert trace.nchains == 4
+        assert trace.get_values("x", combine=False)[0].shape == (20, 2)
+        assert trace.get_values("k").dtype == k.dtype
+        assert trace.get_sampler_stats("accept").shape == (80, 2)
+
+    def test_vectorized_population(self):
+        with Model() as model:
+            x = Normal("x", 0, 1, shape=2)
+            step = DEMetropolis()
+            popstep = PopulationStepper([copy(step) for _ in range(2)], False,
+                                        _SharedPopulation([model.test_point] * 2, model))
+            assert popstep.is_vectorized
+            # only compiled when the chains are stepped at once
+            assert step._population_logp is None
+            trace = sample(chains=20, draws=400, tune=200, step=step)
+        assert trace.get_sampler_stats("accept").shape == (20 * 400,)
+        npt.assert_allclose(trace["x"].mean(axis=0), 0, atol=0.1)
+        npt.assert_allclose(trace["x"].std(axis=0), 1, atol=0.1)
+
+    def test_de_pairs(self):
+        ir1, ir2 = de_pairs(5)
+        chains = np.arange(5)
+        assert np.all(ir1 != chains)
+        assert np.all(ir2 != chains)
+        assert np.all(ir1 != ir2)
+
+    def test_shared_population_double_buffer(self):
+        with Model() as model:
+            Normal("x", 0, 1, shape=2)
+            points = [{"x": np.full(2, c, dtype=theano.config.floatX)} for c in range(3)]
+            population = _SharedPopulation(points, model, shared=True)
+        assert len(population) == 3
+        population.update(1, {"x": np.ones(2) * 10})
+        # the update is only visible after the swap
+        npt.assert_array_equal(population[1]["x"], [1, 1])
+        population.swap()
+        npt.assert_array_equal(population[1]["x"], [10, 10])
+
 
 @pytest.mark.xfail(
     condition=(theano.config.floatX == "float32"), reason="Fails on float32"
@@ -1,9 +1,10 @@
 import collections
 
+import numpy as np
 import pytest
-from theano import theano
+from theano import theano, tensor as tt
 
-from pymc3.theanof import set_theano_conf
+from pymc3.theanof import set_theano_conf, graph_hash, clone_with_batch_axis
 
 
 class TestSetTheanoConfig(object):
@@ -26,3 +27,52 @@ class TestSetTheanoConfig(object):
             assert conf == {'compute_test_value': 'off'}
             conf = set_theano_conf(conf)
             assert conf == {'compute_test_value': 'raise'}
+
+
+class TestGraphHash(object):
+    def build(self, data):
+        x = tt.vector('x')
+        x.tag.test_value = np.zeros(2)
+        shared = theano.shared(np.zeros(2), 'shared')
+        return x, shared, tt.sum((x - shared) ** 2) + tt.sum(tt.constant(data) * x)
+
+    def test_independent_graphs(self):
+        x1, shared1, out1 = self.build(np.ones(2))
+        x2, shared2, out2 = self.build(np.ones(2))
+        key1, found1 = graph_hash(out1, [x1])
+        key2, found2 = graph_hash(out2, [x2])
+        assert key1 == key2
+        assert found1 == [shared1]
+        assert found2 == [shared2]
+
+    def test_differences(self):
+        x, _, out = self.build(np.ones(2))
+        key = graph_hash(out, [x])[0]
+        x2, _, out2 = self.build(np.zeros(2))
+        assert graph_hash(out2, [x2])[0] != key
+        x.name = 'y'
+        assert graph_hash(out, [x])[0] != key
+        assert graph_hash([out, out], [x])[0] != graph_hash(out, [x])[0]
+
+
+class TestCloneWithBatchAxis(object):
+    @theano.configparser.change_flags(compute_test_value='off')
+    def test_clone(self):
+        x = tt.vector('x')
+        data = np.arange(6.).reshape(2, 3)
+        out = tt.sum((x - data) ** 2, axis=0) + x.sum()
+        batch = tt.TensorType('float64', (False, True, False))('batch')
+        batched, = clone_with_batch_axis([out], {x: batch}, 2)
+        values = np.random.randn(4, 1, 3)
+        result = batched.eval({batch: values})
+        assert result.shape == (4, 1, 3)
+        for row, value in zip(result, values):
+            expected = out.eval({x: value[0]})
+            np.testing.assert_allclose(row[0], expected)
+
+    @theano.configparser.change_flags(compute_test_value='off')
+    def test_unsupported(self):
+        x = tt.vector('x')
+        batch = tt.tensor3('batch')
+        with pytest.raises(NotImplementedError):
+            clone_with_batch_axis([x[1:]], {x: batch}, 2)
@@ -1,9 +1,16 @@
+from copy import copy
+import hashlib
+import os
+import pickle
+import tempfile
+
 import numpy as np
 import theano
 from theano import theano, scalar, tensor as tt
+from theano.compile import SharedVariable
 from theano.configparser import change_flags
 from theano.gof import Op
-from theano.gof.graph import inputs
+from theano.gof.graph import inputs, io_toposort, Constant
 from theano.sandbox.rng_mrg import MRG_RandomStreams
 
 from .blocking import ArrayOrdering
@@ -20,10 +27,13 @@ __all__ = ['gradient',
            'jacobian',
            'CallableTensor',
            'join_nonshared_inputs',
+           'clone_with_batch_axis',
            'make_shared_replacements',
            'generator',
            'set_tt_rng',
-           'tt_rng']
+           'tt_rng',
+           'set_function_cache',
+           'cached_function']
 
 
 def inputvars(a):
@@ -254,6 +264,103 @@ def reshape_t(x, shape):
         return x[0]
 
 
+def clone_with_batch_axis(outputs, replace, ndim):
+    """Clone a graph with a leading batch axis.
+
+    The batched version of a variable with `k` dimensions has `ndim + 1`
+    dimensions: the batch axis, `ndim - k` broadcastable dimensions and
+    the dimensions of the variable. This way, batched variables broadcast
+    against variables without batch axis like they did in the original
+    graph.
+
+    Parameters
+    ----------
+    outputs : list of theano variables
+    replace : dict
+        Maps inputs of the graph to their batched versions
+    ndim : int
+        At least the largest number of dimensions of any variable in the
+        graph
+
+    Returns
+    -------
+    The list of batched outputs. Outputs that do not depend on the replaced
+    inputs are returned unchanged.
+
+    Raises NotImplementedError if an operation does not support the batch
+    axis. Supported are elementwise operations, reductions, dimshuffles,
+    indexing of the first axis with a vector that has no batch axis and
+    dot products with an operand that has no batch axis.
+    """
+    batched = dict(replace)
+    for node in io_toposort(inputs(outputs), outputs):
+        if not any(var in batched for var in node.inputs):
+            continue
+        new_outputs = _batch_node(node, batched, ndim)
+        for var, new_var in zip(node.outputs, new_outputs):
+            batched[var] = new_var
+    return [batched.get(var, var) for var in outputs]
+
+
+def _pad_batch(x, ndim):
+    """Insert broadcastable dimensions after the batch axis of `x`."""
+    pad = ndim + 1 - x.ndim
+    return x.dimshuffle([0] + ['x'] * pad + list(range(1, x.ndim)))
+
+
+def _batch_node(node, batched, ndim):
+    op = node.op
+    args = [batched.get(var, var) for var in node.inputs]
+    has_batch = [var in batched for var in node.inputs]
+
+    if isinstance(op, theano.compile.ViewOp):
+        return args
+
+    if isinstance(op, tt.Elemwise):
+        # make_node broadcasts inputs with fewer dimensions on the left
+        return op(*args, return_list=True)
+
+    if isinstance(op, tt.DimShuffle):
+        x, = args
+        shift = ndim + 1 - node.inputs[0].ndim
+        order = [o if o == 'x' else o + shift for o in op.new_order]
+        pad = ndim - node.outputs[0].ndim
+        return [x.dimshuffle([0] + ['x'] * pad + order)]
+
+    if isinstance(op, tt.elemwise.CAReduce):
+        x, = args
+        shift = ndim + 1 - node.inputs[0].ndim
+        axis = op.axis
+        if axis is None:
+            axis = range(node.inputs[0].ndim)
+        # the reduction only depends on the axis, all other properties of
+        # the op are kept
+        new_op = copy(op)
+        new_op.axis = tuple(a + shift for a in axis)
+        return [_pad_batch(new_op(x), ndim)]
+
+    if isinstance(op, tt.subtensor.AdvancedSubtensor1) and not has_batch[1]:
+        x, idx = args
+        shift = ndim + 1 - node.inputs[0].ndim
+        # index the first axis of the variable as a leading axis
+        order = [shift] + [i for i in range(ndim + 1) if i != shift]
+        y = x.dimshuffle(order)[idx]
+        back = list(range(1, shift + 1)) + [0] + list(range(shift + 1, ndim + 1))
+        return [y.dimshuffle(back)]
+
+    if isinstance(op, tt.basic.Dot):
+        (a, b), (a_orig, b_orig) = args, node.inputs
+        if has_batch[0] and not has_batch[1]:
+            return [_pad_batch(tt.dot(a, b), ndim)]
+        if has_batch[1] and not has_batch[0] and b_orig.ndim == 1:
+            if a_orig.ndim == 2:
+                a = a.T
+            return [_pad_batch(tt.dot(b, a), ndim)]
+
+    raise NotImplementedError('Operation %s does not support a batch axis.'
+                              % op)
+
+
 class CallableTensor(object):
     """Turns a symbolic variable with one input into a function that returns symbolic arguments
     with the one variable replaced with the input.
@@ -460,3 +567,219 @@ def largest_common_dtype(tensors):
                  else smartfloatX(np.asarray(t)).dtype
                  for t in tensors)
     return np.stack([np.ones((), dtype=dtype) for dtype in dtypes]).dtype
+
+
+_function_cache_dir = None
+
+
+def set_function_cache(directory=True):
+    """
+    Store compiled theano functions of models on disk and reuse them.
+
+    Functions compiled by `cached_function` (this includes
+    `Model.logp_dlogp_function`, `Model.fastfn` and the compiled logp
+    functions of the model and its variables) are stored under a hash of
+    their graph. Building a structurally identical model later, in the same
+    or in another process, loads the function instead of optimizing and
+    compiling the graph again. Array constants, like observed data that is
+    not stored in a shared variable, are replaced by shared variables
+    before the graph is hashed and compiled, so that a model that is
+    rebuilt with new data of the same type reuses the function. Only the
+    values of scalar constants are part of the hash.
+
+    Parameters
+    ----------
+    directory : str or bool
+        Directory of the cache. If True, a directory in the theano
+        compiledir is used. False or None disables the cache.
+
+    Returns
+    -------
+    The previous cache directory, or None.
+    """
+    # pylint: disable=global-statement
+    global _function_cache_dir
+    # pylint: enable=global-statement
+    old = _function_cache_dir
+    if directory is True:
+        directory = os.path.join(theano.config.compiledir, 'pymc3_functions')
+    if directory:
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+    else:
+        directory = None
+    _function_cache_dir = directory
+    return old
+
+
+class _UncacheableGraph(Exception):
+    pass
+
+
+def _lift_constants(outputs):
+    """Replace the array constants of the graph of `outputs` by shared
+    variables with the same values."""
+    outs = outputs if isinstance(outputs, (list, tuple)) else [outputs]
+    replace = {}
+    for var in inputs(outs):
+        if isinstance(var, tt.TensorConstant) and var.data.size > 1:
+            replace[var] = theano.shared(
+                var.data, name=var.name, broadcastable=var.broadcastable)
+    if not replace:
+        return outputs
+    try:
+        with change_flags(compute_test_value='off'):
+            return theano.clone(outputs, replace=replace)
+    except (TypeError, ValueError, NotImplementedError):
+        # An operation requires the constant
+        return outputs
+
+
+def _hash_key(obj):
+    """A string describing `obj` that does not depend on its identity."""
+    if obj is None or isinstance(obj, (bool, int, float, str, bytes)):
+        return repr(obj)
+    if isinstance(obj, (tuple, list)):
+        return '(%s)' % ','.join(_hash_key(item) for item in obj)
+    if isinstance(obj, dict):
+        return '{%s}' % ','.join(sorted('%s:%s' % (_hash_key(key), _hash_key(val))
+                                        for key, val in obj.items()))
+    if isinstance(obj, (np.ndarray, np.generic)):
+        obj = np.ascontiguousarray(obj)
+        if obj.dtype.hasobject:
+            raise _UncacheableGraph()
+        return 'array(%s,%s,%s)' % (obj.dtype.str, obj.shape,
+                                    hashlib.sha256(obj.tobytes()).hexdigest())
+    name = '%s.%s' % (type(obj).__module__, type(obj).__name__)
+    props = getattr(obj, '__props__', None)
+    if props is not None:
+        return '%s(%s)' % (name, ','.join(_hash_key(getattr(obj, prop)) for prop in props))
+    if isinstance(obj, type):
+        return 'type(%s.%s)' % (obj.__module__, obj.__name__)
+    try:
+        return '%s<%s>' % (name, hashlib.sha256(pickle.dumps(obj, 2)).hexdigest())
+    except Exception:
+        raise _UncacheableGraph()
+
+
+def graph_hash(outputs, inputs=()):
+    """
+    Hash of the computation of `outputs` from `inputs`.
+
+    The hash does not depend on the identity of the variables, so two
+    graphs that were built independently in the same way have the same
+    hash. Inputs are described by their position, name and type, shared
+    variables by their type only and constants by their value.
+
+    Returns
+    -------
+    key : str
+        Hex digest of the hash
+    shared : list
+        The shared variables of the graph, in the order they were hashed
+    """
+    if not isinstance(outputs, (list, tuple)):
+        outputs = [outputs]
+    inputs = list(inputs)
+    digest = hashlib.sha256()
+    ids = {}
+    shared = []
+
+    def add(line):
+        digest.update(line.encode('utf-8'))
+        digest.update(b'\n')
+
+    def describe(var):
+        if var in ids:
+            return ids[var]
+        if var in inputs:
+            desc = 'input %d %s' % (inputs.index(var), var.name)
+        elif isinstance(var, SharedVariable):
+            desc = 'shared %d' % len(shared)
+            shared.append(var)
+        elif isinstance(var, Constant):
+            desc = 'constant %s' % _hash_key(var.data)
+        else:
+            desc = 'free %s' % var.name
+        ids[var] = len(ids)
+        add('%d = %s %s' % (ids[var], desc, _hash_key(var.type)))
+        return ids[var]
+
+    for var in inputs:
+        describe(var)
+    for node in io_toposort(inputs, outputs):
+        args = [describe(var) for var in node.inputs]
+        outs = []
+        for var in node.outputs:
+            ids[var] = len(ids)
+            outs.append(ids[var])
+        add('%s = %s%s' % (outs, _hash_key(node.op), args))
+    add('outputs %s' % [describe(var) for var in outputs])
+    return digest.hexdigest(), shared
+
+
+def cached_function(inputs, outputs, *args, **kwargs):
+    """
+    Compile a theano function, or load it from the function cache.
+
+    The arguments are the same as for `theano.function`. If the cache is
+    disabled (see `set_function_cache`), or the function can not be cached
+    (updates, profiling or a mode that is not given by name), this is
+    `theano.function`. Otherwise the array constants of the graph are
+    replaced by shared variables, and the function is stored under a hash
+    of its graph, the compilation arguments and the theano configuration.
+    A function loaded from the cache uses the shared variables of
+    `outputs`.
+    """
+    directory = _function_cache_dir
+    if (directory is None or args or kwargs.get('updates') or kwargs.get('profile')
+            or not isinstance(kwargs.get('mode'), (str, type(None)))):
+        return theano.function(inputs, outputs, *args, **kwargs)
+
+    givens = kwargs.get('givens') or []
+    if isinstance(givens, dict):
+        givens = list(givens.items())
+    options = {key: val for key, val in kwargs.items() if key != 'givens'}
+    try:
+        if givens:
+            graph = theano.clone(outputs, replace=givens)
+        else:
+            graph = outputs
+        graph = _lift_constants(graph)
+        key, shared = graph_hash(graph, inputs)
+        config = theano.config
+        key = hashlib.sha256(' '.join([
+            key, _hash_key(options), theano.__version__, config.floatX,
+            config.mode, config.optimizer, config.cxx, config.device,
+            config.gcc.cxxflags,
+            'list' if isinstance(outputs, (list, tuple)) else 'single',
+        ]).encode('utf-8')).hexdigest()
+    except _UncacheableGraph:
+        return theano.function(inputs, outputs, *args, **kwargs)
+
+    filename = os.path.join(directory, key + '.pkl')
+    if os.path.exists(filename):
+        try:
+            with open(filename, 'rb') as buff:
+                maker, maker_shared = pickle.load(buff)
+            # The optimized graph is used as is, the function only needs
+            # to be linked to the storage of the new shared variables.
+            containers = {old: new.container for old, new in zip(maker_shared, shared)}
+            return maker.create([containers.get(var.variable, var.value)
+                                 for var in maker.inputs])
+        except Exception:
+            # Written by an incompatible version, compile it again
+            pass
+
+    fn = theano.function(inputs, graph, **options)
+    # Write to a temporary file first, other processes might read the cache
+    handle, tmpname = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(handle, 'wb') as buff:
+            pickle.dump((fn.maker, shared), buff, protocol=pickle.HIGHEST_PROTOCOL)
+        os.rename(tmpname, filename)
+    except Exception:
+        # Not all functions can be pickled
+        if os.path.exists(tmpname):
+            os.remove(tmpname)
+    return fn